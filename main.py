@@ -4,11 +4,15 @@ import hydra
 from omegaconf import DictConfig
 
 from patchwork.patchwork import patchwork
+from patchwork.run_report import RunReport
 
 
 @hydra.main(config_path="configs/", config_name="configs_patchwork.yaml", version_base="1.2")
 def run(config: DictConfig):
-    patchwork(config)
+    run_report = RunReport() if config.DRY_RUN else None
+    patchwork(config, run_report=run_report)
+    if config.DRY_RUN:
+        print(f"Fill estimate: {run_report.info['fill_estimate']}")
 
 
 if __name__ == "__main__":
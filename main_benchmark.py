@@ -0,0 +1,13 @@
+import hydra
+from omegaconf import DictConfig
+
+from patchwork.benchmark import patchwork_benchmark
+
+
+@hydra.main(config_path="configs/", config_name="configs_patchwork.yaml", version_base="1.2")
+def run(config: DictConfig):
+    patchwork_benchmark(config)
+
+
+if __name__ == "__main__":
+    run()
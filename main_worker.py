@@ -0,0 +1,20 @@
+import signal
+import threading
+
+import hydra
+from omegaconf import DictConfig
+
+from patchwork.worker_service import patchwork_worker
+
+
+@hydra.main(config_path="configs/", config_name="configs_patchwork.yaml", version_base="1.2")
+def run(config: DictConfig):
+    # stop after the current job on SIGTERM / SIGINT
+    stop_event = threading.Event()
+    for signal_number in [signal.SIGTERM, signal.SIGINT]:
+        signal.signal(signal_number, lambda *_: stop_event.set())
+    patchwork_worker(config, stop_event)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,731 @@
+import glob
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from copy import deepcopy
+from typing import Callable, Dict, List
+
+import laspy
+from omegaconf import DictConfig
+from pdaltools.las_info import get_tile_origin_using_header_info
+
+from patchwork.batch_manifest import (
+    get_config_hash,
+    get_inputs_fingerprint,
+    get_shapefile_hash,
+    get_tile_inputs,
+    load_batch_manifest,
+)
+from patchwork.donor_cache import DonorCache, SharedDonorCache
+from patchwork.donor_catalog import DonorCatalog, load_donor_catalog
+from patchwork.donor_index import DonorIndex, load_donor_index
+from patchwork.donor_staging import DonorStaging, get_donor_staging
+from patchwork.footprint import get_tile_bounds
+from patchwork.indices_map_mosaic import (
+    IndicesMapMosaic,
+    get_tiles_bounds,
+    write_indices_map_vrt,
+)
+from patchwork.patchwork import (
+    create_donor_grid,
+    get_complementary_points,
+    get_tile_donor_info,
+    get_tile_occupancy_grid,
+    patchwork,
+    write_patchwork_outputs,
+    write_run_report,
+)
+from patchwork.run_report import RunReport, report_stage
+from patchwork.shapefile_data_extraction import get_donor_info_from_shapefile
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_SKIPPED = "skipped"  # tile already processed with the same inputs by a previous run (cf. BatchManifest)
+
+# fill statistics of the tiles (cf. get_fill_estimate) summed in the batch report, in dry-run mode
+FILL_ESTIMATE_TOTALS = [
+    "patches",
+    "empty_patches",
+    "fillable_patches",
+    "candidate_donor_points",
+    "added_points",
+    "estimated_output_size",
+]
+
+# index on the donor shapefile, donor catalog, donor cache and donor staging, loaded once per worker process by
+# _init_worker
+_worker_donor_index = None
+_worker_donor_catalog = None
+_worker_donor_cache = None
+_worker_donor_staging = None
+
+
+def get_recipient_paths(recipients: str) -> List[str]:
+    """Get the list of recipient files to process.
+
+    Args:
+        recipients (str): either a directory (all its las/laz files are used), a text file listing one recipient
+        path per line (empty lines and lines starting with "#" are ignored), or a glob pattern
+
+    Returns:
+        List[str]: sorted list of paths to recipient files
+    """
+    if os.path.isdir(recipients):
+        recipient_paths = glob.glob(os.path.join(recipients, "*.la[sz]"))
+    elif os.path.isfile(recipients) and not recipients.lower().endswith((".las", ".laz")):
+        list_directory = os.path.dirname(recipients)
+        with open(recipients, "r", encoding="utf-8") as list_file:
+            lines = [line.strip() for line in list_file]
+        recipient_paths = [os.path.join(list_directory, line) for line in lines if line and not line.startswith("#")]
+    else:
+        recipient_paths = glob.glob(recipients)
+
+    return sorted(recipient_paths)
+
+
+def get_morton_code(x: int, y: int) -> int:
+    """Return the Morton code (z-order) of a cell of a grid, by interleaving the bits of its (non negative)
+    coordinates"""
+    morton_code = 0
+    for bit in range(max(x.bit_length(), y.bit_length())):
+        morton_code |= ((x >> bit) & 1) << (2 * bit) | ((y >> bit) & 1) << (2 * bit + 1)
+
+    return morton_code
+
+
+def sort_recipients_by_location(recipient_paths: List[str], tile_size: int) -> List[str]:
+    """Sort recipient files in Morton order of their location (read in their header), so that neighbouring tiles,
+    which are likely to use the same donor files, are processed one after the other. Files whose header cannot be
+    read are put at the end.
+
+    Args:
+        recipient_paths (List[str]): paths to the recipient files
+        tile_size (int): size of the tiles
+
+    Returns:
+        List[str]: sorted paths
+    """
+    tiles_coordinates = {}
+    for recipient_path in recipient_paths:
+        try:
+            with laspy.open(recipient_path) as recipient_file:
+                tiles_coordinates[recipient_path] = (
+                    int(recipient_file.header.mins[0] // tile_size),
+                    int(recipient_file.header.mins[1] // tile_size),
+                )
+        except Exception:
+            continue
+
+    if not tiles_coordinates:
+        return recipient_paths
+
+    min_x = min(x for x, _ in tiles_coordinates.values())
+    min_y = min(y for _, y in tiles_coordinates.values())
+    morton_codes = {
+        recipient_path: get_morton_code(x - min_x, y - min_y) for recipient_path, (x, y) in tiles_coordinates.items()
+    }
+
+    return sorted(
+        recipient_paths,
+        key=lambda recipient_path: (recipient_path not in morton_codes, morton_codes.get(recipient_path, 0)),
+    )
+
+
+def get_tile_config(config: DictConfig, recipient_path: str) -> DictConfig:
+    """Get the configuration to process a single recipient file: the recipient path is set from recipient_path,
+    the output file has the same name as the recipient, and the indices map (and the run report, if
+    filepath.OUTPUT_REPORT_NAME is set) is named after the recipient. If filepath.INPUT_INDICES_MAP_DIR is set (replay
+    mode), the input indices map is also named after the recipient.
+
+    Args:
+        config (DictConfig): batch configuration
+        recipient_path (str): path to the recipient file
+
+    Returns:
+        DictConfig: configuration for this recipient
+    """
+    tile_config = deepcopy(config)
+    recipient_name = os.path.basename(recipient_path)
+    tile_config.filepath.RECIPIENT_DIRECTORY = os.path.dirname(recipient_path)
+    tile_config.filepath.RECIPIENT_NAME = recipient_name
+    tile_config.filepath.OUTPUT_NAME = recipient_name
+    tile_config.filepath.OUTPUT_INDICES_MAP_NAME = os.path.splitext(recipient_name)[0] + ".tif"
+    if config.filepath.OUTPUT_REPORT_NAME:
+        tile_config.filepath.OUTPUT_REPORT_NAME = os.path.splitext(recipient_name)[0] + "_report.json"
+    if config.filepath.INPUT_INDICES_MAP_DIR:
+        tile_config.filepath.INPUT_INDICES_MAP_NAME = os.path.splitext(recipient_name)[0] + ".tif"
+
+    return tile_config
+
+
+def get_tile_indices_map_path(config: DictConfig, recipient_path: str) -> str:
+    """Return the path to the indices map written for a recipient file"""
+    tile_config = get_tile_config(config, recipient_path)
+    return os.path.join(tile_config.filepath.OUTPUT_INDICES_MAP_DIR, tile_config.filepath.OUTPUT_INDICES_MAP_NAME)
+
+
+def get_tile_output_paths(config: DictConfig, recipient_path: str) -> List[str]:
+    """Return the paths to the output file and to the indices map written for a recipient file"""
+    tile_config = get_tile_config(config, recipient_path)
+    return [
+        os.path.join(tile_config.filepath.OUTPUT_DIR, tile_config.filepath.OUTPUT_NAME),
+        os.path.join(tile_config.filepath.OUTPUT_INDICES_MAP_DIR, tile_config.filepath.OUTPUT_INDICES_MAP_NAME),
+    ]
+
+
+def get_tile_report(recipient_path: str) -> Dict:
+    """Return the initial report of a tile (see process_tile)"""
+    return {"recipient": recipient_path, "status": STATUS_OK, "added_points": None, "duration": None, "error": None}
+
+
+def set_tile_error(report: Dict, error: Exception):
+    """Mark a tile report as failed because of error"""
+    report["status"] = STATUS_ERROR
+    report["error"] = "".join(traceback.format_exception_only(type(error), error)).strip()
+
+
+def process_tile(
+    config: DictConfig,
+    recipient_path: str,
+    donor_index: DonorIndex | None = None,
+    donor_catalog: DonorCatalog | None = None,
+    donor_cache: DonorCache | None = None,
+    donor_staging: DonorStaging | None = None,
+) -> Dict:
+    """Run patchwork on a single recipient file. Errors are caught so that a failing tile does not stop the
+    other ones.
+
+    Args:
+        config (DictConfig): batch configuration
+        recipient_path (str): path to the recipient file
+        donor_index (DonorIndex | None, optional): index on the donor shapefile. Defaults to None (the index
+        loaded by the worker initializer is used, or the shapefile is read from the config if there is none).
+        donor_catalog (DonorCatalog | None, optional): catalog of the donor files. Defaults to None (same as
+        donor_index). The catalog is saved after the tile if it has been updated.
+        donor_cache (DonorCache | None, optional): cache of the points read in the donor files. Defaults to None
+        (same as donor_index).
+        donor_staging (DonorStaging | None, optional): local copies of the donor files. Defaults to None (same as
+        donor_index).
+
+    Returns:
+        Dict: report of the tile: recipient path, status, number of added points, duration, error, hits/misses
+        of the donor cache, and in dry-run mode, the fill statistics of the tile (cf. get_fill_estimate)
+    """
+    if donor_index is None:
+        donor_index = _worker_donor_index
+    if donor_catalog is None:
+        donor_catalog = _worker_donor_catalog
+    if donor_cache is None:
+        donor_cache = _worker_donor_cache
+    if donor_staging is None:
+        donor_staging = _worker_donor_staging
+
+    begin = time.time()
+    donor_cache_stats = donor_cache.get_stats() if donor_cache is not None else None
+    report = get_tile_report(recipient_path)
+    run_report = RunReport() if config.DRY_RUN else None
+    try:
+        report["added_points"] = patchwork(
+            get_tile_config(config, recipient_path), donor_index, donor_catalog, donor_cache, donor_staging, run_report
+        )
+        if run_report is not None:
+            report["fill_estimate"] = run_report.info["fill_estimate"]
+        if donor_catalog is not None:
+            donor_catalog.save()
+    except Exception as error:
+        set_tile_error(report, error)
+    report["duration"] = time.time() - begin
+    if donor_cache is not None:
+        report["donor_cache_hits"] = donor_cache.hits - donor_cache_stats["hits"]
+        report["donor_cache_misses"] = donor_cache.misses - donor_cache_stats["misses"]
+
+    return report
+
+
+def _run_pipeline_stage(
+    stage: Callable[[Dict], None],
+    input_queue: queue.Queue,
+    output_queue: queue.Queue,
+    on_tile_done: Callable[[Dict], None] | None = None,
+):
+    """Apply a stage of the pipeline to the tiles of input_queue and pass them to output_queue, until the end of the
+    tiles (None). A tile that failed in a previous stage is passed on without running the stage. If on_tile_done is
+    set (last stage), it is called with the report of each tile, failed or not, before passing it on."""
+    while True:
+        tile = input_queue.get()
+        if tile is None:
+            output_queue.put(None)
+            return
+
+        report = tile["report"]
+        if report["status"] == STATUS_OK:
+            begin = time.time()
+            try:
+                stage(tile)
+            except Exception as error:
+                set_tile_error(report, error)
+            report["duration"] += time.time() - begin
+        if on_tile_done is not None:
+            try:
+                on_tile_done(report)
+            except Exception as error:
+                set_tile_error(report, error)
+        output_queue.put(tile)
+
+
+def process_tiles_pipelined(
+    config: DictConfig,
+    recipient_paths: List[str],
+    donor_index: DonorIndex,
+    donor_catalog: DonorCatalog,
+    donor_cache: DonorCache | None = None,
+    donor_staging: DonorStaging | None = None,
+    on_next_tile: Callable[[], None] | None = None,
+    on_tile_done: Callable[[Dict], None] | None = None,
+) -> List[Dict]:
+    """Run patchwork on several recipient files in a single process, as a pipeline of 3 stages running in
+    parallel threads, so that reading a tile overlaps with processing the previous one and writing the one before:
+    - read: recipient occupancy grid and donor lookup in the shapefile
+    - join: donor points decoding, and selection of the points in the empty patches of the recipient
+    - write: output file and indices map
+
+    Most of the work (laz decompression and compression, numpy operations, file access) releases the GIL. The
+    stages are connected by queues of config.batch.PIPELINE_QUEUE_SIZE tiles, which bounds the number of tiles in
+    memory. Errors are caught per tile, like in process_tile.
+
+    Args:
+        config (DictConfig): batch configuration
+        recipient_paths (List[str]): paths to the recipient files, in processing order
+        donor_index (DonorIndex): index on the donor shapefile
+        donor_catalog (DonorCatalog): catalog of the donor files, saved once all the tiles are processed (it is
+        shared by the threads)
+        donor_cache (DonorCache | None, optional): cache of the points read in the donor files (only used by the
+        join stage). Defaults to None.
+        donor_staging (DonorStaging | None, optional): local copies of the donor files. Defaults to None.
+        on_next_tile (Callable[[], None] | None, optional): function called before reading each tile (eg. to
+        prefetch the donors of the next tiles). Defaults to None.
+        on_tile_done (Callable[[Dict], None] | None, optional): function called with the report of each tile, in
+        the write stage thread, once its outputs are written or once it failed (in any stage). Defaults to None.
+
+    Returns:
+        List[Dict]: reports of the tiles (see process_tile)
+    """
+
+    def join_stage(tile: Dict):
+        donor_cache_stats = donor_cache.get_stats() if donor_cache is not None else None
+        donor_info = tile.pop("donor_info")
+        recipient_occupancy_grid = tile.pop("recipient_occupancy_grid")
+        tile["donor_grid"] = create_donor_grid(recipient_occupancy_grid, donor_info)
+        tile["donor_paths"] = list(donor_info["full_path"])
+        tile["complementary_points"] = get_complementary_points(
+            donor_info,
+            os.path.join(tile["config"].filepath.RECIPIENT_DIRECTORY, tile["config"].filepath.RECIPIENT_NAME),
+            tile["tile_origin"],
+            tile["config"],
+            recipient_occupancy_grid,
+            donor_catalog,
+            donor_cache,
+            donor_staging,
+            tile["donor_grid"],
+            tile["run_report"],
+        )
+        if donor_cache is not None:
+            tile["report"]["donor_cache_hits"] = donor_cache.hits - donor_cache_stats["hits"]
+            tile["report"]["donor_cache_misses"] = donor_cache.misses - donor_cache_stats["misses"]
+
+    def write_stage(tile: Dict):
+        complementary_points = tile.pop("complementary_points")
+        run_report = tile.pop("run_report")
+        write_patchwork_outputs(
+            tile["config"],
+            complementary_points,
+            tile["tile_origin"],
+            tile.pop("donor_grid"),
+            tile.pop("donor_paths"),
+            run_report,
+        )
+        tile["report"]["added_points"] = len(complementary_points.index)
+        if run_report is not None:
+            write_run_report(
+                tile["config"],
+                run_report,
+                tile["report"]["recipient"],
+                tile["tile_origin"],
+                tile["report"]["added_points"],
+            )
+
+    join_queue = queue.Queue(maxsize=config.batch.PIPELINE_QUEUE_SIZE)
+    write_queue = queue.Queue(maxsize=config.batch.PIPELINE_QUEUE_SIZE)
+    done_queue = queue.Queue()
+    threads = [
+        threading.Thread(target=_run_pipeline_stage, args=(join_stage, join_queue, write_queue)),
+        threading.Thread(target=_run_pipeline_stage, args=(write_stage, write_queue, done_queue, on_tile_done)),
+    ]
+    for thread in threads:
+        thread.start()
+
+    # read stage, in the current thread
+    for recipient_path in recipient_paths:
+        if on_next_tile is not None:
+            on_next_tile()
+        begin = time.time()
+        tile = {"report": get_tile_report(recipient_path)}
+        try:
+            tile_config = get_tile_config(config, recipient_path)
+            run_report = RunReport() if tile_config.filepath.OUTPUT_REPORT_NAME else None
+            with report_stage(run_report, "header_read"):
+                tile_origin = get_tile_origin_using_header_info(recipient_path, config.TILE_SIZE)
+            recipient_occupancy_grid = get_tile_occupancy_grid(recipient_path, tile_origin, tile_config, run_report)
+            tile["donor_info"] = get_tile_donor_info(
+                tile_config, tile_origin, recipient_occupancy_grid, donor_index, donor_catalog, run_report
+            )
+            tile["run_report"] = run_report
+            tile["config"] = tile_config
+            tile["tile_origin"] = tile_origin
+            tile["recipient_occupancy_grid"] = recipient_occupancy_grid
+        except Exception as error:
+            set_tile_error(tile["report"], error)
+        tile["report"]["duration"] = time.time() - begin
+        join_queue.put(tile)
+    join_queue.put(None)
+
+    for thread in threads:
+        thread.join()
+    donor_catalog.save()
+
+    tile_reports = []
+    while (tile := done_queue.get()) is not None:
+        tile_reports.append(tile["report"])
+
+    return tile_reports
+
+
+def get_donor_cache(config: DictConfig) -> DonorCache | None:
+    """Create the donor cache of a batch process, with a size of config.batch.DONOR_CACHE_SIZE MB (None if the size
+    is 0). If config.batch.SHARED_DONOR_CACHE_DIRECTORY is set, the cache is stored in this directory and shared
+    with the other processes of the batch"""
+    if not config.batch.DONOR_CACHE_SIZE:
+        return None
+
+    max_size = int(config.batch.DONOR_CACHE_SIZE * 1024 * 1024)
+    if config.batch.SHARED_DONOR_CACHE_DIRECTORY:
+        return SharedDonorCache(config.batch.SHARED_DONOR_CACHE_DIRECTORY, max_size)
+
+    return DonorCache(max_size)
+
+
+def get_tile_donor_paths(
+    config: DictConfig, recipient_path: str, donor_index: DonorIndex, donor_catalog: DonorCatalog
+) -> List[str]:
+    """Return the paths to the donor files of a recipient, to prefetch them. The tile origin is computed from the
+    recipient header only, and errors are ignored (they are reported when the tile is processed)"""
+    try:
+        origin_x, origin_y = get_tile_origin_using_header_info(recipient_path, config.TILE_SIZE)
+        df_donor_info = get_donor_info_from_shapefile(
+            donor_index,
+            origin_x / config.SHP_X_Y_TO_METER_FACTOR,
+            origin_y / config.SHP_X_Y_TO_METER_FACTOR,
+            config.filepath.DONOR_SUBDIRECTORY,
+            config.mount_points,
+            tile_bounds=(
+                get_tile_bounds((origin_x, origin_y), config.TILE_SIZE) if config.DONOR_QUERY_BY_BOUNDS else None
+            ),
+            donor_catalog=donor_catalog,
+        )
+    except Exception:
+        return []
+
+    return list(df_donor_info["full_path"])
+
+
+def prefetch_tile_donors(
+    config: DictConfig,
+    recipient_path: str,
+    donor_index: DonorIndex,
+    donor_catalog: DonorCatalog,
+    donor_staging: DonorStaging | None,
+):
+    """Start copying the donor files of a recipient in the local staging directory (if there is one)"""
+    if donor_staging is not None:
+        donor_staging.prefetch(get_tile_donor_paths(config, recipient_path, donor_index, donor_catalog))
+
+
+def _init_worker(
+    config: DictConfig, donor_index: DonorIndex, donor_catalog: DonorCatalog, donor_staging: DonorStaging | None
+):
+    """Store the index on the donor shapefile, the donor catalog and the donor staging in the worker process, so that
+    they are sent once per worker instead of once per tile, and create the worker donor cache"""
+    global _worker_donor_index, _worker_donor_catalog, _worker_donor_cache, _worker_donor_staging
+    _worker_donor_index = donor_index
+    _worker_donor_catalog = donor_catalog
+    _worker_donor_cache = get_donor_cache(config)
+    _worker_donor_staging = donor_staging
+
+
+def get_tile_manifest_inputs(
+    config: DictConfig,
+    recipient_path: str,
+    donor_index: DonorIndex,
+    donor_catalog: DonorCatalog,
+    shapefile_hash: str,
+    config_hash: str,
+) -> Dict:
+    """Return the fingerprints of the inputs of a recipient file for the batch manifest (cf. get_tile_inputs): the
+    recipient, its donor files (found as in get_tile_donor_paths), the input indices map in replay mode, the
+    shapefile and the configuration"""
+    tile_config = get_tile_config(config, recipient_path)
+    input_indices_map_path = (
+        os.path.join(tile_config.filepath.INPUT_INDICES_MAP_DIR, tile_config.filepath.INPUT_INDICES_MAP_NAME)
+        if tile_config.filepath.INPUT_INDICES_MAP_DIR
+        else None
+    )
+
+    return get_tile_inputs(
+        recipient_path,
+        get_tile_donor_paths(config, recipient_path, donor_index, donor_catalog),
+        shapefile_hash,
+        config_hash,
+        input_indices_map_path,
+    )
+
+
+def create_indices_map_mosaic(config: DictConfig, recipient_paths: List[str]) -> IndicesMapMosaic | None:
+    """Create the mosaic of the indices maps of a batch in config.filepath.OUTPUT_INDICES_MAP_DIR (if
+    config.batch.INDICES_MAP_MOSAIC_NAME is set, and not in dry-run mode). Its extent covers the tiles of all the
+    recipients, from their origins read in their headers (recipients whose header cannot be read are ignored: they
+    fail anyway)."""
+    if not config.batch.INDICES_MAP_MOSAIC_NAME or config.DRY_RUN:
+        return None
+
+    tile_origins = []
+    for recipient_path in recipient_paths:
+        try:
+            tile_origins.append(get_tile_origin_using_header_info(recipient_path, config.TILE_SIZE))
+        except Exception:
+            continue
+    if not tile_origins:
+        return None
+
+    return IndicesMapMosaic(
+        os.path.join(config.filepath.OUTPUT_INDICES_MAP_DIR, config.batch.INDICES_MAP_MOSAIC_NAME),
+        get_tiles_bounds(tile_origins, config.TILE_SIZE),
+        config,
+    )
+
+
+def write_batch_indices_map_vrt(config: DictConfig, tile_reports: List[Dict]):
+    """Write a VRT of the indices maps of the tiles processed without error (or skipped, as already processed) in
+    config.filepath.OUTPUT_INDICES_MAP_DIR (if config.batch.INDICES_MAP_VRT_NAME is set, and not in dry-run mode)"""
+    if not config.batch.INDICES_MAP_VRT_NAME or config.DRY_RUN:
+        return
+
+    indices_map_paths = [
+        get_tile_indices_map_path(config, tile_report["recipient"])
+        for tile_report in sorted(tile_reports, key=lambda tile_report: tile_report["recipient"])
+        if tile_report["status"] in [STATUS_OK, STATUS_SKIPPED]
+    ]
+    write_indices_map_vrt(
+        os.path.join(config.filepath.OUTPUT_INDICES_MAP_DIR, config.batch.INDICES_MAP_VRT_NAME), indices_map_paths
+    )
+
+
+def write_batch_report(config: DictConfig, tile_reports: List[Dict], duration: float) -> Dict:
+    """Write a json summary of the batch in config.filepath.OUTPUT_DIR (if config.batch.REPORT_NAME is set). In
+    dry-run mode, the summary includes the totals of the fill statistics of the tiles.
+
+    Args:
+        config (DictConfig): batch configuration
+        tile_reports (List[Dict]): reports of each tile (as returned by process_tile)
+        duration (float): total duration of the batch
+
+    Returns:
+        Dict: the batch report
+    """
+    tile_reports = sorted(tile_reports, key=lambda tile_report: tile_report["recipient"])
+    batch_report = {
+        "nb_tiles": len(tile_reports),
+        "nb_ok": sum(tile_report["status"] == STATUS_OK for tile_report in tile_reports),
+        "nb_errors": sum(tile_report["status"] == STATUS_ERROR for tile_report in tile_reports),
+        "nb_skipped": sum(tile_report["status"] == STATUS_SKIPPED for tile_report in tile_reports),
+        "added_points": sum(tile_report["added_points"] or 0 for tile_report in tile_reports),
+        "donor_cache_hits": sum(tile_report.get("donor_cache_hits", 0) for tile_report in tile_reports),
+        "donor_cache_misses": sum(tile_report.get("donor_cache_misses", 0) for tile_report in tile_reports),
+        "duration": duration,
+        "tiles": tile_reports,
+    }
+    if config.DRY_RUN:
+        # fill statistics of the whole batch, to size the real run
+        fill_estimates = [
+            tile_report["fill_estimate"] for tile_report in tile_reports if "fill_estimate" in tile_report
+        ]
+        batch_report["fill_estimate"] = {
+            key: sum(fill_estimate[key] for fill_estimate in fill_estimates) for key in FILL_ESTIMATE_TOTALS
+        }
+
+    if config.batch.REPORT_NAME:
+        os.makedirs(config.filepath.OUTPUT_DIR, exist_ok=True)
+        report_path = os.path.join(config.filepath.OUTPUT_DIR, config.batch.REPORT_NAME)
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            json.dump(batch_report, report_file, indent=2)
+
+    return batch_report
+
+
+def patchwork_batch(config: DictConfig) -> Dict:
+    """Run patchwork on several recipient files (listed by config.batch.RECIPIENTS), with
+    config.batch.WORKERS processes. The donor shapefile is read once, and an error on a tile is reported
+    without stopping the other tiles. The indices maps can be assembled in a VRT and in a Cloud-Optimized GeoTIFF,
+    which is written as the tiles are processed.
+
+    If config.batch.MANIFEST_NAME is set, the inputs and the status of each processed tile are recorded in a
+    manifest (cf. BatchManifest), and the tiles already processed with the same inputs by a previous run are skipped.
+
+    Args:
+        config (DictConfig): patchwork configuration, with a "batch" section
+
+    Returns:
+        Dict: the batch report (see write_batch_report)
+    """
+    begin = time.time()
+    recipient_paths = get_recipient_paths(config.batch.RECIPIENTS)
+    if config.batch.SORT_BY_LOCATION:
+        recipient_paths = sort_recipients_by_location(recipient_paths, config.TILE_SIZE)
+
+    donor_index = load_donor_index(config)
+    donor_catalog = load_donor_catalog(config)
+
+    # the mosaic covers all the tiles, including the ones skipped below
+    indices_map_mosaic = create_indices_map_mosaic(config, recipient_paths)
+
+    def add_tile_to_mosaic(tile_report: Dict):
+        if indices_map_mosaic is not None and tile_report["status"] in [STATUS_OK, STATUS_SKIPPED]:
+            try:
+                indices_map_mosaic.add_tile(get_tile_indices_map_path(config, tile_report["recipient"]))
+            except Exception as error:
+                set_tile_error(tile_report, error)
+
+    # donors of the next tiles are copied in the staging directory while the current tiles are processed
+    donor_staging = get_donor_staging(config)
+    try:
+        batch_manifest = load_batch_manifest(config)
+        tiles_inputs = {}
+        tile_reports = []
+        if batch_manifest is not None:
+            shapefile_hash = get_shapefile_hash(os.path.join(config.filepath.SHP_DIRECTORY, config.filepath.SHP_NAME))
+            config_hash = get_config_hash(config)
+            recipient_paths_to_process = []
+            for recipient_path in recipient_paths:
+                # inputs fingerprinted before processing the tile: an input modified during the run is seen as changed
+                # by the next run
+                tiles_inputs[recipient_path] = get_tile_manifest_inputs(
+                    config, recipient_path, donor_index, donor_catalog, shapefile_hash, config_hash
+                )
+                if batch_manifest.is_up_to_date(
+                    recipient_path,
+                    get_inputs_fingerprint(tiles_inputs[recipient_path]),
+                    get_tile_output_paths(config, recipient_path),
+                ):
+                    tile_report = get_tile_report(recipient_path)
+                    tile_report["status"] = STATUS_SKIPPED
+                    tile_report["added_points"] = batch_manifest.entries[recipient_path]["added_points"]
+                    add_tile_to_mosaic(tile_report)
+                    tile_reports.append(tile_report)
+                else:
+                    recipient_paths_to_process.append(recipient_path)
+            recipient_paths = recipient_paths_to_process
+
+        def on_tile_done(tile_report: Dict):
+            add_tile_to_mosaic(tile_report)
+            if batch_manifest is not None:
+                batch_manifest.record(tile_report, tiles_inputs[tile_report["recipient"]])
+
+        nb_prefetched_tiles = 0
+
+        def prefetch_next_tile_donors():
+            nonlocal nb_prefetched_tiles
+            if donor_staging is not None and nb_prefetched_tiles < len(recipient_paths):
+                prefetch_tile_donors(
+                    config, recipient_paths[nb_prefetched_tiles], donor_index, donor_catalog, donor_staging
+                )
+                nb_prefetched_tiles += 1
+
+        if config.batch.WORKERS <= 1 and config.batch.PIPELINE and not config.DRY_RUN:
+            for _ in range(config.batch.PREFETCH_TILES):
+                prefetch_next_tile_donors()
+            tile_reports += process_tiles_pipelined(
+                config,
+                recipient_paths,
+                donor_index,
+                donor_catalog,
+                get_donor_cache(config),
+                donor_staging,
+                prefetch_next_tile_donors,
+                on_tile_done,
+            )
+        elif config.batch.WORKERS <= 1:
+            donor_cache = get_donor_cache(config)
+            for _ in range(config.batch.PREFETCH_TILES):
+                prefetch_next_tile_donors()
+            for recipient_path in recipient_paths:
+                prefetch_next_tile_donors()
+                tile_report = process_tile(
+                    config, recipient_path, donor_index, donor_catalog, donor_cache, donor_staging
+                )
+                on_tile_done(tile_report)
+                tile_reports.append(tile_report)
+        else:
+            # "spawn" start method: forking a process that already uses gdal/laz threads may deadlock
+            with ProcessPoolExecutor(
+                max_workers=config.batch.WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(config, donor_index, donor_catalog, donor_staging),
+            ) as executor:
+                for _ in range(config.batch.WORKERS + config.batch.PREFETCH_TILES):
+                    prefetch_next_tile_donors()
+                futures = {
+                    executor.submit(process_tile, config, recipient_path): recipient_path
+                    for recipient_path in recipient_paths
+                }
+                for future in as_completed(futures):
+                    prefetch_next_tile_donors()
+                    try:
+                        tile_report = future.result()
+                    except BrokenProcessPool as error:
+                        # a worker died (eg. out of memory): the tiles it was processing are reported as errors
+                        tile_report = {
+                            "recipient": futures[future],
+                            "status": STATUS_ERROR,
+                            "added_points": None,
+                            "duration": None,
+                            "error": f"BrokenProcessPool: {error}",
+                        }
+                    on_tile_done(tile_report)
+                    tile_reports.append(tile_report)
+
+        if indices_map_mosaic is not None:
+            indices_map_mosaic.close()
+    except BaseException:
+        # no partial mosaic is created, and its temporary file is removed
+        if indices_map_mosaic is not None:
+            indices_map_mosaic.abort()
+        raise
+    finally:
+        if donor_staging is not None:
+            donor_staging.close()
+    write_batch_indices_map_vrt(config, tile_reports)
+
+    batch_report = write_batch_report(config, tile_reports, time.time() - begin)
+    print(
+        f"{batch_report['nb_ok']}/{batch_report['nb_tiles']} tiles processed, "
+        f"{batch_report['nb_skipped']} skipped (already processed), {batch_report['nb_errors']} errors, "
+        f"{batch_report['added_points']} points added"
+    )
+
+    return batch_report
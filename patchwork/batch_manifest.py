@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+from omegaconf import DictConfig, OmegaConf
+
+from patchwork.donor_index import SHAPEFILE_EXTENSIONS
+
+# configuration keys that change the outputs of a tile: a tile is processed again if one of them changes
+MANIFEST_CONFIG_KEYS = [
+    "CRS",
+    "DONOR_CLASS_LIST",
+    "DONOR_USE_SYNTHETIC_POINTS",
+    "DONOR_PRIORITY_FIELD",
+    "DONOR_QUERY_BY_BOUNDS",
+    "RECIPIENT_CLASS_LIST",
+    "TILE_SIZE",
+    "SHP_X_Y_TO_METER_FACTOR",
+    "PATCH_SIZE",
+    "NEW_COLUMN",
+    "NEW_COLUMN_SIZE",
+    "VALUE_ADDED_POINTS",
+    "DONOR_CLASS_TRANSLATION",
+    "indices_map",
+    "mount_points",
+    "filepath.DONOR_SUBDIRECTORY",
+    "filepath.INPUT_INDICES_MAP_DIR",
+    "filepath.OUTPUT_DIR",
+    "filepath.OUTPUT_INDICES_MAP_DIR",
+]
+
+
+def get_file_fingerprint(file_path: str) -> List[int] | None:
+    """Return the size and modification time (in ns) of a file (None if it does not exist)"""
+    try:
+        file_stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+
+    return [file_stat.st_size, file_stat.st_mtime_ns]
+
+
+def get_shapefile_hash(shapefile_path: str) -> str:
+    """Return the sha1 of the content of a shapefile and of its component files (.shp, .dbf, ...)"""
+    stem = os.path.splitext(shapefile_path)[0]
+    component_paths = sorted({shapefile_path, *[stem + extension for extension in SHAPEFILE_EXTENSIONS]})
+    shapefile_hash = hashlib.sha1()
+    for component_path in component_paths:
+        if not os.path.isfile(component_path):
+            continue
+        shapefile_hash.update(os.path.basename(component_path).encode())
+        with open(component_path, "rb") as component_file:
+            while block := component_file.read(1024 * 1024):
+                shapefile_hash.update(block)
+
+    return shapefile_hash.hexdigest()
+
+
+def get_config_hash(config: DictConfig) -> str:
+    """Return the sha1 of the configuration keys that change the outputs of a tile (MANIFEST_CONFIG_KEYS)"""
+    values = {}
+    for key in MANIFEST_CONFIG_KEYS:
+        value = OmegaConf.select(config, key)
+        values[key] = OmegaConf.to_container(value) if OmegaConf.is_config(value) else value
+
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+
+def get_tile_inputs(
+    recipient_path: str,
+    donor_paths: List[str],
+    shapefile_hash: str,
+    config_hash: str,
+    input_indices_map_path: str | None = None,
+) -> Dict:
+    """Return the fingerprints of the inputs of a tile: size and modification time of the recipient, of each donor
+    file (and of the input indices map in replay mode), hash of the shapefile and hash of the configuration"""
+    return {
+        "recipient": get_file_fingerprint(recipient_path),
+        "donors": {donor_path: get_file_fingerprint(donor_path) for donor_path in sorted(donor_paths)},
+        "input_indices_map": get_file_fingerprint(input_indices_map_path) if input_indices_map_path else None,
+        "shapefile": shapefile_hash,
+        "config": config_hash,
+    }
+
+
+def get_inputs_fingerprint(inputs: Dict) -> str:
+    """Return a single hash of the fingerprints of the inputs of a tile (cf. get_tile_inputs)"""
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+class BatchManifest:
+    """Manifest of the tiles processed by the batch runs in an output directory, so that a batch run again (eg.
+    after a crash, or after some donors changed) only processes the tiles whose inputs changed, or that failed.
+
+    The manifest is a json lines file, with one entry per processed tile: recipient path, fingerprints of its inputs
+    (cf. get_tile_inputs) and their hash, status, number of added points and date. Entries are appended as soon as
+    a tile is processed, so that the manifest is up to date even if the batch stops. When a tile is processed
+    several times, its last entry is used, and the older ones are removed when the manifest is loaded.
+    """
+
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        if os.path.isfile(manifest_path):
+            nb_lines = 0
+            with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+                for line in manifest_file:
+                    nb_lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # last line partially written by a run that stopped
+                    self.entries[entry["recipient"]] = entry
+            if nb_lines > len(self.entries):
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the manifest with the last entry of each tile only"""
+        # write in a temporary file first, so that the manifest is never partially written
+        tmp_manifest_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_manifest_path, "w", encoding="utf-8") as manifest_file:
+            for entry in self.entries.values():
+                manifest_file.write(json.dumps(entry) + "\n")
+        os.replace(tmp_manifest_path, self.manifest_path)
+
+    def is_up_to_date(self, recipient_path: str, fingerprint: str, output_paths: List[str]) -> bool:
+        """Return true if the last run on a tile succeeded with the same inputs (fingerprint), and its outputs still
+        exist"""
+        entry = self.entries.get(recipient_path)
+        return (
+            entry is not None
+            and entry["status"] == "ok"  # STATUS_OK of patchwork.batch
+            and entry["fingerprint"] == fingerprint
+            and all(os.path.isfile(output_path) for output_path in output_paths)
+        )
+
+    def record(self, tile_report: Dict, inputs: Dict):
+        """Append the entry of a processed tile to the manifest (it can be called by several threads)
+
+        Args:
+            tile_report (Dict): report of the tile (see process_tile)
+            inputs (Dict): fingerprints of the inputs of the tile, computed before processing it (cf.
+            get_tile_inputs), so that an input modified during the run makes the next run process the tile again
+        """
+        entry = {
+            "recipient": tile_report["recipient"],
+            "fingerprint": get_inputs_fingerprint(inputs),
+            "inputs": inputs,
+            "status": tile_report["status"],
+            "added_points": tile_report["added_points"],
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._lock:
+            manifest_directory = os.path.dirname(self.manifest_path)
+            if manifest_directory:
+                os.makedirs(manifest_directory, exist_ok=True)
+            with open(self.manifest_path, "a", encoding="utf-8") as manifest_file:
+                manifest_file.write(json.dumps(entry) + "\n")
+            self.entries[entry["recipient"]] = entry
+
+
+def load_batch_manifest(config: DictConfig) -> BatchManifest | None:
+    """Load the manifest of the batch runs from config.filepath.OUTPUT_DIR/config.batch.MANIFEST_NAME (None if
+    config.batch.MANIFEST_NAME is not set, or in dry-run mode, where no output is written)"""
+    if not config.batch.MANIFEST_NAME or config.DRY_RUN:
+        return None
+
+    return BatchManifest(os.path.join(config.filepath.OUTPUT_DIR, config.batch.MANIFEST_NAME))
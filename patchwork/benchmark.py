@@ -0,0 +1,333 @@
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import laspy
+from omegaconf import DictConfig
+
+from patchwork.donor_catalog import load_donor_catalog
+from patchwork.donor_index import load_donor_index
+from patchwork.indices_map import create_indices_map
+from patchwork.patchwork import (
+    append_points,
+    get_complementary_points,
+    get_recipient_occupancy_grid,
+    get_selected_classes_points,
+    get_tile_donor_info,
+    patchwork,
+)
+from patchwork.run_report import get_peak_rss
+from patchwork.synthetic_tiles import (
+    SYNTHETIC_TILE_ORIGIN,
+    create_synthetic_dataset,
+    get_synthetic_dataset_config,
+)
+
+# a benchmark setup prepares the inputs of the measured function (not timed), and returns the function and the
+# number of points it processes
+BenchmarkSetup = Callable[[DictConfig, Dict], Tuple[Callable[[], object], int]]
+
+
+def setup_get_selected_classes_points(config: DictConfig, dataset: Dict) -> Tuple[Callable[[], object], int]:
+    """Selection of the points of a whole donor file"""
+    donor_points = laspy.read(dataset["donor_paths"][0]).points
+    fields_to_keep = [dimension.lower() for dimension in donor_points.point_format.dimension_names]
+
+    def run():
+        return get_selected_classes_points(
+            SYNTHETIC_TILE_ORIGIN,
+            donor_points,
+            config.DONOR_CLASS_LIST,
+            config.DONOR_USE_SYNTHETIC_POINTS,
+            fields_to_keep,
+            config.PATCH_SIZE,
+            config.TILE_SIZE,
+        )
+
+    return run, len(donor_points)
+
+
+def get_recipient_path(config: DictConfig) -> str:
+    return os.path.join(config.filepath.RECIPIENT_DIRECTORY, config.filepath.RECIPIENT_NAME)
+
+
+def setup_get_complementary_points(config: DictConfig, dataset: Dict) -> Tuple[Callable[[], object], int]:
+    """Reading of the donors and selection of their points in the empty patches of the recipient"""
+    recipient_occupancy_grid = get_recipient_occupancy_grid(get_recipient_path(config), SYNTHETIC_TILE_ORIGIN, config)
+    donor_catalog = load_donor_catalog(config)
+    donor_info = get_tile_donor_info(
+        config, SYNTHETIC_TILE_ORIGIN, recipient_occupancy_grid, load_donor_index(config), donor_catalog
+    )
+
+    def run():
+        return get_complementary_points(
+            donor_info,
+            get_recipient_path(config),
+            SYNTHETIC_TILE_ORIGIN,
+            config,
+            recipient_occupancy_grid,
+            donor_catalog,
+        )
+
+    return run, dataset["nb_donor_points"]
+
+
+def setup_append_points(config: DictConfig, dataset: Dict) -> Tuple[Callable[[], object], int]:
+    """Writing of the output file (recipient points and complementary points)"""
+    complementary_points = setup_get_complementary_points(config, dataset)[0]()
+
+    def run():
+        return append_points(config, complementary_points)
+
+    return run, dataset["nb_recipient_points"] + len(complementary_points.index)
+
+
+def setup_create_indices_map(config: DictConfig, dataset: Dict) -> Tuple[Callable[[], object], int]:
+    """Writing of the indices map from the complementary points"""
+    complementary_points = setup_get_complementary_points(config, dataset)[0]()
+
+    def run():
+        return create_indices_map(config, complementary_points, *SYNTHETIC_TILE_ORIGIN)
+
+    return run, len(complementary_points.index)
+
+
+def setup_patchwork(config: DictConfig, dataset: Dict) -> Tuple[Callable[[], object], int]:
+    """Whole patchwork run on the tile (shapefile reading included)"""
+
+    def run():
+        return patchwork(config)
+
+    return run, dataset["nb_recipient_points"] + dataset["nb_donor_points"]
+
+
+BENCHMARKS: Dict[str, BenchmarkSetup] = {
+    "get_selected_classes_points": setup_get_selected_classes_points,
+    "get_complementary_points": setup_get_complementary_points,
+    "append_points": setup_append_points,
+    "create_indices_map": setup_create_indices_map,
+    "patchwork": setup_patchwork,
+}
+
+
+def get_resident_memory() -> Tuple[int, int] | None:
+    """Return the current and peak resident memory of the current process (in bytes), read in /proc/self/status
+    (None if it is not available, eg. on macOS). Unlike get_peak_rss, the peak can be reset (cf. reset_peak_rss)."""
+    resident_memory = {}
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as status_file:
+            for line in status_file:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    name, value = line.split(":")
+                    resident_memory[name] = int(value.split()[0]) * 1024  # in kB
+    except OSError:
+        return None
+    if len(resident_memory) < 2:
+        return None
+
+    return resident_memory["VmRSS"], resident_memory["VmHWM"]
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak resident memory of the current process (as read by get_resident_memory) to its current
+    resident memory, so that the peak of the next operations can be measured (Linux only)
+
+    Returns:
+        bool: false if the peak could not be reset
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="utf-8") as clear_refs_file:
+            clear_refs_file.write("5")
+    except OSError:
+        return False
+
+    return get_resident_memory() is not None
+
+
+def run_benchmark(benchmark_name: str, config: DictConfig, dataset: Dict, repeat: int) -> Dict:
+    """Run a benchmark repeat times (after its setup) in the current process.
+
+    The memory of the runs is measured from the end of the setup: its inputs (eg. the decoded donors of
+    append_points) stay in memory, but the peak reached while preparing them is not counted.
+
+    Returns:
+        Dict: wall times of each run (in s), median wall time, number of points processed, throughput (points/s),
+        and resident memory of the process (in bytes): peak before the setup (initial_rss), current after the setup
+        (setup_rss), peak during the runs (run_peak_rss) and its increase from setup_rss (run_peak_rss_delta), and
+        peak of the whole process, setup included (process_peak_rss). The values measured from the end of the setup
+        are None if the peak resident memory cannot be reset (cf. reset_peak_rss).
+    """
+    initial_rss = get_peak_rss()
+    run, nb_points = BENCHMARKS[benchmark_name](config, dataset)
+    # read before the reset, which also resets the peak returned by get_peak_rss
+    setup_peak_rss = get_peak_rss()
+    setup_rss = get_resident_memory()[0] if reset_peak_rss() else None
+
+    wall_times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        run()
+        wall_times.append(time.perf_counter() - begin)
+    wall_time = statistics.median(wall_times)
+    run_peak_rss = get_resident_memory()[1] if setup_rss is not None else None
+
+    return {
+        "wall_times": wall_times,
+        "wall_time": wall_time,
+        "points": nb_points,
+        "points_per_second": nb_points / wall_time if wall_time > 0 else None,
+        "initial_rss": initial_rss,
+        "setup_rss": setup_rss,
+        "run_peak_rss": run_peak_rss,
+        "run_peak_rss_delta": run_peak_rss - setup_rss if setup_rss is not None else None,
+        "process_peak_rss": max(setup_peak_rss, get_peak_rss(), run_peak_rss or 0),
+    }
+
+
+def get_memory_summary(result: Dict) -> str:
+    """Return the memory measures of a benchmark result (cf. run_benchmark), in MB, for the printed summary"""
+    summary = f"process peak with setup {result['process_peak_rss'] / 1024 / 1024:.0f} MB"
+    if result["run_peak_rss_delta"] is None:
+        return summary
+
+    return f"+{result['run_peak_rss_delta'] / 1024 / 1024:.0f} MB during the runs ({summary})"
+
+
+def get_git_commit() -> str | None:
+    """Return the current git commit of the repository (None if it is not available)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def patchwork_benchmark(config: DictConfig) -> Dict:
+    """Run the benchmarks of config.benchmark.BENCHMARKS on synthetic tiles, for each combination of the
+    config.benchmark parameters (DENSITIES, HOLE_RATIOS, DONOR_COUNTS, PATCH_SIZES), and write the results in
+    config.benchmark.OUTPUT_PATH (json) to compare them between commits. If config.benchmark.REFERENCE_PATH is set
+    (results of a previous run), the wall times are compared to the reference ones.
+
+    The tiles (of config.TILE_SIZE) are created in config.benchmark.WORK_DIRECTORY. Each benchmark runs in a new
+    process, so that its peak memory is not affected by the previous ones (cf. run_benchmark for the memory
+    measures).
+
+    Args:
+        config (DictConfig): patchwork configuration, with a "benchmark" section
+
+    Returns:
+        Dict: the benchmark results
+    """
+    results = []
+    for density, hole_ratio, nb_donors, patch_size in itertools.product(
+        config.benchmark.DENSITIES,
+        config.benchmark.HOLE_RATIOS,
+        config.benchmark.DONOR_COUNTS,
+        config.benchmark.PATCH_SIZES,
+    ):
+        parameters = {
+            "tile_size": config.TILE_SIZE,
+            "density": density,
+            "hole_ratio": hole_ratio,
+            "nb_donors": nb_donors,
+            "patch_size": patch_size,
+            "compressed": config.benchmark.COMPRESSED,
+        }
+        case_directory = os.path.join(
+            config.benchmark.WORK_DIRECTORY, "_".join(f"{key}-{value}" for key, value in parameters.items())
+        )
+        dataset = create_synthetic_dataset(
+            os.path.join(case_directory, "input"),
+            config.TILE_SIZE,
+            density,
+            hole_ratio,
+            nb_donors,
+            patch_size,
+            config.benchmark.COMPRESSED,
+            config.benchmark.SEED,
+        )
+        dataset_config = get_synthetic_dataset_config(config, dataset, os.path.join(case_directory, "output"))
+        parameters["nb_recipient_points"] = dataset["nb_recipient_points"]
+        parameters["nb_donor_points"] = dataset["nb_donor_points"]
+
+        for benchmark_name in config.benchmark.BENCHMARKS:
+            # "spawn" start method: a new process, whose memory only depends on this benchmark
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                result = executor.submit(
+                    run_benchmark, benchmark_name, dataset_config, dataset, config.benchmark.REPEAT
+                ).result()
+            results.append({"benchmark": benchmark_name, "parameters": parameters, **result})
+            print(
+                f"{benchmark_name} {parameters}: {result['wall_time']:.3f} s, "
+                f"{result['points_per_second'] or 0:.0f} points/s, {get_memory_summary(result)}"
+            )
+
+    benchmark_report = {
+        "commit": get_git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": config.benchmark.REPEAT,
+        "results": results,
+    }
+    if config.benchmark.REFERENCE_PATH:
+        with open(config.benchmark.REFERENCE_PATH, "r", encoding="utf-8") as reference_file:
+            reference_report = json.load(reference_file)
+        benchmark_report["reference_commit"] = reference_report.get("commit")
+        benchmark_report["comparison"] = compare_benchmarks(reference_report["results"], results)
+        for comparison in benchmark_report["comparison"]:
+            print(
+                f"{comparison['benchmark']} {comparison['parameters']}: {comparison['reference_wall_time']:.3f} s -> "
+                f"{comparison['wall_time']:.3f} s"
+            )
+    if config.benchmark.OUTPUT_PATH:
+        output_directory = os.path.dirname(config.benchmark.OUTPUT_PATH)
+        if output_directory:
+            os.makedirs(output_directory, exist_ok=True)
+        with open(config.benchmark.OUTPUT_PATH, "w", encoding="utf-8") as output_file:
+            json.dump(benchmark_report, output_file, indent=2)
+
+    return benchmark_report
+
+
+def compare_benchmarks(reference_results: List[Dict], results: List[Dict]) -> List[Dict]:
+    """Compare the median wall times of two benchmark runs (cf. patchwork_benchmark), for the benchmarks run with
+    the same parameters in both
+
+    Returns:
+        List[Dict]: benchmark name, parameters, reference and new wall times, and ratio (new / reference)
+    """
+    reference_wall_times = {
+        (result["benchmark"], json.dumps(result["parameters"], sort_keys=True)): result["wall_time"]
+        for result in reference_results
+    }
+    comparison = []
+    for result in results:
+        reference_wall_time = reference_wall_times.get(
+            (result["benchmark"], json.dumps(result["parameters"], sort_keys=True))
+        )
+        if reference_wall_time is None:
+            continue
+        comparison.append(
+            {
+                "benchmark": result["benchmark"],
+                "parameters": result["parameters"],
+                "reference_wall_time": reference_wall_time,
+                "wall_time": result["wall_time"],
+                "ratio": result["wall_time"] / reference_wall_time if reference_wall_time > 0 else None,
+            }
+        )
+
+    return comparison
@@ -2,4 +2,3 @@
 CLASSIFICATION_STR = "classification"
 PATCH_X_STR = "patch_x"
 PATCH_Y_STR = "patch_y"
-RECIPIENT_SUFFIX = "_recipient"
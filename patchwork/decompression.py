@@ -0,0 +1,58 @@
+from typing import Iterable
+
+from laspy import DecompressionSelection
+
+# LAZ layer containing each standard dimension (lowercase) of the point formats 6 to 10. Other dimensions are extra
+# bytes
+DIMENSION_LAYERS = {
+    "x": DecompressionSelection.XY_RETURNS_CHANNEL,
+    "y": DecompressionSelection.XY_RETURNS_CHANNEL,
+    "return_number": DecompressionSelection.XY_RETURNS_CHANNEL,
+    "number_of_returns": DecompressionSelection.XY_RETURNS_CHANNEL,
+    "scanner_channel": DecompressionSelection.XY_RETURNS_CHANNEL,
+    "z": DecompressionSelection.Z,
+    "classification": DecompressionSelection.CLASSIFICATION,
+    "synthetic": DecompressionSelection.FLAGS,
+    "key_point": DecompressionSelection.FLAGS,
+    "withheld": DecompressionSelection.FLAGS,
+    "overlap": DecompressionSelection.FLAGS,
+    "scan_direction_flag": DecompressionSelection.FLAGS,
+    "edge_of_flight_line": DecompressionSelection.FLAGS,
+    "intensity": DecompressionSelection.INTENSITY,
+    "scan_angle": DecompressionSelection.SCAN_ANGLE,
+    "user_data": DecompressionSelection.USER_DATA,
+    "point_source_id": DecompressionSelection.POINT_SOURCE_ID,
+    "gps_time": DecompressionSelection.GPS_TIME,
+    "red": DecompressionSelection.RGB,
+    "green": DecompressionSelection.RGB,
+    "blue": DecompressionSelection.RGB,
+    "nir": DecompressionSelection.NIR,
+    "wavepacket_index": DecompressionSelection.WAVEPACKET,
+    "wavepacket_offset": DecompressionSelection.WAVEPACKET,
+    "wavepacket_size": DecompressionSelection.WAVEPACKET,
+    "return_point_wave_location": DecompressionSelection.WAVEPACKET,
+    "x_t": DecompressionSelection.WAVEPACKET,
+    "y_t": DecompressionSelection.WAVEPACKET,
+    "z_t": DecompressionSelection.WAVEPACKET,
+}
+
+
+def get_decompression_selection(dimension_names: Iterable[str]) -> DecompressionSelection:
+    """Return the selection of the LAZ layers to decompress to read dimension_names (x, y, return numbers and scanner
+    channel are always decompressed).
+
+    The selection is only used by laspy for LAS 1.4 files with a point format of 6 or above (layered compression):
+    all the dimensions are decompressed for the other formats. The dimensions that are not decompressed keep the
+    value of the first point of each chunk, they must not be used.
+
+    Args:
+        dimension_names (Iterable[str]): names of the dimensions to read (lowercase)
+
+    Returns:
+        DecompressionSelection: layers to decompress
+    """
+    selection = DecompressionSelection.base()
+    for dimension_name in dimension_names:
+        selection |= DIMENSION_LAYERS.get(dimension_name, DecompressionSelection.ALL_EXTRA_BYTES)
+
+    return selection
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Tuple
+
+import numpy as np
+from laspy import ScaleAwarePointRecord
+from omegaconf import DictConfig
+from shapely.geometry.base import BaseGeometry
+
+
+def get_donor_cache_key(
+    donor_file_path: str, footprint: BaseGeometry, config: DictConfig, decompressed_fields: List[str] | None = None
+) -> Tuple:
+    """Key of the points selected in a donor file: the same file (unchanged since it was read), with the same
+    footprint, the same classes selection, and the same decompressed fields"""
+    file_stat = os.stat(donor_file_path)
+    return (
+        donor_file_path,
+        file_stat.st_mtime,
+        file_stat.st_size,
+        footprint.wkb,
+        tuple(config.DONOR_CLASS_LIST),
+        config.DONOR_USE_SYNTHETIC_POINTS,
+        tuple(sorted(decompressed_fields)) if decompressed_fields is not None else None,
+    )
+
+
+class DonorCache:
+    """In-memory LRU cache of the points selected in donor files (points inside the donor footprint, from the
+    selected classes), so that a donor file used by several tiles is decoded only once.
+
+    The points are stored as laspy point records (ie. compact numpy structured arrays). When the total size of the
+    stored records is over max_size (in bytes), the least recently used ones are removed. The cache can be used by
+    several threads (eg. donors loaded in parallel).
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._records: OrderedDict[Hashable, ScaleAwarePointRecord] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> ScaleAwarePointRecord | None:
+        """Return the points stored for key (None if they are not in the cache)"""
+        with self._lock:
+            points = self._records.get(key)
+            if points is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._records.move_to_end(key)
+
+        return points
+
+    def put(self, key: Hashable, points: ScaleAwarePointRecord):
+        """Store points for key, and remove the least recently used points if the cache is too big. Points that are
+        bigger than the cache on their own are not stored."""
+        points_size = points.array.nbytes
+        if points_size > self.max_size:
+            return
+
+        with self._lock:
+            if key in self._records:
+                self.size -= self._records.pop(key).array.nbytes
+            self._records[key] = points
+            self.size += points_size
+
+            while self.size > self.max_size:
+                _, evicted_points = self._records.popitem(last=False)
+                self.size -= evicted_points.array.nbytes
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return the cache counters: hits, misses, number of stored records and their size (in bytes)"""
+        return {"hits": self.hits, "misses": self.misses, "records": len(self._records), "size": self.size}
+
+
+class SharedDonorCache(DonorCache):
+    """Cache of the points selected in donor files, shared by all the processes that use the same directory (eg.
+    the workers of a batch).
+
+    Each record is stored in the directory as a .npy file (the point array) and a .meta file (the point format,
+    scales and offsets needed to read it). Records are memory-mapped when they are read, so the processes share
+    the same pages in memory instead of each decoding the donor file again.
+
+    When the total size of the directory is over max_size (in bytes), the least recently used records are
+    deleted. A deleted record that is still mapped by a process remains readable by it until it is released (the
+    system keeps a reference to the file as long as it is mapped).
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        super().__init__(max_size)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_record_path(self, key: Hashable) -> str:
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest())
+
+    def get(self, key: Hashable) -> ScaleAwarePointRecord | None:
+        """Return the points stored for key, memory-mapped (None if they are not in the cache)"""
+        record_path = self._get_record_path(key)
+        try:
+            with open(f"{record_path}.meta", "rb") as meta_file:
+                point_format, scales, offsets = pickle.load(meta_file)
+            array = np.load(f"{record_path}.npy", mmap_mode="r")
+        except (FileNotFoundError, EOFError, ValueError):
+            # not in the cache, or removed by another process while reading it
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(f"{record_path}.npy")  # mark the record as recently used
+        except FileNotFoundError:
+            pass  # removed by another process since it was mapped: still readable by this one
+        with self._lock:
+            self.hits += 1
+        return ScaleAwarePointRecord(array, point_format, scales, offsets)
+
+    def put(self, key: Hashable, points: ScaleAwarePointRecord):
+        """Store points for key, and remove the least recently used records if the cache is too big. Points that are
+        bigger than the cache on their own are not stored."""
+        if points.array.nbytes > self.max_size:
+            return
+
+        # write in temporary files first, so that another process never reads a partial record. The .npy file is
+        # written last, as it is the one that makes the record visible
+        record_path = self._get_record_path(key)
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{record_path}.meta{tmp_suffix}", "wb") as meta_file:
+            pickle.dump((points.point_format, points.scales, points.offsets), meta_file)
+        os.replace(f"{record_path}.meta{tmp_suffix}", f"{record_path}.meta")
+        with open(f"{record_path}.npy{tmp_suffix}", "wb") as array_file:
+            np.save(array_file, points.array)
+        os.replace(f"{record_path}.npy{tmp_suffix}", f"{record_path}.npy")
+
+        self._evict()
+
+    def _get_records(self) -> List[Tuple[float, int, str]]:
+        """List the records stored in the directory: (last use time, size, path without extension)"""
+        records = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(".npy"):
+                    try:
+                        entry_stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # removed by another process
+                    records.append((entry_stat.st_mtime, entry_stat.st_size, entry.path[: -len(".npy")]))
+
+        return records
+
+    def _evict(self):
+        """Delete the least recently used records until the directory is not bigger than max_size"""
+        records = self._get_records()
+        self.size = sum(record_size for _, record_size, _ in records)
+        for _, record_size, record_path in sorted(records):
+            if self.size <= self.max_size:
+                break
+            for extension in [".npy", ".meta"]:
+                try:
+                    os.remove(record_path + extension)
+                except FileNotFoundError:
+                    pass  # already deleted by another process
+            self.size -= record_size
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return the cache counters: hits and misses of this process, number of records and their size (in bytes)"""
+        records = self._get_records()
+        self.size = sum(record_size for _, record_size, _ in records)
+
+        return {"hits": self.hits, "misses": self.misses, "records": len(records), "size": self.size}
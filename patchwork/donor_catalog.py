@@ -0,0 +1,153 @@
+import json
+import os
+import re
+from typing import Dict, List, Tuple
+
+import laspy
+from omegaconf import DictConfig
+
+CATALOG_VERSION = 1
+DONOR_EXTENSIONS = (".las", ".laz")
+
+# pairs of numbers separated by "_" in a filename (eg. "0673_6363" in "NUALID_PTS_0673_6363_LAMB93.laz").
+# The lookahead makes the pairs overlap, so that "0673_6363_2021" gives (0673, 6363) and (6363, 2021)
+COORDINATES_PATTERN = re.compile(r"(?=(?<!\d)(\d+)_(\d+)(?!\d))")
+
+
+def get_coordinates_from_filename(filename: str) -> List[Tuple[int, int]]:
+    """Return all the (x, y) coordinates that can be read in a donor filename, ie. each pair of numbers separated
+    by an underscore"""
+    return [(int(x), int(y)) for x, y in COORDINATES_PATTERN.findall(filename)]
+
+
+class DonorCatalog:
+    """Catalog of the donor files, to avoid listing the donor directories (which may be on a network mount) and
+    reopening the donor headers for each tile.
+
+    For each donor directory, the catalog stores the las/laz filenames (listed once with os.scandir, and listed
+    again only if the directory modification time changes) indexed by the coordinates found in their names, and
+    the header information of the files that have been opened (point format, dimensions, bounds), which is reused
+    as long as the file size and modification time do not change.
+
+    If catalog_path is set, the catalog is loaded from this json file, and can be saved to it to be reused by the
+    next runs.
+    """
+
+    def __init__(self, catalog_path: str | None = None):
+        self.catalog_path = catalog_path
+        self.directories: Dict[str, Dict] = {}
+        self.headers: Dict[str, Dict] = {}
+        self._coordinates_index: Dict[str, Dict[Tuple[int, int], List[str]]] = {}
+        self._is_modified = False
+
+        if catalog_path and os.path.isfile(catalog_path):
+            with open(catalog_path, "r", encoding="utf-8") as catalog_file:
+                content = json.load(catalog_file)
+            if content.get("version") == CATALOG_VERSION:
+                self.directories = content["directories"]
+                self.headers = content["headers"]
+
+    def get_directory_files(self, directory: str) -> List[str]:
+        """Return the names of the las/laz files of a directory, listing the directory only if it changed since
+        the last time it was listed.
+
+        Raises:
+            FileNotFoundError: if the directory does not exist
+        """
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Directory {directory} not found")
+
+        directory_mtime = os.stat(directory).st_mtime
+        directory_info = self.directories.get(directory)
+        if directory_info is None or directory_info["mtime"] != directory_mtime:
+            with os.scandir(directory) as entries:
+                filenames = sorted(
+                    entry.name for entry in entries if entry.name.endswith(DONOR_EXTENSIONS) and entry.is_file()
+                )
+            directory_info = {"mtime": directory_mtime, "files": filenames}
+            self.directories[directory] = directory_info
+            self._coordinates_index.pop(directory, None)
+            self._is_modified = True
+
+        return directory_info["files"]
+
+    def find_donor_file(self, directory: str, x: int, y: int) -> str:
+        """Return the path to the only las/laz file of a directory whose name contains the coordinates {x}_{y}.
+
+        Raises:
+            FileNotFoundError: if the directory does not exist
+            FileNotFoundError: if there is no file corresponding to coordinates {x}_{y} in the directory
+            RuntimeError: if there is several files corresponding to coordinates {x}_{y} in the directory
+        """
+        filenames = self.get_directory_files(directory)
+
+        if directory not in self._coordinates_index:
+            coordinates_index = {}
+            for filename in filenames:
+                for coordinates in set(get_coordinates_from_filename(filename)):
+                    coordinates_index.setdefault(coordinates, []).append(filename)
+            self._coordinates_index[directory] = coordinates_index
+
+        potential_filenames = self._coordinates_index[directory].get((int(x), int(y)), [])
+        if not potential_filenames:
+            raise FileNotFoundError(f"Could not match any file with directory {directory} and coords ({x}, {y})")
+        if len(potential_filenames) > 1:
+            raise RuntimeError(
+                f"Found multiple files for directory {directory} and coords ({x}, {y}): {potential_filenames}"
+            )
+
+        return os.path.join(directory, potential_filenames[0])
+
+    def get_header_info(self, file_path: str) -> Dict:
+        """Return information from the header of a las/laz file: point format id, dimension names (lowercase),
+        bounds (minx, miny, maxx, maxy) and number of points. The header is read only if the file changed since
+        the last time it was read."""
+        file_stat = os.stat(file_path)
+        header_info = self.headers.get(file_path)
+        if (
+            header_info is None
+            or header_info["size"] != file_stat.st_size
+            or header_info["mtime"] != file_stat.st_mtime
+        ):
+            with laspy.open(file_path) as las_file:
+                header = las_file.header
+                header_info = {
+                    "size": file_stat.st_size,
+                    "mtime": file_stat.st_mtime,
+                    "point_format": header.point_format.id,
+                    "dimensions": [dimension.name.lower() for dimension in header.point_format.dimensions],
+                    "bounds": [
+                        float(header.mins[0]),
+                        float(header.mins[1]),
+                        float(header.maxs[0]),
+                        float(header.maxs[1]),
+                    ],
+                    "point_count": header.point_count,
+                }
+            self.headers[file_path] = header_info
+            self._is_modified = True
+
+        return header_info
+
+    def save(self):
+        """Save the catalog to catalog_path (if it is set and the catalog changed since it was loaded)"""
+        if not self.catalog_path or not self._is_modified:
+            return
+
+        catalog_directory = os.path.dirname(self.catalog_path)
+        if catalog_directory:
+            os.makedirs(catalog_directory, exist_ok=True)
+        # write in a temporary file first, so that a concurrent process never reads a partial catalog
+        tmp_catalog_path = f"{self.catalog_path}.{os.getpid()}.tmp"
+        with open(tmp_catalog_path, "w", encoding="utf-8") as catalog_file:
+            json.dump(
+                {"version": CATALOG_VERSION, "directories": self.directories, "headers": self.headers}, catalog_file
+            )
+        os.replace(tmp_catalog_path, self.catalog_path)
+        self._is_modified = False
+
+
+def load_donor_catalog(config: DictConfig) -> DonorCatalog:
+    """Load the donor catalog from config.filepath.DONOR_CATALOG_PATH (new empty catalog if it is not set or if the
+    file does not exist yet)"""
+    return DonorCatalog(config.filepath.DONOR_CATALOG_PATH)
@@ -0,0 +1,105 @@
+import os
+from typing import Dict, List, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from omegaconf import DictConfig
+from shapely.geometry import box
+
+SHAPEFILE_EXTENSIONS = [".shp", ".shx", ".dbf", ".prj", ".cpg"]
+CACHE_EXTENSION = ".fgb"
+
+
+def get_shapefile_mtime(shapefile_path: str) -> float:
+    """Return the last modification time of a shapefile, ie. the most recent one among its component files
+    (.shp, .dbf, ...)"""
+    stem = os.path.splitext(shapefile_path)[0]
+    component_paths = [stem + extension for extension in SHAPEFILE_EXTENSIONS]
+
+    return max(os.path.getmtime(path) for path in [shapefile_path, *component_paths] if os.path.isfile(path))
+
+
+def read_donor_shapefile(shapefile_path: str, cache_directory: str | None = None) -> gpd.GeoDataFrame:
+    """Read the shapefile describing the donor files.
+
+    If cache_directory is set, the shapefile content is also stored there as a FlatGeobuf file (same name, with a
+    .fgb extension), which is read instead of the shapefile as long as it is more recent than the shapefile.
+
+    Args:
+        shapefile_path (str): path to the shapefile
+        cache_directory (str | None, optional): directory of the cached copy of the shapefile. Defaults to None
+        (no cache).
+
+    Returns:
+        gpd.GeoDataFrame: content of the shapefile, in the shapefile order
+    """
+    if not cache_directory:
+        return gpd.GeoDataFrame.from_file(shapefile_path, encoding="utf-8")
+
+    cache_path = os.path.join(cache_directory, os.path.splitext(os.path.basename(shapefile_path))[0] + CACHE_EXTENSION)
+    if os.path.isfile(cache_path) and os.path.getmtime(cache_path) >= get_shapefile_mtime(shapefile_path):
+        return gpd.GeoDataFrame.from_file(cache_path)
+
+    gdf = gpd.GeoDataFrame.from_file(shapefile_path, encoding="utf-8")
+    os.makedirs(cache_directory, exist_ok=True)
+    # write in a temporary file first, so that a concurrent process never reads a partial cache.
+    # The flatgeobuf spatial index is disabled as it would reorder the features
+    tmp_cache_path = f"{os.path.splitext(cache_path)[0]}.{os.getpid()}.tmp{CACHE_EXTENSION}"
+    gdf.to_file(tmp_cache_path, driver="FlatGeobuf", SPATIAL_INDEX="NO")
+    os.replace(tmp_cache_path, cache_path)
+
+    return gdf
+
+
+class DonorIndex:
+    """Index on the content of the donor shapefile, to get the donors of a tile without scanning the whole
+    shapefile:
+    - by the (x, y) attributes of the geometries, with a dictionary
+    - by bounding box, with a spatial index (STRtree) on the geometries, built on the first query
+
+    Queries return the matching rows in the shapefile order.
+    """
+
+    def __init__(self, gdf: gpd.GeoDataFrame):
+        self.gdf = gdf.reset_index(drop=True)
+        self._tree = None
+
+        self.positions_by_coordinates: Dict[Tuple[int, int], List[int]] = {}
+        coordinates = zip(self.gdf["x"].astype(int).tolist(), self.gdf["y"].astype(int).tolist())
+        for position, key in enumerate(coordinates):
+            self.positions_by_coordinates.setdefault(key, []).append(position)
+
+    def query(self, x: float, y: float) -> gpd.GeoDataFrame:
+        """Get the rows whose x and y attributes are equal to (x, y)"""
+        positions = []
+        if x == int(x) and y == int(y):
+            positions = self.positions_by_coordinates.get((int(x), int(y)), [])
+
+        return self.gdf.iloc[positions]
+
+    def query_bounds(self, bounds: Tuple[float, float, float, float]) -> gpd.GeoDataFrame:
+        """Get the rows whose geometry intersects the bounding box (minx, miny, maxx, maxy). Geometries that only
+        touch the bounding box (eg. the footprint of a neighbouring tile) are not returned."""
+        if self._tree is None:
+            self._tree = shapely.STRtree(self.gdf.geometry.values)
+
+        bounds_geometry = box(*bounds)
+        positions = self._tree.query(bounds_geometry, predicate="intersects")
+        positions = positions[~shapely.touches(self.gdf.geometry.values[positions], bounds_geometry)]
+
+        return self.gdf.iloc[np.sort(positions)]
+
+    def __getstate__(self):
+        # the spatial index is rebuilt when needed rather than sent to other processes
+        state = self.__dict__.copy()
+        state["_tree"] = None
+        return state
+
+
+def load_donor_index(config: DictConfig) -> DonorIndex:
+    """Read the donor shapefile from config.filepath.SHP_DIRECTORY/SHP_NAME (using the cache in
+    config.filepath.SHP_CACHE_DIRECTORY if it is set) and index it"""
+    shapefile_path = os.path.join(config.filepath.SHP_DIRECTORY, config.filepath.SHP_NAME)
+
+    return DonorIndex(read_donor_shapefile(shapefile_path, config.filepath.SHP_CACHE_DIRECTORY))
@@ -0,0 +1,175 @@
+import fcntl
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator
+
+from omegaconf import DictConfig
+
+
+class DonorStaging:
+    """Local copies of the donor files, for donor files on slow (eg. network) storage.
+
+    A donor file is copied once in a local directory, and its copy is used as long as it has the same size and
+    modification time as the original file. When the local directory gets bigger than max_size (in bytes), the
+    least recently used copies are deleted.
+
+    Files can be prefetched: they are then copied in background threads, and get_local_path waits for the copy in
+    progress instead of starting a new one.
+
+    Each copy has a lock file (same name, with a .lock extension), shared by all the processes that use the
+    directory (eg. the workers of a batch): a copy is made while holding an exclusive lock, so that a file being
+    copied by another process is waited for instead of being copied again, and a copy in use (cf. local_copy) is
+    held with a shared lock, so that it is not deleted by the eviction of another thread or process.
+    """
+
+    def __init__(self, directory: str, max_size: int, max_workers: int = 2):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_workers = max_workers
+        os.makedirs(directory, exist_ok=True)
+
+        self._executor = None
+        self._prefetches: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_staged_path(self, remote_path: str) -> str:
+        """Return the path of the local copy of a file (which may not exist yet)"""
+        path_hash = hashlib.sha1(os.path.abspath(remote_path).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{path_hash}_{os.path.basename(remote_path)}")
+
+    @staticmethod
+    def _is_staged(remote_path: str, staged_path: str) -> bool:
+        """Return true if staged_path is a valid copy of remote_path (same size and modification time)"""
+        remote_stat = os.stat(remote_path)
+        try:
+            staged_stat = os.stat(staged_path)
+        except FileNotFoundError:
+            return False
+
+        return staged_stat.st_size == remote_stat.st_size and staged_stat.st_mtime_ns == remote_stat.st_mtime_ns
+
+    def stage(self, remote_path: str) -> str:
+        """Copy a file in the local directory if there is no valid copy of it yet, and return the path to the copy.
+        The copy is not protected from eviction once this function returns (use local_copy to read it)."""
+        staged_path = self.get_staged_path(remote_path)
+
+        # exclusive lock: a copy in progress in another thread or process is waited for, instead of being done twice
+        with open(f"{staged_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            remote_mtime_ns = os.stat(remote_path).st_mtime_ns
+            if not self._is_staged(remote_path, staged_path):
+                # copy in a temporary file first, so that another process never uses a partial copy
+                tmp_staged_path = f"{staged_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                shutil.copyfile(remote_path, tmp_staged_path)
+                os.utime(tmp_staged_path, ns=(time.time_ns(), remote_mtime_ns))
+                os.replace(tmp_staged_path, staged_path)
+                self._evict(keep_path=staged_path)
+            else:
+                # the access time is used to find the least recently used copies, the modification time must stay
+                # the one of the original file
+                os.utime(staged_path, ns=(time.time_ns(), remote_mtime_ns))
+
+        return staged_path
+
+    def get_local_path(self, remote_path: str) -> str:
+        """Return the path to a valid local copy of a file (waiting for its prefetch if it is in progress). The copy
+        may be deleted by a later eviction: use local_copy to read it."""
+        future = self._prefetches.get(remote_path)
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass  # the prefetch failed: try again, so that the error is raised here
+
+        return self.stage(remote_path)
+
+    @contextmanager
+    def local_copy(self, remote_path: str) -> Iterator[str]:
+        """Yield the path to a valid local copy of a file (cf. get_local_path), which is not deleted by the eviction
+        of any thread or process until the context exits"""
+        staged_path = self.get_local_path(remote_path)
+        with open(f"{staged_path}.lock", "a") as lock_file:
+            while True:
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                if self._is_staged(remote_path, staged_path):
+                    break
+                # evicted (or the remote file changed) between the copy and the lock: copy it again
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                self.stage(remote_path)
+            yield staged_path
+
+    def prefetch(self, remote_paths: Iterable[str]):
+        """Start copying files in the local directory in background threads"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            for remote_path in remote_paths:
+                if remote_path not in self._prefetches:
+                    future = self._executor.submit(self.stage, remote_path)
+                    self._prefetches[remote_path] = future
+                    future.add_done_callback(lambda _, path=remote_path: self._prefetches.pop(path, None))
+
+    def close(self):
+        """Wait for the prefetches in progress"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _evict(self, keep_path: str):
+        """Delete the least recently used copies until the local directory is not bigger than max_size (keep_path,
+        and the copies in use or being copied, ie. locked by any thread or process, are never deleted)"""
+        with self._lock:
+            staged_files = []
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith((".tmp", ".lock")) or entry.path == keep_path:
+                        continue
+                    try:
+                        entry_stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # removed by another process
+                    staged_files.append((entry_stat.st_atime_ns, entry_stat.st_size, entry.path))
+
+            size = os.path.getsize(keep_path) + sum(file_size for _, file_size, _ in staged_files)
+            for _, file_size, file_path in sorted(staged_files):
+                if size <= self.max_size:
+                    break
+                # the lock files are never deleted: a process waiting for a deleted lock file would not exclude the
+                # processes that create a new one
+                with open(f"{file_path}.lock", "a") as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # in use, or being copied again
+                    try:
+                        os.remove(file_path)
+                    except FileNotFoundError:
+                        pass  # already deleted by another process
+                size -= file_size
+
+    def __getstate__(self):
+        # threads and prefetches in progress are specific to a process
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        state["_prefetches"] = {}
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def get_donor_staging(config: DictConfig) -> DonorStaging | None:
+    """Create the local staging of the donor files in config.filepath.DONOR_STAGING_DIRECTORY, with a size of
+    config.DONOR_STAGING_SIZE MB (None if the directory is not set, or in dry-run mode, where the donors are not
+    read)"""
+    if not config.filepath.DONOR_STAGING_DIRECTORY or config.DRY_RUN:
+        return None
+
+    return DonorStaging(config.filepath.DONOR_STAGING_DIRECTORY, int(config.DONOR_STAGING_SIZE * 1024 * 1024))
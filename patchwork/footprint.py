@@ -0,0 +1,106 @@
+from typing import Tuple
+
+import numpy as np
+import shapely
+from rasterio.features import rasterize
+from rasterio.transform import from_origin
+from shapely.geometry.base import BaseGeometry
+
+from patchwork.occupancy_grid import get_grid_size
+
+
+def bounds_intersect(bounds_1: Tuple[float, float, float, float], bounds_2: Tuple[float, float, float, float]) -> bool:
+    """Return True if 2 bounding boxes (minx, miny, maxx, maxy) intersect (touching boxes intersect)"""
+    return (
+        bounds_1[0] <= bounds_2[2]
+        and bounds_2[0] <= bounds_1[2]
+        and bounds_1[1] <= bounds_2[3]
+        and bounds_2[1] <= bounds_1[3]
+    )
+
+
+def get_las_bounds(las_header) -> Tuple[float, float, float, float]:
+    """Return the bounding box (minx, miny, maxx, maxy) of a las file, from its header"""
+    return (las_header.mins[0], las_header.mins[1], las_header.maxs[0], las_header.maxs[1])
+
+
+def get_points_in_footprint_mask(x: np.ndarray, y: np.ndarray, footprint: BaseGeometry) -> np.ndarray:
+    """Get a mask of the points (x, y) that intersect a footprint geometry (ie. that are inside the geometry or
+    on its boundary).
+
+    Points are first filtered using the bounding box of the footprint, then the remaining ones are tested against
+    the prepared geometry in a vectorized way, without creating a geometry for each point.
+
+    Args:
+        x (np.ndarray): x coordinates of the points
+        y (np.ndarray): y coordinates of the points
+        footprint (BaseGeometry): footprint geometry
+
+    Returns:
+        np.ndarray: boolean mask, True for the points that intersect the footprint
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    min_x, min_y, max_x, max_y = footprint.bounds
+    mask_in_footprint = (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+
+    if np.any(mask_in_footprint):
+        shapely.prepare(footprint)  # in place, and no-op if the geometry is already prepared
+        mask_in_footprint[mask_in_footprint] = shapely.intersects_xy(
+            footprint, x[mask_in_footprint], y[mask_in_footprint]
+        )
+
+    return mask_in_footprint
+
+
+def get_tile_bounds(tile_origin: Tuple[int, int], tile_size: int) -> Tuple[float, float, float, float]:
+    """Return the bounding box (minx, miny, maxx, maxy) of a tile from its origin (xmin, ymax)"""
+    return (tile_origin[0], tile_origin[1] - tile_size, tile_origin[0] + tile_size, tile_origin[1])
+
+
+def get_footprint_grid(
+    footprint: BaseGeometry,
+    tile_origin: Tuple[int, int],
+    patch_size: float,
+    tile_size: int,
+    conservative: bool = True,
+) -> np.ndarray:
+    """Rasterize a footprint geometry on the patches grid of a tile (same layout as the occupancy grid).
+
+    By default, the result is conservative: every patch that may contain a point intersecting the footprint is True
+    (the rasterized footprint is dilated by one patch to include patches that only touch its boundary).
+
+    Args:
+        footprint (BaseGeometry): footprint geometry
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        patch_size (float): Size of the patches (for discretization)
+        tile_size (int): Size of the tile
+        conservative (bool, optional): if false, only the patches whose center is in the footprint are True, so
+        that the number of patches times their area estimates the area of the footprint in the tile. Defaults to
+        True.
+
+    Returns:
+        np.ndarray: boolean grid of shape (size_grid, size_grid)
+    """
+    size_grid = get_grid_size(tile_size, patch_size)
+    if footprint.is_empty:
+        return np.zeros((size_grid, size_grid), dtype=bool)
+
+    footprint_grid = rasterize(
+        [(footprint, 1)],
+        out_shape=(size_grid, size_grid),
+        transform=from_origin(tile_origin[0], tile_origin[1], patch_size, patch_size),
+        all_touched=conservative,
+        dtype=np.uint8,
+    ).astype(bool)
+    if not conservative:
+        return footprint_grid
+
+    dilated_footprint_grid = footprint_grid.copy()
+    dilated_footprint_grid[1:, :] |= footprint_grid[:-1, :]
+    dilated_footprint_grid[:-1, :] |= footprint_grid[1:, :]
+    footprint_grid = dilated_footprint_grid.copy()
+    dilated_footprint_grid[:, 1:] |= footprint_grid[:, :-1]
+    dilated_footprint_grid[:, :-1] |= footprint_grid[:, 1:]
+
+    return dilated_footprint_grid
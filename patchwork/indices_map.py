@@ -1,23 +1,33 @@
 import os
+from typing import List, Tuple
 
 import numpy as np
-import pandas as pd
 import rasterio as rs
 from omegaconf import DictConfig
 from pandas import DataFrame
 from rasterio.transform import from_origin
 
 from patchwork.constants import PATCH_X_STR, PATCH_Y_STR
+from patchwork.occupancy_grid import create_occupancy_grid, get_grid_size
 
 
 def create_indices_grid(config: DictConfig, df_points: DataFrame, corner_x: int, corner_y: int) -> np.ndarray:
     """create a binary grid matching the tile the points of df_points are from, where each patch is equal to:
     1 if the patch has at least one point of df_points
     0 if the patch has no point from df_points
+
+    If df_points has patch coordinates (cf. get_selected_classes_points), they are used, so that the grid matches
+    exactly the patches filled by patchwork (and can be used to replay it, cf. read_indices_map)
     """
     size_grid = int(config.TILE_SIZE / config.PATCH_SIZE)
 
-    grid = np.zeros((size_grid, size_grid))
+    if not df_points.empty and PATCH_X_STR in df_points.columns and PATCH_Y_STR in df_points.columns:
+        occupancy_grid = create_occupancy_grid(
+            df_points[PATCH_X_STR], df_points[PATCH_Y_STR], (corner_x, corner_y), config.PATCH_SIZE, config.TILE_SIZE
+        )
+        return occupancy_grid.astype(np.uint8)
+
+    grid = np.zeros((size_grid, size_grid), dtype=np.uint8)
 
     if not df_points.empty:
         list_coordinates_x = np.int32((df_points.x - corner_x) / config.PATCH_SIZE)
@@ -32,48 +42,107 @@ def create_indices_grid(config: DictConfig, df_points: DataFrame, corner_x: int,
     return grid.transpose()
 
 
-def create_indices_map(config: DictConfig, df_points: DataFrame, corner_x: int, corner_y: int):
-    """
-    Save a binary grid for the tile into a geotiff
+def write_indices_map(
+    config: DictConfig, grid: np.ndarray, corner_x: int, corner_y: int, donor_paths: List[str] | None = None
+):
+    """Save a grid of the tile (first row at the top of the tile) into the geotiff
+    config.filepath.OUTPUT_INDICES_MAP_DIR/OUTPUT_INDICES_MAP_NAME.
+
+    If config.indices_map.DONOR_IDS is true, the values of the grid (id of the donor that filled each patch, 0 for
+    the patches that were not filled) are written as they are, as uint8 (or uint16 if there are more than 255
+    donors), and the path of each donor is written in the tags of the file (DONOR_<id>). Otherwise, the grid is
+    written as a binary grid (1 for the filled patches), on config.indices_map.NBITS bits (1 or 8).
+
+    The geotiff is compressed with config.indices_map.COMPRESS (eg. DEFLATE or LZW, no compression if null) and
+    tiled by blocks of config.indices_map.BLOCK_SIZE patches (if the tile is bigger than a block). It is written in
+    a temporary file first, then renamed.
+
+    Args:
+        config (DictConfig): patchwork configuration
+        grid (np.ndarray): grid of the tile (eg. the donor grid filled in get_complementary_points)
+        corner_x (int): x of the top left corner of the tile (in meters)
+        corner_y (int): y of the top left corner of the tile (in meters)
+        donor_paths (List[str] | None, optional): path of each donor (donor id - 1), for the tags of the file.
+        Defaults to None.
     """
+    profile = {
+        "driver": "GTiff",
+        "height": grid.shape[0],
+        "width": grid.shape[1],
+        "count": 1,
+        "crs": config.CRS,
+        "transform": from_origin(corner_x, corner_y, config.PATCH_SIZE, config.PATCH_SIZE),
+    }
+    if config.indices_map.DONOR_IDS:
+        grid = grid.astype(np.uint8 if grid.max(initial=0) <= np.iinfo(np.uint8).max else np.uint16)
+    else:
+        grid = (grid != 0).astype(np.uint8)
+        if config.indices_map.NBITS == 1:
+            profile["nbits"] = 1
+    profile["dtype"] = str(grid.dtype)
+    if config.indices_map.COMPRESS:
+        profile["compress"] = config.indices_map.COMPRESS
+    block_size = config.indices_map.BLOCK_SIZE
+    if block_size and min(grid.shape) >= block_size:
+        profile.update({"tiled": True, "blockxsize": block_size, "blockysize": block_size})
 
-    grid = create_indices_grid(config, df_points, corner_x, corner_y)
     os.makedirs(config.filepath.OUTPUT_INDICES_MAP_DIR, exist_ok=True)
     output_indices_map_path = os.path.join(
         config.filepath.OUTPUT_INDICES_MAP_DIR, config.filepath.OUTPUT_INDICES_MAP_NAME
     )
+    # write in a temporary file first, so that the indices map is never partially written
+    output_stem, output_extension = os.path.splitext(output_indices_map_path)
+    tmp_indices_map_path = f"{output_stem}.{os.getpid()}.tmp{output_extension}"
+    try:
+        with rs.open(tmp_indices_map_path, "w", **profile) as indices_map:
+            indices_map.write(grid, 1)
+            if config.indices_map.DONOR_IDS and donor_paths:
+                indices_map.update_tags(
+                    **{f"DONOR_{donor_id}": donor_path for donor_id, donor_path in enumerate(donor_paths, start=1)}
+                )
+    except BaseException:
+        if os.path.isfile(tmp_indices_map_path):
+            os.remove(tmp_indices_map_path)
+        raise
+    os.replace(tmp_indices_map_path, output_indices_map_path)
 
-    transform = from_origin(corner_x, corner_y, config.PATCH_SIZE, config.PATCH_SIZE)
-    indices_map = rs.open(
-        output_indices_map_path,
-        "w",
-        driver="GTiff",
-        height=grid.shape[0],
-        width=grid.shape[1],
-        count=1,
-        dtype=str(grid.dtype),
-        crs=config.CRS,
-        transform=transform,
-    )
-    indices_map.write(grid, 1)
-    indices_map.close()
 
+def create_indices_map(config: DictConfig, df_points: DataFrame, corner_x: int, corner_y: int):
+    """
+    Save a binary grid for the tile into a geotiff (cf. write_indices_map)
+    """
+    grid = create_indices_grid(config, df_points, corner_x, corner_y)
+    write_indices_map(config, grid, corner_x, corner_y)
 
-def read_indices_map(config: DictConfig):
-    indices_map = rs.open(os.path.join(config.filepath.INPUT_INDICES_MAP_DIR, config.filepath.INPUT_INDICES_MAP_NAME))
-    transformer = indices_map.get_transform()
-    grid = indices_map.read()
-    grid = grid[0]
-    grid_t = grid.transpose()
-    list_coordinates = np.argwhere(grid_t == 1)
 
-    list_coordinates = list_coordinates.transpose()
+def read_indices_map(config: DictConfig, tile_origin: Tuple[int, int] | None = None) -> np.ndarray:
+    """Read the indices map config.filepath.INPUT_INDICES_MAP_DIR/INPUT_INDICES_MAP_NAME (eg. produced by a previous
+    run) as a boolean grid of the tile, where a patch is True if it is flagged in the map (non-zero value). The grid
+    has the same layout as the occupancy grid (first row at the top of the tile).
 
-    patch_x = list_coordinates[0] * config.PATCH_SIZE + transformer[0]
-    patch_y = grid.shape[1] - (transformer[3] - list_coordinates[1] * config.PATCH_SIZE)
+    Args:
+        config (DictConfig): patchwork configuration
+        tile_origin (Tuple[int, int] | None, optional): origin of the tile (in meters), to check that the map
+        matches the tile. Defaults to None (not checked).
 
-    table = np.array([patch_x, patch_y]).transpose()
-    field = [PATCH_X_STR, PATCH_Y_STR]
+    Raises:
+        ValueError: if the map does not match the tile size / patch size, or the tile origin
 
-    df_indices = pd.DataFrame(table, columns=field)
-    return df_indices
+    Returns:
+        np.ndarray: grid of the flagged patches
+    """
+    indices_map_path = os.path.join(config.filepath.INPUT_INDICES_MAP_DIR, config.filepath.INPUT_INDICES_MAP_NAME)
+    with rs.open(indices_map_path) as indices_map:
+        grid = indices_map.read(1) != 0
+        map_origin = (indices_map.transform.c, indices_map.transform.f)
+
+    size_grid = get_grid_size(config.TILE_SIZE, config.PATCH_SIZE)
+    if grid.shape != (size_grid, size_grid):
+        raise ValueError(
+            f"Indices map {indices_map_path} has a size of {grid.shape}, expected ({size_grid}, {size_grid}) for "
+            f"TILE_SIZE={config.TILE_SIZE} and PATCH_SIZE={config.PATCH_SIZE}"
+        )
+    if tile_origin is not None and map_origin != tuple(tile_origin):
+        raise ValueError(f"Indices map {indices_map_path} has an origin of {map_origin}, expected {tile_origin}")
+
+    return grid
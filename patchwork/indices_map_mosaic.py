@@ -0,0 +1,168 @@
+import os
+import xml.etree.ElementTree as ET
+from typing import List, Tuple
+
+import numpy as np
+import rasterio as rs
+import rasterio.shutil
+from omegaconf import DictConfig
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+# VRT data type of the indices map numpy types
+VRT_DATA_TYPES = {"uint8": "Byte", "uint16": "UInt16"}
+
+
+def get_mosaic_window(mosaic_bounds: Tuple[float, float, float, float], tile_bounds, resolution: float) -> Window:
+    """Return the window of a tile (bounds: left, bottom, right, top) in a mosaic (same resolution)"""
+    return Window(
+        col_off=int(round((tile_bounds[0] - mosaic_bounds[0]) / resolution)),
+        row_off=int(round((mosaic_bounds[3] - tile_bounds[3]) / resolution)),
+        width=int(round((tile_bounds[2] - tile_bounds[0]) / resolution)),
+        height=int(round((tile_bounds[3] - tile_bounds[1]) / resolution)),
+    )
+
+
+def write_indices_map_vrt(vrt_path: str, indices_map_paths: List[str]):
+    """Write a VRT assembling indices maps (with the same resolution, crs and type), so that they can be read as a
+    single raster. The paths to the indices maps are written relatively to the VRT.
+
+    Args:
+        vrt_path (str): path to the VRT file to write
+        indices_map_paths (List[str]): paths to the indices maps
+    """
+    tiles = []
+    for indices_map_path in indices_map_paths:
+        with rs.open(indices_map_path) as indices_map:
+            tiles.append((indices_map_path, indices_map.bounds, indices_map.width, indices_map.height))
+            resolution = indices_map.res[0]
+            crs = indices_map.crs
+            dtype = indices_map.dtypes[0]
+    if not tiles:
+        return
+
+    mosaic_bounds = (
+        min(bounds.left for _, bounds, _, _ in tiles),
+        min(bounds.bottom for _, bounds, _, _ in tiles),
+        max(bounds.right for _, bounds, _, _ in tiles),
+        max(bounds.top for _, bounds, _, _ in tiles),
+    )
+    mosaic_window = get_mosaic_window(mosaic_bounds, mosaic_bounds, resolution)
+
+    vrt = ET.Element("VRTDataset", rasterXSize=str(mosaic_window.width), rasterYSize=str(mosaic_window.height))
+    if crs is not None:
+        ET.SubElement(vrt, "SRS").text = crs.to_wkt()
+    ET.SubElement(vrt, "GeoTransform").text = ", ".join(
+        str(value) for value in [mosaic_bounds[0], resolution, 0.0, mosaic_bounds[3], 0.0, -resolution]
+    )
+    band = ET.SubElement(vrt, "VRTRasterBand", dataType=VRT_DATA_TYPES[dtype], band="1")
+    vrt_directory = os.path.dirname(os.path.abspath(vrt_path))
+    for indices_map_path, tile_bounds, width, height in tiles:
+        source = ET.SubElement(band, "SimpleSource")
+        ET.SubElement(source, "SourceFilename", relativeToVRT="1").text = os.path.relpath(
+            os.path.abspath(indices_map_path), vrt_directory
+        )
+        ET.SubElement(source, "SourceBand").text = "1"
+        ET.SubElement(source, "SrcRect", xOff="0", yOff="0", xSize=str(width), ySize=str(height))
+        tile_window = get_mosaic_window(mosaic_bounds, tile_bounds, resolution)
+        ET.SubElement(
+            source,
+            "DstRect",
+            xOff=str(tile_window.col_off),
+            yOff=str(tile_window.row_off),
+            xSize=str(tile_window.width),
+            ySize=str(tile_window.height),
+        )
+
+    ET.ElementTree(vrt).write(vrt_path)
+
+
+class IndicesMapMosaic:
+    """Mosaic of the indices maps of a batch, as a Cloud-Optimized GeoTIFF with overviews.
+
+    The indices maps are written (with windowed writes) in a tiled and compressed GeoTIFF covering all the tiles of
+    the batch as soon as they are processed, so that the memory used does not depend on the number of tiles. The
+    Cloud-Optimized GeoTIFF (and its overviews) is created from this file when the mosaic is closed.
+    """
+
+    def __init__(self, mosaic_path: str, bounds: Tuple[float, float, float, float], config: DictConfig):
+        """
+        Args:
+            mosaic_path (str): path to the Cloud-Optimized GeoTIFF to create
+            bounds (Tuple[float, float, float, float]): bounds of the mosaic (left, bottom, right, top)
+            config (DictConfig): patchwork configuration (patch size, crs, and indices_map section)
+        """
+        self.mosaic_path = mosaic_path
+        self.bounds = bounds
+        self.config = config
+        self.tmp_mosaic_path = f"{mosaic_path}.{os.getpid()}.tmp.tif"
+
+        window = get_mosaic_window(bounds, bounds, config.PATCH_SIZE)
+        profile = {
+            "driver": "GTiff",
+            "width": window.width,
+            "height": window.height,
+            "count": 1,
+            "dtype": "uint16" if config.indices_map.DONOR_IDS else "uint8",
+            "crs": config.CRS,
+            "transform": from_origin(bounds[0], bounds[3], config.PATCH_SIZE, config.PATCH_SIZE),
+            "tiled": True,
+            "blockxsize": config.indices_map.BLOCK_SIZE,
+            "blockysize": config.indices_map.BLOCK_SIZE,
+            "sparse_ok": True,  # blocks without any tile are not written
+            "BIGTIFF": "IF_SAFER",
+        }
+        if config.indices_map.COMPRESS:
+            profile["compress"] = config.indices_map.COMPRESS
+        os.makedirs(os.path.dirname(os.path.abspath(mosaic_path)), exist_ok=True)
+        self._dataset = rs.open(self.tmp_mosaic_path, "w", **profile)
+
+    def add_tile(self, indices_map_path: str):
+        """Write an indices map in the mosaic
+
+        Raises:
+            ValueError: if the indices map is not inside the bounds of the mosaic
+        """
+        with rs.open(indices_map_path) as indices_map:
+            grid = indices_map.read(1)
+            tile_bounds = indices_map.bounds
+
+        window = get_mosaic_window(self.bounds, tile_bounds, self.config.PATCH_SIZE)
+        if (
+            window.col_off < 0
+            or window.row_off < 0
+            or window.col_off + window.width > self._dataset.width
+            or window.row_off + window.height > self._dataset.height
+        ):
+            raise ValueError(f"Indices map {indices_map_path} is outside of the mosaic bounds {self.bounds}")
+        self._dataset.write(grid.astype(self._dataset.dtypes[0]), 1, window=window)
+
+    def close(self):
+        """Create the Cloud-Optimized GeoTIFF (with overviews) from the mosaic, and remove the temporary mosaic (even
+        if the Cloud-Optimized GeoTIFF cannot be created)"""
+        self._dataset.close()
+        creation_options = {"blocksize": self.config.indices_map.BLOCK_SIZE, "overview_resampling": "nearest"}
+        if self.config.indices_map.COMPRESS:
+            creation_options["compress"] = self.config.indices_map.COMPRESS
+        try:
+            rasterio.shutil.copy(self.tmp_mosaic_path, self.mosaic_path, driver="COG", **creation_options)
+        finally:
+            os.remove(self.tmp_mosaic_path)
+
+    def abort(self):
+        """Close the mosaic and remove the temporary mosaic without creating the Cloud-Optimized GeoTIFF (eg. when the
+        batch stops on an error). It can be called after close."""
+        self._dataset.close()
+        if os.path.isfile(self.tmp_mosaic_path):
+            os.remove(self.tmp_mosaic_path)
+
+
+def get_tiles_bounds(tile_origins: List[Tuple[int, int]], tile_size: int) -> Tuple[float, float, float, float]:
+    """Return the bounds (left, bottom, right, top) of a set of tiles, from their origins (top left corners)"""
+    origins = np.array(tile_origins, dtype=float)
+    return (
+        float(origins[:, 0].min()),
+        float(origins[:, 1].min()) - tile_size,
+        float(origins[:, 0].max()) + tile_size,
+        float(origins[:, 1].max()),
+    )
@@ -0,0 +1,46 @@
+import os
+from typing import Iterator
+
+import numpy as np
+from laspy import LasHeader, ScaleAwarePointRecord
+
+
+def get_memmap_points(las_file_path: str, header: LasHeader) -> ScaleAwarePointRecord | None:
+    """Memory-map the points of an uncompressed las file.
+
+    The returned point record is a view on the file: its dimensions (x, y, classification, flags, etc.) are strided
+    views on the point records, so that only the pages of the file that are actually used are read, and the
+    pages are shared (through the system page cache) by all the processes that read the same file. Selecting points
+    with a mask copies the selected points only.
+
+    Args:
+        las_file_path (str): path to the las file
+        header (LasHeader): header of the las file
+
+    Returns:
+        ScaleAwarePointRecord | None: the memory-mapped points, or None if the file cannot be memory-mapped (laz
+        file, or points that do not match the point format)
+    """
+    if header.are_points_compressed:
+        return None
+
+    point_dtype = header.point_format.dtype()
+    points_size = header.point_count * point_dtype.itemsize
+    if header.point_format.size != point_dtype.itemsize or (
+        header.offset_to_point_data + points_size > os.path.getsize(las_file_path)
+    ):
+        return None
+    if header.point_count == 0:
+        return ScaleAwarePointRecord.zeros(0, header=header)
+
+    points_array = np.memmap(
+        las_file_path, dtype=point_dtype, mode="r", offset=header.offset_to_point_data, shape=(header.point_count,)
+    )
+    return ScaleAwarePointRecord(points_array, header.point_format, header.scales, header.offsets)
+
+
+def iter_memmap_chunks(points: ScaleAwarePointRecord, chunk_size: int) -> Iterator[ScaleAwarePointRecord]:
+    """Iterate on memory-mapped points by chunks of chunk_size points (views on the file, nothing is copied)"""
+    for begin in range(0, len(points), chunk_size):
+        end = begin + chunk_size
+        yield points[begin:end]
@@ -0,0 +1,123 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def get_grid_size(tile_size: int, patch_size: float) -> int:
+    """Return the number of patches on each side of a tile"""
+    return int(tile_size / patch_size)
+
+
+def get_cell_indices(
+    patch_x: np.ndarray, patch_y: np.ndarray, tile_origin: Tuple[int, int], patch_size: float, tile_size: int
+) -> np.ndarray:
+    """Convert patch coordinates (as computed in get_selected_classes_points) into linear indices of cells
+    in the occupancy grid of the tile.
+
+    The grid is stored row by row, with the first row at the top of the tile (y = tile_origin[1]), the same way
+    as in the indices map. Patches that are outside the tile get an index of -1.
+
+    Args:
+        patch_x (np.ndarray): x coordinates of the patches (in number of patches)
+        patch_y (np.ndarray): y coordinates of the patches (in number of patches)
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        patch_size (float): Size of the patches (for discretization)
+        tile_size (int): Size of the tile
+
+    Returns:
+        np.ndarray: linear index of the cell of each patch (-1 if the patch is outside the tile)
+    """
+    size_grid = get_grid_size(tile_size, patch_size)
+    columns = np.asarray(patch_x, dtype=np.int64) - int(tile_origin[0] / patch_size)
+    rows = int(tile_origin[1] / patch_size) - 1 - np.asarray(patch_y, dtype=np.int64)
+
+    cell_indices = rows * size_grid + columns
+    is_outside_tile = (columns < 0) | (columns >= size_grid) | (rows < 0) | (rows >= size_grid)
+    cell_indices[is_outside_tile] = -1
+
+    return cell_indices
+
+
+def create_occupancy_grid(
+    patch_x: np.ndarray, patch_y: np.ndarray, tile_origin: Tuple[int, int], patch_size: float, tile_size: int
+) -> np.ndarray:
+    """Create a boolean grid of the tile, where a cell is True if at least one patch of (patch_x, patch_y)
+    falls in it. Patches outside the tile are ignored.
+
+    Args:
+        patch_x (np.ndarray): x coordinates of the patches (in number of patches)
+        patch_y (np.ndarray): y coordinates of the patches (in number of patches)
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        patch_size (float): Size of the patches (for discretization)
+        tile_size (int): Size of the tile
+
+    Returns:
+        np.ndarray: boolean grid of shape (size_grid, size_grid)
+    """
+    size_grid = get_grid_size(tile_size, patch_size)
+    grid = np.zeros((size_grid, size_grid), dtype=bool)
+    fill_occupancy_grid(grid, patch_x, patch_y, tile_origin, patch_size, tile_size)
+
+    return grid
+
+
+def fill_occupancy_grid(
+    grid: np.ndarray,
+    patch_x: np.ndarray,
+    patch_y: np.ndarray,
+    tile_origin: Tuple[int, int],
+    patch_size: float,
+    tile_size: int,
+):
+    """Set to True (in place) the cells of an occupancy grid that contain at least one patch of
+    (patch_x, patch_y). Patches outside the tile are ignored."""
+    cell_indices = get_cell_indices(patch_x, patch_y, tile_origin, patch_size, tile_size)
+    grid.reshape(-1)[cell_indices[cell_indices >= 0]] = True
+
+
+def fill_donor_grid(
+    grid: np.ndarray,
+    patch_x: np.ndarray,
+    patch_y: np.ndarray,
+    donor_id: int,
+    tile_origin: Tuple[int, int],
+    patch_size: float,
+    tile_size: int,
+):
+    """Set donor_id (in place) in the cells of a donor grid that contain at least one patch of (patch_x, patch_y)
+    and are not set yet (0), so that each cell keeps the id of the first donor that filled it. Patches outside the
+    tile are ignored."""
+    cell_indices = get_cell_indices(patch_x, patch_y, tile_origin, patch_size, tile_size)
+    cell_indices = cell_indices[cell_indices >= 0]
+    flat_grid = grid.reshape(-1)
+    flat_grid[cell_indices[flat_grid[cell_indices] == 0]] = donor_id
+
+
+def is_patch_occupied(
+    grid: np.ndarray,
+    patch_x: np.ndarray,
+    patch_y: np.ndarray,
+    tile_origin: Tuple[int, int],
+    patch_size: float,
+    tile_size: int,
+) -> np.ndarray:
+    """Look up the patches (patch_x, patch_y) in an occupancy grid.
+
+    Args:
+        grid (np.ndarray): boolean occupancy grid (as created by create_occupancy_grid)
+        patch_x (np.ndarray): x coordinates of the patches (in number of patches)
+        patch_y (np.ndarray): y coordinates of the patches (in number of patches)
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        patch_size (float): Size of the patches (for discretization)
+        tile_size (int): Size of the tile
+
+    Returns:
+        np.ndarray: boolean mask, True for the patches that are occupied in the grid. Patches outside the tile
+        are considered as not occupied.
+    """
+    cell_indices = get_cell_indices(patch_x, patch_y, tile_origin, patch_size, tile_size)
+    is_occupied = np.zeros(cell_indices.shape, dtype=bool)
+    is_inside_tile = cell_indices >= 0
+    is_occupied[is_inside_tile] = grid.reshape(-1)[cell_indices[is_inside_tile]]
+
+    return is_occupied
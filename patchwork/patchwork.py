@@ -1,17 +1,44 @@
 import os
-from shutil import copy2
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from typing import Dict, List, Tuple
 
 import geopandas as gpd
 import laspy
 import numpy as np
 import pandas as pd
-from laspy import LasReader, ScaleAwarePointRecord
+from laspy import DecompressionSelection, LasHeader, LasReader, ScaleAwarePointRecord
 from omegaconf import DictConfig
 from pdaltools.las_info import get_tile_origin_using_header_info
+from shapely.geometry import box
+from shapely.geometry.base import BaseGeometry
 
 import patchwork.constants as c
-from patchwork.indices_map import create_indices_map
+from patchwork.decompression import get_decompression_selection
+from patchwork.donor_cache import DonorCache, get_donor_cache_key
+from patchwork.donor_catalog import DonorCatalog, load_donor_catalog
+from patchwork.donor_index import DonorIndex, load_donor_index
+from patchwork.donor_staging import DonorStaging, get_donor_staging
+from patchwork.footprint import (
+    bounds_intersect,
+    get_footprint_grid,
+    get_las_bounds,
+    get_points_in_footprint_mask,
+    get_tile_bounds,
+)
+from patchwork.indices_map import (
+    create_indices_map,
+    read_indices_map,
+    write_indices_map,
+)
+from patchwork.las_memmap import get_memmap_points, iter_memmap_chunks
+from patchwork.occupancy_grid import (
+    fill_donor_grid,
+    fill_occupancy_grid,
+    get_grid_size,
+    is_patch_occupied,
+)
+from patchwork.run_report import RunReport, report_iter_stage, report_stage
 from patchwork.shapefile_data_extraction import get_donor_info_from_shapefile
 
 
@@ -27,6 +54,9 @@ def get_selected_classes_points(
     """Get a list of points from a las, filter them based on classification an d synthetic flag
     and return them as a pandas dataframe
 
+    Filters are applied on the raw laspy arrays first, so that only the selected points are copied
+    into the output dataframe, and each field keeps its native type (patch_x and patch_y are int32).
+
     Args:
         tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
         points_list (ScaleAwarePointRecord): Points list in laspy format
@@ -44,38 +74,64 @@ def get_selected_classes_points(
         pd.DataFrame: Filtered points list as a pd.DataFrame
     """
     # we add automatically classification, so we remove it if it's in field_to_keep
-    if c.CLASSIFICATION_STR in fields_to_keep:
-        fields_to_keep.remove(c.CLASSIFICATION_STR)
-
-    table_fields_to_keep = [points_list[field] for field in fields_to_keep]
-    table_field_necessary = [
-        np.int32(points_list.x / patch_size),  # convert x into the coordinate of the patch
-        np.int32(points_list.y / patch_size),  # convert y into the coordinate of the patch
-        points_list.classification,
-    ]
-    all_fields_list = [*fields_to_keep, c.PATCH_X_STR, c.PATCH_Y_STR, c.CLASSIFICATION_STR]
-
-    all_classes_points = np.array(table_fields_to_keep + table_field_necessary).transpose()
-    df_points = pd.DataFrame(all_classes_points, columns=all_fields_list)
+    fields_to_keep = [field for field in fields_to_keep if field != c.CLASSIFICATION_STR]
 
-    # Filter points based on classification
-    df_points = df_points[df_points.classification.isin(class_list)]
+    if not use_synthetic_points and "synthetic" not in fields_to_keep:
+        raise NotImplementedError(
+            "'get_selected_classes_points' is asked to filter on synthetic flag, "
+            "but this flag is not in fields to keep."
+        )
 
-    # Filter based on if the point is synthetic
+    # Filter points based on classification (and on if the point is synthetic) on the raw arrays
+    mask_selected_points = np.isin(points_list.classification, class_list)
     if not use_synthetic_points:
-        if "synthetic" in fields_to_keep:
-            df_points = df_points[np.logical_not(df_points.synthetic)]
-        else:
-            raise NotImplementedError(
-                "'get_selected_classes_points' is asked to filter on synthetic flag, "
-                "but this flag is not in fields to keep."
-            )
+        mask_selected_points &= np.logical_not(points_list.synthetic)
+
+    return get_points_dataframe(
+        tile_origin, points_list[mask_selected_points], fields_to_keep, patch_size=patch_size, tile_size=tile_size
+    )
+
+
+def get_points_dataframe(
+    tile_origin: Tuple[int, int],
+    selected_points: ScaleAwarePointRecord,
+    fields_to_keep: list[str],
+    patch_size: int,
+    tile_size: int,
+) -> pd.DataFrame:
+    """Return points that are already selected (eg. by read_donor_points) as a pandas dataframe, with the
+    coordinates of their patch (cf. get_selected_classes_points)
+
+    Args:
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        selected_points (ScaleAwarePointRecord): Points list in laspy format
+        fields_to_keep (list[str]): Las file attribute to keep in the output dataframe
+        patch_size (int): Size of the patches (for discretization)
+        tile_size (int): Size of the tile
+
+    Returns:
+        pd.DataFrame: points list as a pd.DataFrame
+    """
+    # we add automatically classification, so we remove it if it's in field_to_keep
+    fields_to_keep = [field for field in fields_to_keep if field != c.CLASSIFICATION_STR]
+
+    patch_x = np.int32(selected_points.x / patch_size)  # convert x into the coordinate of the patch
+    patch_y = np.int32(selected_points.y / patch_size)  # convert y into the coordinate of the patch
 
     # "push" the points on the limit of the tile to the closest patch
-    mask_points_on_max_x = df_points[c.PATCH_X_STR] == tile_origin[0] + tile_size
-    df_points.loc[mask_points_on_max_x, c.PATCH_X_STR] = tile_origin[0] + tile_size - 1
-    mask_points_on_max_y = df_points[c.PATCH_Y_STR] == tile_origin[1]
-    df_points.loc[mask_points_on_max_y, c.PATCH_Y_STR] = tile_origin[1] - 1
+    patch_x_max = int((tile_origin[0] + tile_size) / patch_size)
+    patch_x[patch_x == patch_x_max] = patch_x_max - 1
+    patch_y_max = int(tile_origin[1] / patch_size)
+    patch_y[patch_y == patch_y_max] = patch_y_max - 1
+
+    df_points = pd.DataFrame(
+        {
+            **{field: np.asarray(selected_points[field]) for field in fields_to_keep},
+            c.PATCH_X_STR: patch_x,
+            c.PATCH_Y_STR: patch_y,
+            c.CLASSIFICATION_STR: np.asarray(selected_points.classification),
+        }
+    )
 
     return df_points
 
@@ -95,8 +151,15 @@ def get_type(new_column_size: int):
             raise ValueError(f"{new_column_size} is not a correct value for NEW_COLUMN_SIZE")
 
 
-def get_common_las_columns(las_files: List[str]) -> List[str]:
-    """Return the columns common to all las files (lowercase)."""
+def get_common_las_columns(las_files: List[str], donor_catalog: DonorCatalog | None = None) -> List[str]:
+    """Return the columns common to all las files (lowercase). If a donor catalog is given, the columns are taken
+    from it instead of opening each file."""
+    if donor_catalog is not None:
+        common_columns = set(donor_catalog.get_header_info(las_files[0])["dimensions"])
+        for las_file_path in las_files[1:]:
+            common_columns = common_columns & set(donor_catalog.get_header_info(las_file_path)["dimensions"])
+        return list(common_columns)
+
     with laspy.open(las_files[0]) as las_file:
         common_columns = set(get_field_from_header(las_file))
     for las_file_path in las_files[1:]:
@@ -105,80 +168,389 @@ def get_common_las_columns(las_files: List[str]) -> List[str]:
     return list(common_columns)
 
 
-def get_common_donor_columns(df_donor_info: gpd.GeoDataFrame) -> List[str]:
+def get_common_donor_columns(df_donor_info: gpd.GeoDataFrame, donor_catalog: DonorCatalog | None = None) -> List[str]:
     """Return the columns common to all donor files (lowercase)."""
     las_files = [row["full_path"] for _, row in df_donor_info.iterrows()]
-    return get_common_las_columns(las_files)
+    return get_common_las_columns(las_files, donor_catalog)
+
+
+def get_recipient_occupancy_grid(
+    recipient_file_path: str, tile_origin: Tuple[int, int], config: DictConfig, run_report: RunReport | None = None
+) -> np.ndarray:
+    """Compute the occupancy grid of the recipient tile: a boolean grid with True for each patch that contains at
+    least one point of the RECIPIENT_CLASS_LIST classes.
+
+    The recipient file is read by chunks of config.CHUNK_SIZE points, so that the memory needed does not depend on
+    the number of points in the recipient file. Only x, y and classification are decompressed (for point formats
+    with layered compression). If config.MEMORY_MAP_LAS is true, an uncompressed recipient is memory-mapped instead
+    of being read (cf. get_memmap_points).
+
+    If run_report is set, the opening of the recipient ("recipient_open", with the size of the file in bytes_read),
+    the decoding of each chunk ("recipient_decode") and the computation of the grid ("occupancy") are measured in
+    it.
+    """
+    size_grid = get_grid_size(config.TILE_SIZE, config.PATCH_SIZE)
+    recipient_occupancy_grid = np.zeros((size_grid, size_grid), dtype=bool)
+    with laspy.open(
+        recipient_file_path, decompression_selection=get_decompression_selection([c.CLASSIFICATION_STR])
+    ) as recipient_file:
+        with report_stage(run_report, "recipient_open") as measures:
+            measures["bytes_read"] = os.path.getsize(recipient_file_path)
+            memmap_points = None
+            if config.MEMORY_MAP_LAS:
+                memmap_points = get_memmap_points(recipient_file_path, recipient_file.header)
+            if memmap_points is not None:
+                recipient_chunks = iter_memmap_chunks(memmap_points, config.CHUNK_SIZE)
+            else:
+                recipient_chunks = recipient_file.chunk_iterator(config.CHUNK_SIZE)
+        for recipient_points in report_iter_stage(run_report, recipient_chunks, "recipient_decode"):
+            with report_stage(run_report, "occupancy") as measures:
+                df_recipient_points = get_selected_classes_points(
+                    tile_origin,
+                    recipient_points,
+                    config.RECIPIENT_CLASS_LIST,
+                    use_synthetic_points=True,
+                    fields_to_keep=[],
+                    patch_size=config.PATCH_SIZE,
+                    tile_size=config.TILE_SIZE,
+                )
+                fill_occupancy_grid(
+                    recipient_occupancy_grid,
+                    df_recipient_points[c.PATCH_X_STR],
+                    df_recipient_points[c.PATCH_Y_STR],
+                    tile_origin,
+                    config.PATCH_SIZE,
+                    config.TILE_SIZE,
+                )
+                measures["points_in"] = len(recipient_points)
+                measures["points_out"] = len(df_recipient_points.index)
+
+    return recipient_occupancy_grid
+
+
+def is_replay_mode(config: DictConfig) -> bool:
+    """Replay mode: the patches to fill are the ones flagged in an existing indices map
+    (config.filepath.INPUT_INDICES_MAP_DIR/INPUT_INDICES_MAP_NAME) instead of the empty patches of the recipient"""
+    return bool(config.filepath.INPUT_INDICES_MAP_DIR and config.filepath.INPUT_INDICES_MAP_NAME)
+
+
+def get_tile_occupancy_grid(
+    recipient_file_path: str, tile_origin: Tuple[int, int], config: DictConfig, run_report: RunReport | None = None
+) -> np.ndarray:
+    """Get the grid of the patches that must not be filled by donors: the occupancy grid of the recipient (cf.
+    get_recipient_occupancy_grid), or in replay mode, all the patches that are not flagged in the input indices map
+    (the recipient points are then not decoded at all)."""
+    if is_replay_mode(config):
+        with report_stage(run_report, "occupancy") as measures:
+            input_indices_map_path = os.path.join(
+                config.filepath.INPUT_INDICES_MAP_DIR, config.filepath.INPUT_INDICES_MAP_NAME
+            )
+            measures["bytes_read"] = os.path.getsize(input_indices_map_path)
+            return ~read_indices_map(config, tile_origin)
+
+    return get_recipient_occupancy_grid(recipient_file_path, tile_origin, config, run_report)
+
+
+def can_donor_fill_empty_patches(
+    footprint: BaseGeometry, recipient_occupancy_grid: np.ndarray, tile_origin: Tuple[int, int], config: DictConfig
+) -> bool:
+    """Check if a donor with the given footprint can add points to the recipient, ie. if its footprint covers at
+    least one empty patch of the recipient (or goes out of the tile, where all patches are considered as empty)"""
+    if not footprint.within(box(*get_tile_bounds(tile_origin, config.TILE_SIZE))):
+        return True
+    footprint_grid = get_footprint_grid(footprint, tile_origin, config.PATCH_SIZE, config.TILE_SIZE)
+
+    return bool(np.any(footprint_grid & ~recipient_occupancy_grid))
+
+
+def read_donor_points(
+    donor_file_path: str,
+    footprint: BaseGeometry,
+    config: DictConfig,
+    decompressed_fields: List[str] | None = None,
+    run_report: RunReport | None = None,
+) -> ScaleAwarePointRecord:
+    """Read the points of a donor file that belong to the DONOR_CLASS_LIST classes (without synthetic points if
+    config.DONOR_USE_SYNTHETIC_POINTS is false) and are inside its footprint.
+
+    If config.MEMORY_MAP_LAS is true, an uncompressed donor is memory-mapped instead of being read, so that only the
+    selected points are copied in memory.
+
+    Args:
+        donor_file_path (str): path to the donor file
+        footprint (BaseGeometry): footprint of the donor in the shapefile
+        config (DictConfig): patchwork configuration
+        decompressed_fields (List[str] | None, optional): fields to decompress (lowercase), in addition to the
+        ones used to select the points. The values of the other fields are not meaningful (for point formats with
+        layered compression). Defaults to None (all the fields are decompressed).
+        run_report (RunReport | None, optional): report where the decoding ("donor_decode"), the classes selection
+        ("donor_filter") and the footprint clipping ("donor_clip") of the donor are measured. Defaults to None.
+
+    Returns:
+        ScaleAwarePointRecord: selected donor points
+    """
+    decompression_selection = DecompressionSelection.all()
+    if decompressed_fields is not None:
+        selection_fields = (
+            [c.CLASSIFICATION_STR] if config.DONOR_USE_SYNTHETIC_POINTS else [c.CLASSIFICATION_STR, "synthetic"]
+        )
+        decompression_selection = get_decompression_selection([*decompressed_fields, *selection_fields])
+    with report_stage(run_report, "donor_decode", donor=donor_file_path) as measures:
+        with laspy.open(donor_file_path, decompression_selection=decompression_selection) as donor_file:
+            # no need to decode the donor if it has no point in the footprint bounding box
+            if not bounds_intersect(get_las_bounds(donor_file.header), footprint.bounds):
+                return laspy.ScaleAwarePointRecord.zeros(0, header=donor_file.header)
+
+            raw_donor_points = None
+            if config.MEMORY_MAP_LAS:
+                raw_donor_points = get_memmap_points(donor_file_path, donor_file.header)
+            if raw_donor_points is None:
+                raw_donor_points = donor_file.read().points
+        measures["bytes_read"] = os.path.getsize(donor_file_path)
+        measures["points_out"] = len(raw_donor_points)
+
+    # filter on the classes first, as it is cheaper than the footprint test
+    with report_stage(run_report, "donor_filter", donor=donor_file_path) as measures:
+        mask_selected_points = np.isin(raw_donor_points.classification, config.DONOR_CLASS_LIST)
+        if not config.DONOR_USE_SYNTHETIC_POINTS:
+            mask_selected_points &= np.logical_not(raw_donor_points.synthetic)
+        donor_points = raw_donor_points[mask_selected_points]
+        measures["points_in"] = len(raw_donor_points)
+        measures["points_out"] = len(donor_points)
+
+    with report_stage(run_report, "donor_clip", donor=donor_file_path) as measures:
+        measures["points_in"] = len(donor_points)
+        donor_points = donor_points[get_points_in_footprint_mask(donor_points.x, donor_points.y, footprint)]
+        measures["points_out"] = len(donor_points)
+
+    return donor_points
+
+
+def get_donor_points(
+    donor_file_path: str,
+    footprint: BaseGeometry,
+    donor_common_columns: List[str],
+    tile_origin: Tuple[int, int],
+    config: DictConfig,
+    donor_cache: DonorCache | None = None,
+    donor_staging: DonorStaging | None = None,
+    decompressed_fields: List[str] | None = None,
+    run_report: RunReport | None = None,
+) -> pd.DataFrame:
+    """Read the points of a donor file that are inside its footprint and belong to the DONOR_CLASS_LIST classes
+
+    Args:
+        donor_file_path (str): path to the donor file
+        footprint (BaseGeometry): footprint of the donor in the shapefile
+        donor_common_columns (List[str]): fields to keep in the output dataframe
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        config (DictConfig): patchwork configuration
+        donor_cache (DonorCache | None, optional): cache of the points already read in donor files. Defaults to
+        None (no cache).
+        donor_staging (DonorStaging | None, optional): local copies of the donor files, used to read the donor
+        file if its points are not in the cache. Defaults to None (the donor file is read directly).
+        decompressed_fields (List[str] | None, optional): fields to decompress (cf. read_donor_points). The values
+        of the other fields of donor_common_columns are not meaningful. Defaults to None (all the fields are
+        decompressed).
+        run_report (RunReport | None, optional): report where the stages of the donor loading (cf.
+        read_donor_points) and the conversion of the selected points to a dataframe ("donor_dataframe") are
+        measured. Defaults to None.
+
+    Returns:
+        pd.DataFrame: selected donor points (cf. get_points_dataframe)
+    """
+    donor_points = None
+    if donor_cache is not None:
+        donor_cache_key = get_donor_cache_key(donor_file_path, footprint, config, decompressed_fields)
+        donor_points = donor_cache.get(donor_cache_key)
+
+    if donor_points is None:
+        if donor_staging is not None:
+            # the local copy is protected from eviction (eg. by the prefetch of the next tiles) while it is read
+            with donor_staging.local_copy(donor_file_path) as local_donor_file_path:
+                donor_points = read_donor_points(
+                    local_donor_file_path, footprint, config, decompressed_fields, run_report
+                )
+        else:
+            donor_points = read_donor_points(donor_file_path, footprint, config, decompressed_fields, run_report)
+        if donor_cache is not None:
+            donor_cache.put(donor_cache_key, donor_points)
+
+    # the points are already selected by read_donor_points (classes, synthetic flag and footprint)
+    with report_stage(run_report, "donor_dataframe", donor=donor_file_path) as measures:
+        df_donor_points = get_points_dataframe(
+            tile_origin,
+            donor_points,
+            donor_common_columns,
+            patch_size=config.PATCH_SIZE,
+            tile_size=config.TILE_SIZE,
+        )
+        measures["points_in"] = len(donor_points)
+        measures["points_out"] = len(df_donor_points.index)
+
+    return df_donor_points
 
 
 def get_complementary_points(
-    df_donor_info: gpd.GeoDataFrame, recipient_file_path: str, tile_origin: Tuple[int, int], config: DictConfig
+    df_donor_info: gpd.GeoDataFrame,
+    recipient_file_path: str,
+    tile_origin: Tuple[int, int],
+    config: DictConfig,
+    recipient_occupancy_grid: np.ndarray | None = None,
+    donor_catalog: DonorCatalog | None = None,
+    donor_cache: DonorCache | None = None,
+    donor_staging: DonorStaging | None = None,
+    donor_grid: np.ndarray | None = None,
+    run_report: RunReport | None = None,
 ) -> pd.DataFrame:
-    with laspy.open(recipient_file_path) as recipient_file:
-        recipient_points = recipient_file.read().points
+    """Get the donor points that are in the patches where the recipient has no point.
 
-    df_recipient_points = get_selected_classes_points(
-        tile_origin,
-        recipient_points,
-        config.RECIPIENT_CLASS_LIST,
-        use_synthetic_points=True,
-        fields_to_keep=[],
-        patch_size=config.PATCH_SIZE,
-        tile_size=config.TILE_SIZE,
-    )
+    Donors are used in the order of df_donor_info. If config.DONOR_PRIORITY_FIELD is set (donors sorted by
+    priority), a patch is filled by the first donor that has points in it only: patches filled by a donor are not
+    filled again by the following donors, and the loop stops as soon as there is no empty patch left.
 
-    # set, for each patch of coordinate (patch_x, patch_y), the number of recipient point
-    # should have no record for when count == 0, therefore "df_recipient_non_empty_patches" list all
-    # and only the patches with at least a point
-    # In other words, the next column should be filled with "False" everywhere
-    df_recipient_non_empty_patches = (
-        df_recipient_points.groupby(by=[c.PATCH_X_STR, c.PATCH_Y_STR]).count().classification == 0
-    )
+    Args:
+        df_donor_info (gpd.GeoDataFrame): donor files to use, with their footprint (cf.
+        get_donor_info_from_shapefile)
+        recipient_file_path (str): path to the recipient file
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        config (DictConfig): patchwork configuration
+        recipient_occupancy_grid (np.ndarray | None, optional): occupancy grid of the recipient, if it has
+        already been computed (cf. get_recipient_occupancy_grid). Defaults to None.
+        donor_catalog (DonorCatalog | None, optional): catalog of the donor files, used to get the donors columns
+        without opening them. Defaults to None.
+        donor_cache (DonorCache | None, optional): cache of the points already read in donor files. Defaults to
+        None.
+        donor_staging (DonorStaging | None, optional): local copies of the donor files. If set, all the donors of
+        the tile are copied in background threads while the first ones are read. Defaults to None.
+        donor_grid (np.ndarray | None, optional): grid of the tile (same layout as the occupancy grid) filled in
+        place with the id of the first donor that added points in each patch (position of the donor in
+        df_donor_info, starting at 1), to create the indices map. Defaults to None.
+        run_report (RunReport | None, optional): report where the loading of each donor (cf. read_donor_points)
+        and the selection of its points in the empty patches ("join") are measured. Defaults to None.
+
+    If config.DONOR_LOADING_THREADS is more than 1, the donors are loaded (read, decompressed and clipped)
+    concurrently in a pool of threads, and their points are merged in the order of df_donor_info, so that the result
+    is the same as when they are loaded one after the other. In priority mode, a donor may then be loaded even if the
+    previous donors filled all its patches: its points are just ignored.
 
+    Returns:
+        pd.DataFrame: donor points to add to the recipient
+    """
+    # set, for each patch of the tile, if there is at least one recipient point in it
+    if recipient_occupancy_grid is None:
+        recipient_occupancy_grid = get_recipient_occupancy_grid(recipient_file_path, tile_origin, config, run_report)
+
+    # id of each donor in the donor grid
+    df_donor_info = df_donor_info.assign(donor_id=np.arange(1, len(df_donor_info.index) + 1))
+
+    with report_stage(run_report, "donor_prefilter"):
+        # no need to open donors that would only add points in patches that are already filled
+        df_donor_info = df_donor_info[
+            [
+                can_donor_fill_empty_patches(footprint, recipient_occupancy_grid, tile_origin, config)
+                for footprint in df_donor_info.geometry
+            ]
+        ]
+        if donor_catalog is not None:
+            # nor donors whose points (from the bounds stored in the catalog) are all outside of their footprint
+            df_donor_info = df_donor_info[
+                [
+                    bounds_intersect(donor_catalog.get_header_info(donor_path)["bounds"], footprint.bounds)
+                    for donor_path, footprint in zip(df_donor_info["full_path"], df_donor_info.geometry)
+                ]
+            ]
+
+    # grid of the patches that are already filled: by the recipient, and in priority mode, by the previous donors
+    filled_patches_grid = recipient_occupancy_grid.copy()
     dfs_donor_points = []
-    
+
     if len(df_donor_info.index):
-        donor_common_columns = get_common_donor_columns(df_donor_info)
-        for index, row in df_donor_info.iterrows():
-            with laspy.open(row["full_path"]) as donor_file:
-                raw_donor_points = donor_file.read().points
-                points_loc_gdf = gpd.GeoDataFrame(
-                    geometry=gpd.points_from_xy(raw_donor_points.x, raw_donor_points.y, raw_donor_points.z, crs=config.CRS)
-                )
-                footprint_gdf = gpd.GeoDataFrame(geometry=[row["geometry"]], crs=config.CRS)
-                points_in_footprint_gdf = points_loc_gdf.sjoin(footprint_gdf, how="inner", predicate="intersects")
-                donor_points = raw_donor_points[points_in_footprint_gdf.index.values]
+        donor_common_columns = get_common_donor_columns(df_donor_info, donor_catalog)
+        # only the donor fields that are copied to the recipient need to be decompressed
+        with laspy.open(recipient_file_path) as recipient_file:
+            decompressed_fields = get_fields_to_transmit(get_field_from_header(recipient_file), donor_common_columns)
+        if donor_staging is not None:
+            donor_staging.prefetch(df_donor_info["full_path"])
+
+        def load_donor_points(row: pd.Series) -> pd.DataFrame:
+            return get_donor_points(
+                row["full_path"],
+                row["geometry"],
+                donor_common_columns,
+                tile_origin,
+                config,
+                donor_cache,
+                donor_staging,
+                decompressed_fields,
+                run_report,
+            )
 
-                dfs_donor_points.append(
-                    get_selected_classes_points(
+        donor_rows = [row for _, row in df_donor_info.iterrows()]
+        executor = None
+        if config.DONOR_LOADING_THREADS > 1 and len(donor_rows) > 1:
+            executor = ThreadPoolExecutor(max_workers=config.DONOR_LOADING_THREADS)
+            donor_points_futures = [executor.submit(load_donor_points, row) for row in donor_rows]
+
+        try:
+            for donor_number, row in enumerate(donor_rows):
+                if np.all(filled_patches_grid):
+                    break
+                if config.DONOR_PRIORITY_FIELD and not can_donor_fill_empty_patches(
+                    row["geometry"], filled_patches_grid, tile_origin, config
+                ):
+                    continue
+
+                if executor is not None:
+                    df_donor_points = donor_points_futures[donor_number].result()
+                else:
+                    df_donor_points = load_donor_points(row)
+
+                with report_stage(run_report, "join", donor=row["full_path"]) as measures:
+                    measures["points_in"] = len(df_donor_points.index)
+                    # only keep donor points in patches where there is no recipient point (or no point from a donor
+                    # with a higher priority)
+                    mask_donor_points_in_filled_patches = is_patch_occupied(
+                        filled_patches_grid,
+                        df_donor_points[c.PATCH_X_STR],
+                        df_donor_points[c.PATCH_Y_STR],
                         tile_origin,
-                        donor_points,
-                        config.DONOR_CLASS_LIST,
-                        config.DONOR_USE_SYNTHETIC_POINTS,
-                        donor_common_columns,
-                        patch_size=config.PATCH_SIZE,
-                        tile_size=config.TILE_SIZE,
+                        config.PATCH_SIZE,
+                        config.TILE_SIZE,
                     )
-                )
-
-        df_donor_points = pd.concat(dfs_donor_points)
-
+                    df_donor_points = df_donor_points[~mask_donor_points_in_filled_patches]
+
+                    if donor_grid is not None:
+                        fill_donor_grid(
+                            donor_grid,
+                            df_donor_points[c.PATCH_X_STR],
+                            df_donor_points[c.PATCH_Y_STR],
+                            row["donor_id"],
+                            tile_origin,
+                            config.PATCH_SIZE,
+                            config.TILE_SIZE,
+                        )
+                    if config.DONOR_PRIORITY_FIELD:
+                        fill_occupancy_grid(
+                            filled_patches_grid,
+                            df_donor_points[c.PATCH_X_STR],
+                            df_donor_points[c.PATCH_Y_STR],
+                            tile_origin,
+                            config.PATCH_SIZE,
+                            config.TILE_SIZE,
+                        )
+                    measures["points_out"] = len(df_donor_points.index)
+
+                dfs_donor_points.append(df_donor_points)
+        finally:
+            if executor is not None:
+                # donors not loaded yet are not needed anymore (eg. no empty patch left)
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    if dfs_donor_points:
+        return pd.concat(dfs_donor_points, ignore_index=True)
     else:
-        df_donor_points = gpd.GeoDataFrame(columns=["x", "y", "z", "patch_x", "patch_y", "classification"])
-
-    # for each (patch_x,patch_y) patch, we join to a donor point the count of recipient points on that patch
-    # since it's a left join, it keeps all the left record (all the donor points)
-    #  and put a "NaN" if the recipient point count is null (no record)
-    joined_patches = pd.merge(
-        df_donor_points,
-        df_recipient_non_empty_patches,
-        on=[c.PATCH_X_STR, c.PATCH_Y_STR],
-        how="left",
-        suffixes=("", c.RECIPIENT_SUFFIX),
-    )
-
-    # only keep donor points in patches where there is no recipient point
-    return joined_patches.loc[joined_patches[c.CLASSIFICATION_STR + c.RECIPIENT_SUFFIX].isnull()]
+        return gpd.GeoDataFrame(columns=["x", "y", "z", "patch_x", "patch_y", "classification"])
 
 
 def get_field_from_header(las_file: LasReader) -> List[str]:
@@ -188,93 +560,415 @@ def get_field_from_header(las_file: LasReader) -> List[str]:
     return [dimension.name.lower() for dimension in header.point_format.dimensions]
 
 
+def get_fields_to_transmit(recipient_fields: List[str], donor_fields: List[str]) -> List[str]:
+    """Return the fields of the recipient (lowercase) whose values are copied from the donor points. Classification is
+    excluded, as it is copied in a special way (with DONOR_CLASS_TRANSLATION)"""
+    fields_to_exclude = [
+        c.PATCH_X_STR,
+        c.PATCH_Y_STR,
+        c.CLASSIFICATION_STR,
+    ]
+
+    return [field for field in recipient_fields if (field in donor_fields) and (field not in fields_to_exclude)]
+
+
 def test_field_exists(file_path: str, column: str) -> bool:
-    output_file = laspy.read(file_path)
-    return column in get_field_from_header(output_file)
+    with laspy.open(file_path) as las_file:
+        return column in get_field_from_header(las_file)
+
+
+def get_new_points(config: DictConfig, extra_points: pd.DataFrame, fields_to_keep: List[str], header: LasHeader):
+    """Create the laspy points record (using the output header) of the points to add to the recipient"""
+    # put in a new table all extra points and their values on the fields we want to keep
+    new_points = laspy.ScaleAwarePointRecord.zeros(extra_points.shape[0], header=header)
+    for field in fields_to_keep:
+        new_points[field] = extra_points[field].astype(new_points[field])
+
+    # translate the classification values:
+    for classification in config.DONOR_CLASS_LIST:
+        new_classification = config.DONOR_CLASS_TRANSLATION[classification]
+        extra_points.loc[extra_points[c.CLASSIFICATION_STR] == classification, c.CLASSIFICATION_STR] = (
+            new_classification
+        )
+
+    if config.NEW_COLUMN:
+        extra_points[config.NEW_COLUMN] = config.VALUE_ADDED_POINTS
+        new_points[config.NEW_COLUMN] = extra_points[config.NEW_COLUMN]
+
+    new_points.classification = extra_points[c.CLASSIFICATION_STR]
+
+    return new_points
 
 
 def append_points(config: DictConfig, extra_points: pd.DataFrame):
+    """Write the output file: a copy of the recipient file (with the NEW_COLUMN dimension if required), followed by
+    extra_points.
+
+    The recipient is read and written by chunks of config.CHUNK_SIZE points, with the output header (including the
+    new dimension) created before writing, so that the recipient points are decoded and encoded only once. The file
+    is written in a temporary file first, then renamed, so that a run that stops never leaves a partial output.
+    """
     # get field to copy :
     recipient_filepath = os.path.join(config.filepath.RECIPIENT_DIRECTORY, config.filepath.RECIPIENT_NAME)
     output_filepath = os.path.join(config.filepath.OUTPUT_DIR, config.filepath.OUTPUT_NAME)
+    os.makedirs(config.filepath.OUTPUT_DIR, exist_ok=True)
+
     with laspy.open(recipient_filepath) as recipient_file:
         recipient_fields_list = get_field_from_header(recipient_file)
 
-    # get fields that are in the donor file we can transmit to the recipient without problem
-    # classification is in the fields to exclude because it will be copied in a special way
-    fields_to_exclude = [
-        c.PATCH_X_STR,
-        c.PATCH_Y_STR,
-        c.CLASSIFICATION_STR,
-        c.CLASSIFICATION_STR + c.RECIPIENT_SUFFIX,
-    ]
-
-    fields_to_keep = [
-        field
-        for field in recipient_fields_list
-        if (field.lower() in extra_points.columns) and (field.lower() not in fields_to_exclude)
-    ]
+        # get fields that are in the donor file we can transmit to the recipient without problem
+        fields_to_keep = get_fields_to_transmit(recipient_fields_list, list(extra_points.columns))
 
-    copy2(recipient_filepath, output_filepath)
+        output_header = deepcopy(recipient_file.header)
 
-    # if we want a new column, we start by adding its name
-    if config.NEW_COLUMN:
-        if test_field_exists(recipient_filepath, config.NEW_COLUMN):
-            raise ValueError(
-                f"{config.NEW_COLUMN} already exists as \
-                             column name in {recipient_filepath}"
-            )
-        new_column_type = get_type(config.NEW_COLUMN_SIZE)
-        output_las = laspy.read(output_filepath)
-        output_las.add_extra_dim(
-            laspy.ExtraBytesParams(
-                name=config.NEW_COLUMN,
-                type=new_column_type,
-                description="Point origin: 0=initial las",
+        # if we want a new column, we start by adding its name
+        if config.NEW_COLUMN:
+            if config.NEW_COLUMN in recipient_fields_list:
+                raise ValueError(f"{config.NEW_COLUMN} already exists as column name in {recipient_filepath}")
+            new_column_type = get_type(config.NEW_COLUMN_SIZE)
+            output_header.add_extra_dim(
+                laspy.ExtraBytesParams(
+                    name=config.NEW_COLUMN,
+                    type=new_column_type,
+                    description="Point origin: 0=initial las",
+                )
             )
+
+        # write in a temporary file first, so that the output file is never partially written
+        output_stem, output_extension = os.path.splitext(output_filepath)
+        tmp_output_filepath = f"{output_stem}.{os.getpid()}.tmp{output_extension}"
+        try:
+            with laspy.open(
+                tmp_output_filepath,
+                mode="w",
+                header=output_header,
+                do_compress=recipient_file.header.are_points_compressed,
+            ) as output_las:
+                for recipient_points in recipient_file.chunk_iterator(config.CHUNK_SIZE):
+                    if config.NEW_COLUMN:
+                        # copy the raw recipient records, the new dimension is left to 0
+                        output_points = laspy.ScaleAwarePointRecord.zeros(
+                            len(recipient_points), header=output_las.header
+                        )
+                        for field_name in recipient_points.array.dtype.names:
+                            output_points.array[field_name] = recipient_points.array[field_name]
+                        recipient_points = output_points
+                    output_las.write_points(recipient_points)
+
+                if len(extra_points):
+                    output_las.write_points(get_new_points(config, extra_points, fields_to_keep, output_las.header))
+
+                if recipient_file.header.evlrs:
+                    output_las.write_evlrs(recipient_file.header.evlrs)
+        except BaseException:
+            if os.path.isfile(tmp_output_filepath):
+                os.remove(tmp_output_filepath)
+            raise
+        os.replace(tmp_output_filepath, output_filepath)
+
+
+def get_tile_donor_info(
+    config: DictConfig,
+    tile_origin: Tuple[int, int],
+    recipient_occupancy_grid: np.ndarray,
+    donor_index: DonorIndex | None,
+    donor_catalog: DonorCatalog | None,
+    run_report: RunReport | None = None,
+) -> gpd.GeoDataFrame:
+    """Get the donors of a tile from the donor shapefile (cf. get_donor_info_from_shapefile). If the recipient has no
+    empty patch, the shapefile is not queried and there is no donor.
+
+    Args:
+        config (DictConfig): patchwork configuration
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        recipient_occupancy_grid (np.ndarray): occupancy grid of the recipient (cf. get_recipient_occupancy_grid)
+        donor_index (DonorIndex | None): index on the donor shapefile (only used if there are empty patches)
+        donor_catalog (DonorCatalog | None): catalog of the donor files
+        run_report (RunReport | None, optional): report where the shapefile query and the donor files discovery
+        are measured. Defaults to None.
+
+    Returns:
+        gpd.GeoDataFrame: donor files to use, with their footprint
+    """
+    if np.all(recipient_occupancy_grid):
+        return gpd.GeoDataFrame(columns=["x", "y", "full_path", "geometry"])
+
+    tile_bounds = get_tile_bounds(tile_origin, config.TILE_SIZE)
+    return get_donor_info_from_shapefile(
+        donor_index,
+        tile_origin[0] / config.SHP_X_Y_TO_METER_FACTOR,
+        tile_origin[1] / config.SHP_X_Y_TO_METER_FACTOR,
+        config.filepath.DONOR_SUBDIRECTORY,
+        config.mount_points,
+        config.DONOR_PRIORITY_FIELD,
+        tile_bounds if config.DONOR_QUERY_BY_BOUNDS else None,
+        donor_catalog,
+        run_report,
+    )
+
+
+def create_donor_grid(recipient_occupancy_grid: np.ndarray, df_donor_info: gpd.GeoDataFrame) -> np.ndarray:
+    """Create an empty donor grid for get_complementary_points, with the smallest type that can store the donor ids"""
+    dtype = np.uint8 if len(df_donor_info.index) <= np.iinfo(np.uint8).max else np.uint16
+    return np.zeros(recipient_occupancy_grid.shape, dtype=dtype)
+
+
+def write_patchwork_outputs(
+    config: DictConfig,
+    complementary_points: pd.DataFrame,
+    tile_origin: Tuple[int, int],
+    donor_grid: np.ndarray | None = None,
+    donor_paths: List[str] | None = None,
+    run_report: RunReport | None = None,
+):
+    """Write the output file (recipient + complementary points) and the indices map of a tile. The indices map is
+    written from donor_grid if it is given (cf. get_complementary_points), from the complementary points otherwise.
+    Both writes are measured in run_report if it is set ("output_write" and "indices_map_write").
+    """
+    with report_stage(run_report, "output_write") as measures:
+        append_points(config, complementary_points)
+        measures["points_in"] = len(complementary_points.index)
+        measures["bytes_written"] = os.path.getsize(
+            os.path.join(config.filepath.OUTPUT_DIR, config.filepath.OUTPUT_NAME)
         )
-        output_las.write(output_filepath)
-
-    if len(extra_points) == 0:  # if no point to add, the job is done after copying the recipient file
-        return
-
-    with laspy.open(output_filepath, mode="a") as output_las:
-        # put in a new table all extra points and their values on the fields we want to keep
-        new_points = laspy.ScaleAwarePointRecord.zeros(extra_points.shape[0], header=output_las.header)
-        for field in fields_to_keep:
-            new_points[field] = extra_points[field].astype(new_points[field])
-
-        # translate the classification values:
-        for classification in config.DONOR_CLASS_LIST:
-            new_classification = config.DONOR_CLASS_TRANSLATION[classification]
-            extra_points.loc[extra_points[c.CLASSIFICATION_STR] == classification, c.CLASSIFICATION_STR] = (
-                new_classification
+
+    with report_stage(run_report, "indices_map_write") as measures:
+        if donor_grid is not None:
+            write_indices_map(config, donor_grid, tile_origin[0], tile_origin[1], donor_paths)
+        else:
+            create_indices_map(config, complementary_points, tile_origin[0], tile_origin[1])
+        measures["bytes_written"] = os.path.getsize(
+            os.path.join(config.filepath.OUTPUT_INDICES_MAP_DIR, config.filepath.OUTPUT_INDICES_MAP_NAME)
+        )
+
+
+def estimate_donor_fill(
+    df_donor_info: gpd.GeoDataFrame,
+    recipient_occupancy_grid: np.ndarray,
+    tile_origin: Tuple[int, int],
+    config: DictConfig,
+    donor_catalog: DonorCatalog,
+    run_report: RunReport | None = None,
+) -> Tuple[np.ndarray, int, int]:
+    """Estimate the patches that the donors would fill, and their number of points, from the donor headers only
+    (for the dry-run mode): the donors are not decoded.
+
+    Each donor is assumed to have a uniform density over its bounds (number of points and bounds read in its header,
+    cf. DonorCatalog.get_header_info). A donor fills the empty patches whose center is in its footprint and in its
+    bounds (in priority mode, only the ones not filled by the previous donors, like get_complementary_points). The
+    classes and the synthetic flag of the points are not in the header: all the points are counted, so the numbers
+    of points are upper bounds when the donors have points of other classes.
+
+    Args:
+        df_donor_info (gpd.GeoDataFrame): donor files to use, with their footprint (cf. get_tile_donor_info)
+        recipient_occupancy_grid (np.ndarray): grid of the patches that must not be filled
+        tile_origin (Tuple[int, int]): Origin point of the tile (in meters)
+        config (DictConfig): patchwork configuration
+        donor_catalog (DonorCatalog): catalog of the donor files, where their headers are read
+        run_report (RunReport | None, optional): report where the estimate is measured ("donor_estimate").
+        Defaults to None.
+
+    Returns:
+        Tuple[np.ndarray, int, int]: donor grid (id of the first donor that would fill each patch, cf.
+        get_complementary_points), number of candidate donor points (in the donor footprints), and number of points
+        that would be added
+    """
+    donor_grid = create_donor_grid(recipient_occupancy_grid, df_donor_info)
+    filled_patches_grid = recipient_occupancy_grid.copy()
+    nb_candidate_points = 0.0
+    nb_added_points = 0.0
+    with report_stage(run_report, "donor_estimate") as measures:
+        for donor_id, (donor_path, footprint) in enumerate(
+            zip(df_donor_info["full_path"], df_donor_info.geometry), start=1
+        ):
+            header_info = donor_catalog.get_header_info(donor_path)
+            donor_bounds = box(*header_info["bounds"])
+            if donor_bounds.area == 0:
+                continue
+            donor_density = header_info["point_count"] / donor_bounds.area
+            donor_footprint = footprint.intersection(donor_bounds)
+            donor_fill_grid = (
+                get_footprint_grid(donor_footprint, tile_origin, config.PATCH_SIZE, config.TILE_SIZE, False)
+                & ~filled_patches_grid
             )
+            if not np.any(donor_fill_grid):
+                continue  # donor that would not be opened by get_complementary_points
 
-        if config.NEW_COLUMN:
-            extra_points[config.NEW_COLUMN] = config.VALUE_ADDED_POINTS
-            new_points[config.NEW_COLUMN] = extra_points[config.NEW_COLUMN]
+            donor_grid[donor_fill_grid & (donor_grid == 0)] = donor_id
+            if config.DONOR_PRIORITY_FIELD:
+                filled_patches_grid |= donor_fill_grid
+            nb_candidate_points += donor_density * donor_footprint.area
+            nb_added_points += donor_density * config.PATCH_SIZE**2 * np.count_nonzero(donor_fill_grid)
+        measures["points_in"] = int(round(nb_candidate_points))
+        measures["points_out"] = int(round(nb_added_points))
 
-        new_points.classification = extra_points[c.CLASSIFICATION_STR]
-        output_las.append_points(new_points)
+    return donor_grid, int(round(nb_candidate_points)), int(round(nb_added_points))
 
 
-def patchwork(config: DictConfig):
-    recipient_filepath = os.path.join(config.filepath.RECIPIENT_DIRECTORY, config.filepath.RECIPIENT_NAME)
-    origin_x_meters, origin_y_meters = get_tile_origin_using_header_info(recipient_filepath, config.TILE_SIZE)
-    x_shapefile = origin_x_meters / config.SHP_X_Y_TO_METER_FACTOR
-    y_shapefile = origin_y_meters / config.SHP_X_Y_TO_METER_FACTOR
+def get_fill_estimate(
+    recipient_file_path: str,
+    recipient_occupancy_grid: np.ndarray,
+    donor_grid: np.ndarray,
+    nb_donors: int,
+    nb_candidate_points: int,
+    nb_added_points: int,
+) -> Dict:
+    """Get the fill statistics of a tile (for the dry-run mode).
+
+    The size of the output file is estimated from the size of the recipient file per point (read in its header),
+    which gives the same compression ratio to the added points.
+
+    Args:
+        recipient_file_path (str): path to the recipient file
+        recipient_occupancy_grid (np.ndarray): grid of the patches that must not be filled
+        donor_grid (np.ndarray): id of the donor of each patch that would be filled (cf. estimate_donor_fill)
+        nb_donors (int): number of donor files of the tile
+        nb_candidate_points (int): number of donor points in the footprints of the donors that would be used
+        nb_added_points (int): number of points that would be added to the recipient
 
-    shapefile_path = os.path.join(config.filepath.SHP_DIRECTORY, config.filepath.SHP_NAME)
-    donor_info_df = get_donor_info_from_shapefile(
-        shapefile_path, x_shapefile, y_shapefile, config.filepath.DONOR_SUBDIRECTORY, config.mount_points
+    Returns:
+        Dict: number of patches, of empty patches, of patches that would be filled, of donors, of candidate
+        donor points, of points that would be added, of recipient points, and estimated output size (in bytes)
+    """
+    with laspy.open(recipient_file_path) as recipient_file:
+        nb_recipient_points = recipient_file.header.point_count
+    recipient_size = os.path.getsize(recipient_file_path)
+    estimated_output_size = recipient_size
+    if nb_recipient_points:
+        estimated_output_size += int(round(nb_added_points * recipient_size / nb_recipient_points))
+
+    return {
+        "patches": int(recipient_occupancy_grid.size),
+        "empty_patches": int(np.count_nonzero(~recipient_occupancy_grid)),
+        "fillable_patches": int(np.count_nonzero(donor_grid)),
+        "donors": nb_donors,
+        "candidate_donor_points": nb_candidate_points,
+        "added_points": nb_added_points,
+        "recipient_points": nb_recipient_points,
+        "estimated_output_size": estimated_output_size,
+    }
+
+
+def write_run_report(
+    config: DictConfig, run_report: RunReport, recipient_path: str, tile_origin: Tuple[int, int], added_points: int
+):
+    """Add the information on the tile to run_report, and write it in config.filepath.OUTPUT_DIR/OUTPUT_REPORT_NAME
+    (if it is set)"""
+    run_report.info.update(
+        {
+            "recipient": recipient_path,
+            "tile_origin": [float(tile_origin[0]), float(tile_origin[1])],
+            "added_points": added_points,
+        }
+    )
+    if config.filepath.OUTPUT_REPORT_NAME:
+        run_report.write(os.path.join(config.filepath.OUTPUT_DIR, config.filepath.OUTPUT_REPORT_NAME))
+
+
+def patchwork(
+    config: DictConfig,
+    donor_index: DonorIndex | None = None,
+    donor_catalog: DonorCatalog | None = None,
+    donor_cache: DonorCache | None = None,
+    donor_staging: DonorStaging | None = None,
+    run_report: RunReport | None = None,
+) -> int:
+    """Add to the recipient file the donor points located in its empty patches, and write the indices map.
+
+    Args:
+        config (DictConfig): patchwork configuration
+        donor_index (DonorIndex | None, optional): index on the shapefile describing the donor files, if it has
+        already been loaded (eg. to process several tiles). Defaults to None (the shapefile is read from
+        config.filepath.SHP_DIRECTORY/SHP_NAME).
+        donor_catalog (DonorCatalog | None, optional): catalog of the donor files, if it has already been loaded.
+        Defaults to None (the catalog is loaded from config.filepath.DONOR_CATALOG_PATH, and saved back at the
+        end).
+        donor_cache (DonorCache | None, optional): cache of the points already read in donor files (eg. by the
+        previous tiles). Defaults to None (no cache).
+        donor_staging (DonorStaging | None, optional): local copies of the donor files. Defaults to None (created
+        from config.filepath.DONOR_STAGING_DIRECTORY if it is set).
+        run_report (RunReport | None, optional): report where the stages of the run are measured (eg. with a
+        callback called at the end of each stage). Defaults to None (a report is created if
+        config.filepath.OUTPUT_REPORT_NAME is set). The report is written in
+        config.filepath.OUTPUT_DIR/OUTPUT_REPORT_NAME if it is set.
+
+    If config.DRY_RUN is true, the donors are not decoded, and the output file and the indices map are not written:
+    the fill statistics of the tile are estimated from the recipient occupancy grid, the donor footprints and the
+    donor headers (cf. estimate_donor_fill and get_fill_estimate), and added to the run report ("fill_estimate").
+    Pass a run_report to read them.
+
+    Returns:
+        int: number of points added to the recipient (or estimated number of points that would be added, in dry-run
+        mode)
+    """
+    if run_report is None and (config.filepath.OUTPUT_REPORT_NAME or config.DRY_RUN):
+        # in dry-run mode, the fill statistics are returned in the run report
+        run_report = RunReport()
+
+    recipient_filepath = os.path.join(config.filepath.RECIPIENT_DIRECTORY, config.filepath.RECIPIENT_NAME)
+    with report_stage(run_report, "header_read"):
+        tile_origin = get_tile_origin_using_header_info(recipient_filepath, config.TILE_SIZE)
+
+    recipient_occupancy_grid = get_tile_occupancy_grid(recipient_filepath, tile_origin, config, run_report)
+
+    save_donor_catalog = False
+    close_donor_staging = False
+    if not np.all(recipient_occupancy_grid):
+        # index, catalog and staging are only needed if there are empty patches to fill
+        if donor_index is None:
+            with report_stage(run_report, "shapefile_read"):
+                donor_index = load_donor_index(config)
+        if donor_catalog is None:
+            donor_catalog = load_donor_catalog(config)
+            save_donor_catalog = True
+        if donor_staging is None:
+            donor_staging = get_donor_staging(config)
+            close_donor_staging = donor_staging is not None
+    donor_info_df = get_tile_donor_info(
+        config, tile_origin, recipient_occupancy_grid, donor_index, donor_catalog, run_report
     )
 
+    if config.DRY_RUN:
+        donor_grid, nb_candidate_points, nb_added_points = estimate_donor_fill(
+            donor_info_df, recipient_occupancy_grid, tile_origin, config, donor_catalog, run_report
+        )
+        if save_donor_catalog:
+            donor_catalog.save()
+        run_report.info["fill_estimate"] = get_fill_estimate(
+            recipient_filepath,
+            recipient_occupancy_grid,
+            donor_grid,
+            len(donor_info_df.index),
+            nb_candidate_points,
+            nb_added_points,
+        )
+        write_run_report(config, run_report, recipient_filepath, tile_origin, nb_added_points)
+
+        return nb_added_points
+
+    donor_grid = create_donor_grid(recipient_occupancy_grid, donor_info_df)
     complementary_bd_points = get_complementary_points(
-        donor_info_df, recipient_filepath, (origin_x_meters, origin_y_meters), config
+        donor_info_df,
+        recipient_filepath,
+        tile_origin,
+        config,
+        recipient_occupancy_grid,
+        donor_catalog,
+        donor_cache,
+        donor_staging,
+        donor_grid,
+        run_report,
+    )
+    if save_donor_catalog:
+        donor_catalog.save()
+    if close_donor_staging:
+        donor_staging.close()
+
+    write_patchwork_outputs(
+        config, complementary_bd_points, tile_origin, donor_grid, list(donor_info_df["full_path"]), run_report
     )
 
-    append_points(config, complementary_bd_points)
+    if run_report is not None:
+        write_run_report(config, run_report, recipient_filepath, tile_origin, len(complementary_bd_points.index))
 
-    corner_x, corner_y = get_tile_origin_using_header_info(filename=recipient_filepath, tile_width=config.TILE_SIZE)
-    create_indices_map(config, complementary_bd_points, corner_x, corner_y)
+    return len(complementary_bd_points.index)
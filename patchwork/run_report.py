@@ -0,0 +1,145 @@
+import json
+import os
+import platform
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator
+
+# counters of a stage, summed over its executions
+STAGE_COUNTERS = ["points_in", "points_out", "bytes_read", "bytes_written"]
+
+
+def get_peak_rss() -> int:
+    """Return the peak resident memory of the current process (in bytes)"""
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if platform.system() == "Darwin" else peak_rss * 1024
+
+
+class RunReport:
+    """Timing and memory measures of the stages of a patchwork run, to find which tiles are slow and why.
+
+    Each stage is measured with: wall time, CPU time of the thread that runs it, increase of the peak resident memory
+    of the process during the stage, and counters (points in/out, bytes read/written) set by the stage itself. A
+    stage that runs several times (eg. for each chunk of the recipient) is reported once, with the sum of its
+    measures. Stages of the same name with different details (eg. the donor file) are reported separately.
+
+    If callback is set, it is called with the measures of each stage execution as soon as it ends (eg. to send them
+    to a monitoring system). The report can be used by several threads (eg. donors loaded in parallel).
+    """
+
+    def __init__(self, callback: Callable[[Dict], None] | None = None):
+        self.callback = callback
+        self.stages: Dict[tuple, Dict] = {}
+        self.info: Dict = {}
+        self._begin = time.perf_counter()
+        self._begin_cpu = time.process_time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, **details) -> Iterator[Dict]:
+        """Measure a stage. The context manager yields the measures of this execution, whose counters
+        (STAGE_COUNTERS) can be set by the stage.
+
+        Args:
+            name (str): name of the stage
+            **details: information identifying the stage (eg. donor=path), reported with its measures
+        """
+        measures = {"name": name, **details, **{counter: 0 for counter in STAGE_COUNTERS}}
+        start = self._get_start()
+        try:
+            yield measures
+        finally:
+            self._end_stage(measures, details, start)
+
+    def iter_stage(self, iterable: Iterable, name: str, **details) -> Iterator:
+        """Iterate over iterable, measuring the production of each item (eg. decoding a chunk of points) as a stage.
+        The length of each item (eg. the number of points of a chunk) is counted in points_out. The stage is
+        counted once per item: the end of the iteration is not measured."""
+        iterator = iter(iterable)
+        while True:
+            measures = {"name": name, **details, **{counter: 0 for counter in STAGE_COUNTERS}}
+            start = self._get_start()
+            try:
+                item = next(iterator, StopIteration)
+            except BaseException:
+                self._end_stage(measures, details, start)
+                raise
+            if item is StopIteration:
+                return
+            if hasattr(item, "__len__"):
+                measures["points_out"] = len(item)
+            self._end_stage(measures, details, start)
+            yield item
+
+    @staticmethod
+    def _get_start() -> tuple:
+        """Return the peak resident memory, wall time and thread CPU time at the start of a stage execution"""
+        return get_peak_rss(), time.perf_counter(), time.thread_time()
+
+    def _end_stage(self, measures: Dict, details: Dict, start: tuple):
+        """Complete the measures of a stage execution (cf. _get_start), add them to the report and call the
+        callback"""
+        peak_rss, begin, begin_cpu = start
+        measures["wall_time"] = time.perf_counter() - begin
+        measures["cpu_time"] = time.thread_time() - begin_cpu
+        measures["peak_rss_delta"] = get_peak_rss() - peak_rss
+        measures["calls"] = 1
+        self._add_measures(measures, tuple(sorted(details.items(), key=lambda item: item[0])))
+        if self.callback is not None:
+            self.callback(measures)
+
+    def _add_measures(self, measures: Dict, details_key: tuple):
+        with self._lock:
+            key = (measures["name"], details_key)
+            stage = self.stages.get(key)
+            if stage is None:
+                self.stages[key] = dict(measures)
+                return
+            for field in ["wall_time", "cpu_time", "calls", *STAGE_COUNTERS]:
+                stage[field] += measures[field]
+            stage["peak_rss_delta"] = max(stage["peak_rss_delta"], measures["peak_rss_delta"])
+
+    def to_dict(self) -> Dict:
+        """Return the report: information on the run (self.info), total wall and CPU times, peak resident memory of
+        the process, and the measures of each stage (in the order they first ran)"""
+        with self._lock:
+            stages = [dict(stage) for stage in self.stages.values()]
+
+        return {
+            **self.info,
+            "wall_time": time.perf_counter() - self._begin,
+            "cpu_time": time.process_time() - self._begin_cpu,
+            "peak_rss": get_peak_rss(),
+            "stages": stages,
+        }
+
+    def write(self, report_path: str):
+        """Write the report in a json file"""
+        report_directory = os.path.dirname(report_path)
+        if report_directory:
+            os.makedirs(report_directory, exist_ok=True)
+        with open(report_path, "w", encoding="utf-8") as report_file:
+            json.dump(self.to_dict(), report_file, indent=2)
+
+
+@contextmanager
+def report_stage(run_report: RunReport | None, name: str, **details) -> Iterator[Dict]:
+    """Measure a stage in run_report (cf. RunReport.stage). If run_report is None, nothing is measured, and the
+    yielded counters are ignored."""
+    if run_report is None:
+        yield {counter: 0 for counter in STAGE_COUNTERS}
+    else:
+        with run_report.stage(name, **details) as measures:
+            yield measures
+
+
+def report_iter_stage(run_report: RunReport | None, iterable: Iterable, name: str, **details) -> Iterable:
+    """Measure the iteration over iterable in run_report (cf. RunReport.iter_stage), or return iterable as is if
+    run_report is None"""
+    if run_report is None:
+        return iterable
+
+    return run_report.iter_stage(iterable, name, **details)
@@ -1,15 +1,25 @@
-import fnmatch
 import os
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import geopandas as gpd
 from omegaconf import DictConfig
 
+from patchwork.donor_catalog import DonorCatalog
+from patchwork.donor_index import DonorIndex
 from patchwork.path_manipulation import get_mounted_path_from_raw_path
+from patchwork.run_report import RunReport, report_stage
 
 
 def get_donor_info_from_shapefile(
-    input_shapefile: str, x: int, y: int, tile_subdirectory: str, mount_points: List[Dict] | DictConfig
+    input_shapefile: str | gpd.GeoDataFrame | DonorIndex,
+    x: int,
+    y: int,
+    tile_subdirectory: str,
+    mount_points: List[Dict] | DictConfig,
+    priority_field: str | None = None,
+    tile_bounds: Tuple[float, float, float, float] | None = None,
+    donor_catalog: DonorCatalog | None = None,
+    run_report: RunReport | None = None,
 ) -> gpd.GeoDataFrame:
     """Retrieve paths to all the donor files associated with a given tile (with origin x, y) from a shapefile.
 
@@ -21,8 +31,8 @@ def get_donor_info_from_shapefile(
         - nom_coord: string indicating if the coordinates are expected to be found in the filename
         - nuage_mixa: path to the directory that contains the donor file
 
-    The filename for each donor is found using pattern matching using {x}_{y} in the {nuage_mixa}/{tile_subdirectory}
-    directory.
+    The filename for each donor is the file of the {nuage_mixa}/{tile_subdirectory} directory whose name contains
+    {x}_{y} (looked up in the donor catalog).
 
     It is stored in the "full_path" column of the output geodataframe
 
@@ -34,7 +44,8 @@ def get_donor_info_from_shapefile(
     when using this mount point
 
     Args:
-        input_shapefile (str): Shapefile describing donor files
+        input_shapefile (str | gpd.GeoDataFrame | DonorIndex): Shapefile describing donor files (or its content,
+        or an index on its content, if it has already been loaded)
         x (int): x coordinate of the tile for which to get the donors
         (in the same unit as in the shapefile, usually km)
         y (int): y coordinate of the tile for which to get the donors
@@ -43,6 +54,15 @@ def get_donor_info_from_shapefile(
         mount_points (List[Dict]): dictionaries describing the mount points to use to interpret paths from "nuage_mixa"
         in case the path is related to a distant folder that can be mounted in different ways *(cf. dictionary
         structure above)
+        priority_field (str | None, optional): if not None, attribute of the shapefile used to sort the donors
+        (lowest value first = highest priority). Defaults to None (donors are kept in the shapefile order).
+        tile_bounds (Tuple[float, float, float, float] | None, optional): if not None, bounds of the tile
+        (minx, miny, maxx, maxy, in meters): the donors are the geometries that intersect these bounds, instead of
+        the ones with x, y attributes. Defaults to None.
+        donor_catalog (DonorCatalog | None, optional): catalog of the donor files. Defaults to None (a new catalog
+        is created, so the donor directories are listed again).
+        run_report (RunReport | None, optional): report where the shapefile query ("shapefile_query") and the search
+        of the donor files in their directories ("donor_discovery") are measured. Defaults to None.
 
     Raises:
         NotImplementedError: if nom_coord is false (case not handled)
@@ -52,10 +72,22 @@ def get_donor_info_from_shapefile(
 
     Returns:
         gpd.GeoDataFrame: geodataframe with columns ["x", "y", "full_path", "geometry"] for each donor file for the
-          x, y tile
+          x, y tile (sorted by priority if priority_field is set)
     """
-    gdf = gpd.GeoDataFrame.from_file(input_shapefile, encoding="utf-8")
-    gdf = gdf[(gdf["x"].astype(int) == x) & (gdf["y"].astype(int) == y)]
+    if isinstance(input_shapefile, DonorIndex):
+        donor_index = input_shapefile
+    elif isinstance(input_shapefile, gpd.GeoDataFrame):
+        donor_index = DonorIndex(input_shapefile)
+    else:
+        donor_index = DonorIndex(gpd.GeoDataFrame.from_file(input_shapefile, encoding="utf-8"))
+
+    with report_stage(run_report, "shapefile_query"):
+        if tile_bounds is None:
+            gdf = donor_index.query(x, y).copy()
+        else:
+            gdf = donor_index.query_bounds(tile_bounds).copy()
+        if priority_field:
+            gdf = gdf.sort_values(by=priority_field, kind="stable")
 
     if not gdf["nom_coord"].isin(["oui", "yes", "true"]).all():
         unsupported_geometries = gdf[(~gdf["nom_coord"].isin(["oui", "yes", "true"]))]
@@ -66,28 +98,22 @@ def get_donor_info_from_shapefile(
         )
 
     if len(gdf.index):
+        if donor_catalog is None:
+            donor_catalog = DonorCatalog()
 
         def find_las_path_from_geometry_attributes(x: int, y: int, path_root: str, mount_points: List[Dict]):
             mounted_path_root = get_mounted_path_from_raw_path(path_root, mount_points)
             tile_directory = os.path.join(mounted_path_root, tile_subdirectory)
-            if not os.path.isdir(tile_directory):
-                raise FileNotFoundError(f"Directory {tile_directory} not found")
-            potential_filenames = fnmatch.filter(os.listdir(tile_directory), f"*{x}_{y}*.la[sz]")
-            if not potential_filenames:
-                raise FileNotFoundError(
-                    f"Could not match any file with directory {tile_directory} and coords ({x}, {y})"
-                )
-            if len(potential_filenames) > 1:
-                raise RuntimeError(
-                    f"Found multiple files for directory {tile_directory} and coords ({x}, {y}): {potential_filenames}"
-                )
-
-            return os.path.join(tile_directory, potential_filenames[0])
-
-        gdf["full_path"] = gdf.apply(
-            lambda row: find_las_path_from_geometry_attributes(row["x"], row["y"], row["nuage_mixa"], mount_points),
-            axis="columns",
-        )
+
+            return donor_catalog.find_donor_file(tile_directory, x, y)
+
+        with report_stage(run_report, "donor_discovery"):
+            gdf["full_path"] = gdf.apply(
+                lambda row: find_las_path_from_geometry_attributes(
+                    row["x"], row["y"], row["nuage_mixa"], mount_points
+                ),
+                axis="columns",
+            )
     else:
         gdf = gpd.GeoDataFrame(columns=["x", "y", "full_path", "geometry"])
 
@@ -0,0 +1,192 @@
+import os
+from copy import deepcopy
+from typing import Dict, Tuple
+
+import geopandas as gpd
+import laspy
+import numpy as np
+from omegaconf import DictConfig
+from shapely.geometry import box
+
+# origin (xmin, ymax) of the synthetic tiles, in meters. It must be a multiple of 1000, as the shapefile x, y
+# attributes are in km
+SYNTHETIC_TILE_ORIGIN = (843000, 6447000)
+
+# classes of the synthetic points, with their proportion
+RECIPIENT_CLASSES = {1: 0.2, 2: 0.5, 6: 0.3}
+DONOR_CLASSES = {1: 0.2, 2: 0.7, 22: 0.1}
+SYNTHETIC_FLAG_RATIO = 0.05  # proportion of donor points with the synthetic flag
+
+
+def get_hole_grid(tile_size: int, patch_size: float, hole_ratio: float, rng: np.random.Generator) -> np.ndarray:
+    """Return a grid of the patches of a tile (row 0 at the top) where hole_ratio of the patches, chosen at random,
+    are holes (True)"""
+    grid_size = int(tile_size / patch_size)
+    nb_holes = int(round(hole_ratio * grid_size * grid_size))
+    hole_grid = np.zeros(grid_size * grid_size, dtype=bool)
+    hole_grid[rng.choice(grid_size * grid_size, size=nb_holes, replace=False)] = True
+
+    return hole_grid.reshape((grid_size, grid_size))
+
+
+def create_synthetic_las(
+    las_path: str,
+    tile_origin: Tuple[int, int],
+    tile_size: int,
+    nb_points: int,
+    classes: Dict[int, float],
+    rng: np.random.Generator,
+    hole_grid: np.ndarray | None = None,
+    synthetic_ratio: float = 0.0,
+) -> int:
+    """Write a las/laz file (point format 6, compressed if las_path ends with .laz) of nb_points random points
+    uniformly spread over a tile, with classes drawn from classes ({class: proportion}). The points that fall in the
+    holes of hole_grid (cf. get_hole_grid) are removed.
+
+    Returns:
+        int: number of points written
+    """
+    xmin, ymax = tile_origin
+    # keep the points strictly inside the tile, so that its origin can be inferred from the header bounds
+    x = rng.uniform(xmin + 0.01, xmin + tile_size - 0.01, nb_points)
+    y = rng.uniform(ymax - tile_size + 0.01, ymax - 0.01, nb_points)
+    if hole_grid is not None:
+        patch_size = tile_size / hole_grid.shape[0]
+        rows = ((ymax - y) / patch_size).astype(int)
+        columns = ((x - xmin) / patch_size).astype(int)
+        kept_points = ~hole_grid[rows, columns]
+        x, y = x[kept_points], y[kept_points]
+    nb_points = len(x)
+
+    header = laspy.LasHeader(point_format=6, version="1.4")
+    header.scales = np.array([0.01, 0.01, 0.01])
+    header.offsets = np.array([xmin, ymax - tile_size, 0])
+    las = laspy.LasData(header)
+    las.x = x
+    las.y = y
+    las.z = rng.uniform(0, 100, nb_points)
+    las.intensity = rng.integers(0, 4096, nb_points, dtype=np.uint16)
+    las.gps_time = rng.uniform(0, 1e6, nb_points)
+    las.classification = rng.choice(list(classes.keys()), size=nb_points, p=list(classes.values())).astype(np.uint8)
+    las.synthetic = rng.random(nb_points) < synthetic_ratio
+
+    os.makedirs(os.path.dirname(las_path), exist_ok=True)
+    las.write(las_path)
+
+    return nb_points
+
+
+def create_synthetic_dataset(
+    directory: str,
+    tile_size: int,
+    density: float,
+    hole_ratio: float,
+    nb_donors: int,
+    patch_size: float,
+    compressed: bool = True,
+    seed: int = 0,
+) -> Dict:
+    """Create a synthetic recipient tile, its donor files and the shapefile describing the donors, in directory.
+
+    The recipient has density points/m² over the tile, except in hole_ratio of its patches (chosen at random).
+    Each donor has the same density over the whole tile, and its footprint in the shapefile is a vertical strip of
+    the tile (the nb_donors strips cover the tile), so that every donor is read.
+
+    Args:
+        directory (str): directory where the files are created
+        tile_size (int): size of the tile (in meters)
+        density (float): number of points per m²
+        hole_ratio (float): proportion of the patches without points in the recipient
+        nb_donors (int): number of donor files
+        patch_size (float): size of the patches
+        compressed (bool, optional): if true, files are written as laz, as las otherwise. Defaults to True.
+        seed (int, optional): seed of the random generator. Defaults to 0.
+
+    Returns:
+        Dict: description of the dataset: tile and patch sizes, recipient directory and name, shapefile directory
+        and name, donor paths, and number of points of the recipient and of the donors
+    """
+    rng = np.random.default_rng(seed)
+    extension = "laz" if compressed else "las"
+    tile_x, tile_y = SYNTHETIC_TILE_ORIGIN[0] // 1000, SYNTHETIC_TILE_ORIGIN[1] // 1000
+    nb_points = int(round(density * tile_size * tile_size))
+
+    recipient_directory = os.path.join(directory, "recipient")
+    recipient_name = f"recipient_{tile_x:04d}_{tile_y:04d}.{extension}"
+    nb_recipient_points = create_synthetic_las(
+        os.path.join(recipient_directory, recipient_name),
+        SYNTHETIC_TILE_ORIGIN,
+        tile_size,
+        nb_points,
+        RECIPIENT_CLASSES,
+        rng,
+        hole_grid=get_hole_grid(tile_size, patch_size, hole_ratio, rng),
+    )
+
+    donor_paths = []
+    donor_directories = []
+    footprints = []
+    nb_donor_points = 0
+    strip_width = tile_size / nb_donors
+    for donor_id in range(nb_donors):
+        donor_directory = os.path.join(directory, "donors", f"donor_{donor_id}")
+        donor_path = os.path.join(donor_directory, "data", f"donor_{tile_x:04d}_{tile_y:04d}.{extension}")
+        nb_donor_points += create_synthetic_las(
+            donor_path,
+            SYNTHETIC_TILE_ORIGIN,
+            tile_size,
+            nb_points,
+            DONOR_CLASSES,
+            rng,
+            synthetic_ratio=SYNTHETIC_FLAG_RATIO,
+        )
+        donor_paths.append(donor_path)
+        donor_directories.append(donor_directory)
+        strip_xmin = SYNTHETIC_TILE_ORIGIN[0] + donor_id * strip_width
+        footprints.append(
+            box(strip_xmin, SYNTHETIC_TILE_ORIGIN[1] - tile_size, strip_xmin + strip_width, SYNTHETIC_TILE_ORIGIN[1])
+        )
+
+    shapefile_directory = os.path.join(directory, "shapefile")
+    os.makedirs(shapefile_directory, exist_ok=True)
+    gpd.GeoDataFrame(
+        data={
+            "x": [f"{tile_x:04d}"] * nb_donors,
+            "y": [f"{tile_y:04d}"] * nb_donors,
+            "nom_coord": ["oui"] * nb_donors,
+            "nuage_mixa": donor_directories,
+        },
+        geometry=footprints,
+        crs=2154,
+    ).to_file(os.path.join(shapefile_directory, "donors.shp"))
+
+    return {
+        "tile_size": tile_size,
+        "patch_size": patch_size,
+        "recipient_directory": recipient_directory,
+        "recipient_name": recipient_name,
+        "shapefile_directory": shapefile_directory,
+        "shapefile_name": "donors.shp",
+        "donor_paths": donor_paths,
+        "nb_recipient_points": nb_recipient_points,
+        "nb_donor_points": nb_donor_points,
+    }
+
+
+def get_synthetic_dataset_config(config: DictConfig, dataset: Dict, output_directory: str) -> DictConfig:
+    """Return a copy of config to run patchwork on a synthetic dataset (cf. create_synthetic_dataset), with the
+    outputs written in output_directory"""
+    dataset_config = deepcopy(config)
+    dataset_config.TILE_SIZE = dataset["tile_size"]
+    dataset_config.PATCH_SIZE = dataset["patch_size"]
+    dataset_config.filepath.RECIPIENT_DIRECTORY = dataset["recipient_directory"]
+    dataset_config.filepath.RECIPIENT_NAME = dataset["recipient_name"]
+    dataset_config.filepath.SHP_DIRECTORY = dataset["shapefile_directory"]
+    dataset_config.filepath.SHP_NAME = dataset["shapefile_name"]
+    dataset_config.filepath.DONOR_SUBDIRECTORY = "data"
+    dataset_config.filepath.OUTPUT_DIR = output_directory
+    dataset_config.filepath.OUTPUT_NAME = dataset["recipient_name"]
+    dataset_config.filepath.OUTPUT_INDICES_MAP_DIR = output_directory
+    dataset_config.filepath.OUTPUT_INDICES_MAP_NAME = os.path.splitext(dataset["recipient_name"])[0] + ".tif"
+
+    return dataset_config
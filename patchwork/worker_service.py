@@ -0,0 +1,247 @@
+import glob
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from copy import deepcopy
+from typing import Dict, List, Tuple
+
+from omegaconf import DictConfig
+
+from patchwork.batch import STATUS_OK, get_donor_cache, process_tile
+from patchwork.donor_catalog import load_donor_catalog
+from patchwork.donor_index import get_shapefile_mtime, load_donor_index
+from patchwork.donor_staging import get_donor_staging
+
+# subdirectories of the spool directory, one per job status
+JOB_STATUSES = ["queued", "running", "done", "failed"]
+# separator of the job id, worker host and worker process id in the name of a running job. It cannot appear in a
+# hostname (which may contain dots) or in a process id
+RUNNING_JOB_SEPARATOR = "@"
+
+
+def get_running_job_name(job_id: str, hostname: str, pid: int) -> str:
+    """Return the name of a running job, from its id and the host and process id of its worker"""
+    return f"{job_id}{RUNNING_JOB_SEPARATOR}{hostname}{RUNNING_JOB_SEPARATOR}{pid}.json"
+
+
+def parse_running_job_name(job_name: str) -> Tuple[str, str, int]:
+    """Return the job id, worker host and worker process id of a running job (cf. get_running_job_name)
+
+    Raises:
+        ValueError: if job_name is not the name of a running job
+    """
+    if not job_name.endswith(".json"):
+        raise ValueError(f"{job_name} is not a running job")
+    # the job id may contain the separator (it comes from the recipient name), the host and process id cannot
+    job_id, hostname, pid = job_name[: -len(".json")].rsplit(RUNNING_JOB_SEPARATOR, 2)
+
+    return job_id, hostname, int(pid)
+
+
+def get_spool_paths(spool_directory: str) -> Dict[str, str]:
+    """Return the subdirectory of the spool directory for each job status (created if needed)"""
+    spool_paths = {status: os.path.join(spool_directory, status) for status in JOB_STATUSES}
+    for spool_path in spool_paths.values():
+        os.makedirs(spool_path, exist_ok=True)
+
+    return spool_paths
+
+
+def submit_job(
+    spool_directory: str,
+    recipient_path: str,
+    output_dir: str | None = None,
+    output_indices_map_dir: str | None = None,
+) -> str:
+    """Add a tile job to the queue of a spool directory (cf. patchwork_worker).
+
+    Args:
+        spool_directory (str): spool directory of the workers
+        recipient_path (str): path to the recipient file
+        output_dir (str | None, optional): directory of the output file. Defaults to None (filepath.OUTPUT_DIR of
+        the worker configuration).
+        output_indices_map_dir (str | None, optional): directory of the indices map. Defaults to None
+        (filepath.OUTPUT_INDICES_MAP_DIR of the worker configuration).
+
+    Returns:
+        str: id of the job, ie. the name of its json file in the status subdirectories
+    """
+    queued_directory = get_spool_paths(spool_directory)["queued"]
+    # jobs are processed in the order of their names
+    job_id = f"{time.time_ns()}_{os.path.splitext(os.path.basename(recipient_path))[0]}"
+    job = {
+        "id": job_id,
+        "recipient": recipient_path,
+        "output_dir": output_dir,
+        "output_indices_map_dir": output_indices_map_dir,
+        "submitted": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    # write in a temporary file first (ignored by the workers), so that a worker never reads a partial job
+    tmp_job_path = os.path.join(queued_directory, f".{job_id}.tmp")
+    with open(tmp_job_path, "w", encoding="utf-8") as job_file:
+        json.dump(job, job_file, indent=2)
+    os.replace(tmp_job_path, os.path.join(queued_directory, f"{job_id}.json"))
+
+    return job_id
+
+
+def get_job_status(spool_directory: str, job_id: str) -> Tuple[str, Dict] | None:
+    """Return the status of a job (queued, running, done or failed) and its content (including the report of the
+    tile once it is processed), or None if the job is not found"""
+    for status in JOB_STATUSES:
+        # running jobs are named after their worker
+        job_pattern = (
+            f"{glob.escape(job_id)}{RUNNING_JOB_SEPARATOR}*.json"
+            if status == "running"
+            else f"{glob.escape(job_id)}.json"
+        )
+        for job_path in glob.glob(os.path.join(spool_directory, status, job_pattern)):
+            try:
+                with open(job_path, "r", encoding="utf-8") as job_file:
+                    return status, json.load(job_file)
+            except FileNotFoundError:
+                continue  # moved to the next status while reading it
+
+    return None
+
+
+def claim_next_job(spool_paths: Dict[str, str]) -> Tuple[str, Dict] | None:
+    """Move the first queued job to the running subdirectory, and return its new path and its content (None if the
+    queue is empty). The move is atomic, so that a job is claimed by a single worker when several workers share the
+    spool directory. The running job is named after the worker (host and process id)."""
+    for job_name in sorted(os.listdir(spool_paths["queued"])):
+        if not job_name.endswith(".json") or job_name.startswith("."):
+            continue
+        running_job_path = os.path.join(
+            spool_paths["running"],
+            get_running_job_name(os.path.splitext(job_name)[0], socket.gethostname(), os.getpid()),
+        )
+        try:
+            os.rename(os.path.join(spool_paths["queued"], job_name), running_job_path)
+        except FileNotFoundError:
+            continue  # claimed by another worker
+        with open(running_job_path, "r", encoding="utf-8") as job_file:
+            return running_job_path, json.load(job_file)
+
+    return None
+
+
+def requeue_orphan_jobs(spool_paths: Dict[str, str]) -> List[str]:
+    """Move back to the queue the running jobs of the workers of this host that are not alive anymore (eg. killed
+    while processing a tile)
+
+    Returns:
+        List[str]: ids of the requeued jobs
+    """
+    requeued_job_ids = []
+    hostname = socket.gethostname()
+    for job_name in os.listdir(spool_paths["running"]):
+        try:
+            job_id, job_hostname, job_pid = parse_running_job_name(job_name)
+        except ValueError:
+            logging.warning(f"Unexpected file in {spool_paths['running']}, ignored: {job_name}")
+            continue
+        if job_hostname != hostname:
+            continue
+        try:
+            os.kill(job_pid, 0)
+            continue  # the worker is alive
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            continue  # process of another user: alive
+        try:
+            os.rename(
+                os.path.join(spool_paths["running"], job_name), os.path.join(spool_paths["queued"], f"{job_id}.json")
+            )
+            requeued_job_ids.append(job_id)
+        except FileNotFoundError:
+            continue  # requeued by another worker
+
+    return requeued_job_ids
+
+
+def get_job_config(config: DictConfig, job: Dict) -> DictConfig:
+    """Return the configuration of a job: the worker configuration, with the output directories of the job"""
+    job_config = deepcopy(config)
+    if job.get("output_dir"):
+        job_config.filepath.OUTPUT_DIR = job["output_dir"]
+    if job.get("output_indices_map_dir"):
+        job_config.filepath.OUTPUT_INDICES_MAP_DIR = job["output_indices_map_dir"]
+
+    return job_config
+
+
+def patchwork_worker(config: DictConfig, stop_event: threading.Event | None = None) -> int:
+    """Run patchwork on the tile jobs of a spool directory (config.worker.SPOOL_DIRECTORY), as a long-running
+    worker, so that the start-up (imports, configuration) is paid once, and the index on the donor shapefile, the
+    donor catalog, the donor cache (config.batch.DONOR_CACHE_SIZE) and the donor staging are kept from one tile to
+    the next. The shapefile index is loaded again when the shapefile changes.
+
+    Jobs are json files (cf. submit_job) that move through the subdirectories of the spool directory:
+    queued -> running -> done or failed. The file of a processed job contains the report of its tile (see
+    process_tile). Several workers can share the same spool directory. When it starts, the worker requeues the jobs
+    left running by a dead worker of the same host.
+
+    The queue is checked every config.worker.POLL_INTERVAL seconds. The worker stops when stop_event is set (after
+    the current job), or when the queue is empty if config.worker.EXIT_WHEN_IDLE is true.
+
+    Args:
+        config (DictConfig): patchwork configuration, with a "worker" section
+        stop_event (threading.Event | None, optional): event to stop the worker (eg. set on SIGTERM). Defaults to
+        None.
+
+    Returns:
+        int: number of processed jobs
+    """
+    spool_paths = get_spool_paths(config.worker.SPOOL_DIRECTORY)
+    for job_id in requeue_orphan_jobs(spool_paths):
+        print(f"Job {job_id} requeued (its worker is not alive)")
+
+    shapefile_path = os.path.join(config.filepath.SHP_DIRECTORY, config.filepath.SHP_NAME)
+    shapefile_mtime = get_shapefile_mtime(shapefile_path)
+    donor_index = load_donor_index(config)
+    donor_catalog = load_donor_catalog(config)
+    donor_cache = get_donor_cache(config)
+    donor_staging = get_donor_staging(config)
+
+    nb_processed_jobs = 0
+    try:
+        while stop_event is None or not stop_event.is_set():
+            claimed_job = claim_next_job(spool_paths)
+            if claimed_job is None:
+                if config.worker.EXIT_WHEN_IDLE:
+                    break
+                if stop_event is not None:
+                    stop_event.wait(config.worker.POLL_INTERVAL)
+                else:
+                    time.sleep(config.worker.POLL_INTERVAL)
+                continue
+
+            running_job_path, job = claimed_job
+            if get_shapefile_mtime(shapefile_path) != shapefile_mtime:
+                shapefile_mtime = get_shapefile_mtime(shapefile_path)
+                donor_index = load_donor_index(config)
+
+            job["started"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            job["report"] = process_tile(
+                get_job_config(config, job), job["recipient"], donor_index, donor_catalog, donor_cache, donor_staging
+            )
+            status = "done" if job["report"]["status"] == STATUS_OK else "failed"
+            # write the job with its report, then move it (the running job is removed last, so that the job is
+            # always in one of the status subdirectories)
+            tmp_job_path = os.path.join(spool_paths[status], f".{job['id']}.tmp")
+            with open(tmp_job_path, "w", encoding="utf-8") as job_file:
+                json.dump(job, job_file, indent=2)
+            os.replace(tmp_job_path, os.path.join(spool_paths[status], f"{job['id']}.json"))
+            os.remove(running_job_path)
+            nb_processed_jobs += 1
+            print(f"Job {job['id']} {status}: {job['report']['added_points']} points added")
+    finally:
+        if donor_staging is not None:
+            donor_staging.close()
+
+    return nb_processed_jobs
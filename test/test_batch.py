@@ -0,0 +1,356 @@
+import json
+import os
+import shutil
+
+import geopandas as gpd
+import laspy
+import numpy as np
+import pytest
+import rasterio as rs
+from hydra import compose, initialize
+from shapely.geometry import box
+
+from patchwork.batch import (
+    STATUS_ERROR,
+    STATUS_OK,
+    get_morton_code,
+    get_recipient_paths,
+    get_tile_config,
+    patchwork_batch,
+    sort_recipients_by_location,
+)
+from patchwork.indices_map_mosaic import IndicesMapMosaic
+from patchwork.synthetic_tiles import (
+    create_synthetic_dataset,
+    get_synthetic_dataset_config,
+)
+
+RECIPIENT_TEST_PATH = "test/data/recipient_test.laz"
+DONOR_TEST_PATH = "test/data/donor_test.las"
+DONOR_SUBDIRECTORY = "data"
+
+
+def test_get_recipient_paths(tmp_path):
+    for name in ["tile_b.laz", "tile_a.las", "notes.txt"]:
+        (tmp_path / name).touch()
+    expected_paths = [str(tmp_path / "tile_a.las"), str(tmp_path / "tile_b.laz")]
+
+    # directory
+    assert get_recipient_paths(str(tmp_path)) == expected_paths
+    # glob pattern
+    assert get_recipient_paths(str(tmp_path / "tile_*")) == expected_paths
+    # list file, with paths relative to the list file
+    list_path = tmp_path / "recipients.txt"
+    list_path.write_text("tile_b.laz\n\n# comment\ntile_a.las\n")
+    assert get_recipient_paths(str(list_path)) == expected_paths
+
+
+def test_get_morton_code():
+    # z-order on a 4x4 grid
+    codes = [[get_morton_code(x, y) for x in range(4)] for y in range(4)]
+    assert codes == [[0, 1, 4, 5], [2, 3, 6, 7], [8, 9, 12, 13], [10, 11, 14, 15]]
+
+
+def test_sort_recipients_by_location(tmp_path):
+    recipient_paths = []
+    # tiles at (0, 0), (1, 1), (0, 1), (1, 0) relatively to the first one
+    for name, (offset_x, offset_y) in zip(["a", "b", "c", "d"], [(0, 0), (1, 1), (0, 1), (1, 0)]):
+        las = laspy.read(RECIPIENT_TEST_PATH)
+        las.x = las.x + offset_x * 1000
+        las.y = las.y + offset_y * 1000
+        recipient_path = str(tmp_path / f"{name}.laz")
+        las.write(recipient_path)
+        recipient_paths.append(recipient_path)
+    broken_path = str(tmp_path / "broken.laz")
+    with open(broken_path, "wb") as broken_file:
+        broken_file.write(b"not a laz file")
+
+    sorted_paths = sort_recipients_by_location([broken_path, *recipient_paths], 1000)
+    assert [os.path.basename(path) for path in sorted_paths] == ["a.laz", "d.laz", "c.laz", "b.laz", "broken.laz"]
+
+
+def test_get_tile_config():
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(config_name="configs_patchwork.yaml", overrides=["filepath.OUTPUT_DIR=output"])
+    tile_config = get_tile_config(config, "/path/to/tile_0843_6447.laz")
+
+    assert tile_config.filepath.RECIPIENT_DIRECTORY == "/path/to"
+    assert tile_config.filepath.RECIPIENT_NAME == "tile_0843_6447.laz"
+    assert tile_config.filepath.OUTPUT_NAME == "tile_0843_6447.laz"
+    assert tile_config.filepath.OUTPUT_INDICES_MAP_NAME == "tile_0843_6447.tif"
+    assert tile_config.filepath.OUTPUT_DIR == "output"
+    assert tile_config.filepath.INPUT_INDICES_MAP_NAME is None
+    assert tile_config.filepath.OUTPUT_REPORT_NAME is None
+    # the batch config is not modified
+    assert config.filepath.RECIPIENT_NAME is None
+
+    # replay mode: the input indices maps are named after the recipients
+    config.filepath.INPUT_INDICES_MAP_DIR = "previous_output"
+    tile_config = get_tile_config(config, "/path/to/tile_0843_6447.laz")
+    assert tile_config.filepath.INPUT_INDICES_MAP_NAME == "tile_0843_6447.tif"
+
+    # run reports are named after the recipients
+    config.filepath.OUTPUT_REPORT_NAME = "report.json"
+    assert get_tile_config(config, "/path/to/tile_0843_6447.laz").filepath.OUTPUT_REPORT_NAME == (
+        "tile_0843_6447_report.json"
+    )
+
+
+@pytest.mark.parametrize(
+    "workers, pipeline, donor_cache_size, shared_donor_cache, donor_staging, expected_donor_cache_hits",
+    [
+        (1, False, 0, False, False, 0),
+        (2, False, 0, False, False, 0),
+        (1, False, 100, False, False, 1),  # both valid tiles use the same donor: it is read only once
+        (1, False, 100, True, False, 1),
+        (1, False, 0, False, True, 0),
+        (2, False, 0, False, True, 0),
+        (1, True, 0, False, False, 0),
+        (1, True, 100, False, True, 1),
+    ],
+)
+def test_patchwork_batch(
+    tmp_path, workers, pipeline, donor_cache_size, shared_donor_cache, donor_staging, expected_donor_cache_hits
+):
+    recipient_dir = tmp_path / "recipients"
+    os.makedirs(recipient_dir)
+    shutil.copy(RECIPIENT_TEST_PATH, recipient_dir / "tile_ok_1.laz")
+    shutil.copy(RECIPIENT_TEST_PATH, recipient_dir / "tile_ok_2.laz")
+    (recipient_dir / "tile_broken.laz").write_bytes(b"not a laz file")
+
+    donor_dir = tmp_path / "donor_source"
+    os.makedirs(donor_dir / DONOR_SUBDIRECTORY)
+    shutil.copy(DONOR_TEST_PATH, donor_dir / DONOR_SUBDIRECTORY / "donor_0843_6447.las")
+
+    shapefile_dir = tmp_path / "shapefile"
+    os.makedirs(shapefile_dir)
+    gdf = gpd.GeoDataFrame(
+        data={"x": ["0843"], "y": ["6447"], "nom_coord": ["oui"], "nuage_mixa": [str(donor_dir)]},
+        geometry=[box(843000, 6446000, 844000, 6447000)],
+        crs=2154,
+    )
+    gdf.to_file(shapefile_dir / "donors.shp")
+
+    output_dir = tmp_path / "output"
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=[
+                f"filepath.SHP_DIRECTORY={shapefile_dir}",
+                "filepath.SHP_NAME=donors.shp",
+                f"filepath.OUTPUT_DIR={output_dir}",
+                f"filepath.OUTPUT_INDICES_MAP_DIR={output_dir}",
+                "DONOR_CLASS_LIST=[2, 9]",
+                "RECIPIENT_CLASS_LIST=[2, 3, 9]",
+                "+DONOR_CLASS_TRANSLATION={2: 2, 9: 9}",
+                f"batch.RECIPIENTS={recipient_dir}",
+                f"batch.WORKERS={workers}",
+                f"batch.PIPELINE={pipeline}",
+                f"batch.DONOR_CACHE_SIZE={donor_cache_size}",
+                f"batch.SHARED_DONOR_CACHE_DIRECTORY={tmp_path / 'donor_cache' if shared_donor_cache else 'null'}",
+                f"filepath.DONOR_STAGING_DIRECTORY={tmp_path / 'donor_staging' if donor_staging else 'null'}",
+                "batch.INDICES_MAP_VRT_NAME=indices_maps.vrt",
+                "batch.INDICES_MAP_MOSAIC_NAME=indices_maps.tif",
+                "filepath.OUTPUT_REPORT_NAME=report.json",
+            ],
+        )
+    batch_report = patchwork_batch(config)
+
+    assert batch_report["nb_tiles"] == 3
+    assert batch_report["nb_ok"] == 2
+    assert batch_report["nb_errors"] == 1
+    assert batch_report["donor_cache_hits"] == expected_donor_cache_hits
+
+    tile_reports = {os.path.basename(tile_report["recipient"]): tile_report for tile_report in batch_report["tiles"]}
+    assert tile_reports["tile_broken.laz"]["status"] == STATUS_ERROR
+    assert tile_reports["tile_broken.laz"]["error"]
+    for name in ["tile_ok_1.laz", "tile_ok_2.laz"]:
+        assert tile_reports[name]["status"] == STATUS_OK
+        assert tile_reports[name]["added_points"] > 0
+        assert os.path.isfile(output_dir / (os.path.splitext(name)[0] + ".tif"))
+        with open(output_dir / (os.path.splitext(name)[0] + "_report.json"), "r", encoding="utf-8") as run_report_file:
+            assert json.load(run_report_file)["added_points"] == tile_reports[name]["added_points"]
+        with laspy.open(output_dir / name) as output_file:
+            assert output_file.header.point_count == (
+                laspy.read(RECIPIENT_TEST_PATH).header.point_count + tile_reports[name]["added_points"]
+            )
+
+    with open(output_dir / config.batch.REPORT_NAME, "r", encoding="utf-8") as report_file:
+        assert json.load(report_file) == json.loads(json.dumps(batch_report))
+
+    # both valid tiles are copies of the same recipient: the vrt and the mosaic cover this tile only
+    with rs.open(output_dir / "tile_ok_1.tif") as indices_map:
+        tile_bounds = indices_map.bounds
+        tile_grid = indices_map.read(1)
+    for mosaic_name in ["indices_maps.vrt", "indices_maps.tif"]:
+        with rs.open(output_dir / mosaic_name) as mosaic:
+            assert mosaic.bounds == tile_bounds
+            assert np.array_equal(mosaic.read(1), tile_grid)
+
+    if donor_staging:
+        # each copy has a lock file (cf. DonorStaging)
+        staged_names = [name for name in os.listdir(tmp_path / "donor_staging") if not name.endswith(".lock")]
+        assert len(staged_names) == 1
+        assert staged_names[0].endswith("_donor_0843_6447.las")
+
+
+def test_patchwork_batch_dry_run(tmp_path):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.3, nb_donors=1, patch_size=1
+    )
+    output_dir = tmp_path / "output"
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = get_synthetic_dataset_config(
+            compose(
+                config_name="configs_patchwork.yaml",
+                overrides=[
+                    f"batch.RECIPIENTS={dataset['recipient_directory']}",
+                    "batch.PIPELINE=true",
+                    "batch.INDICES_MAP_VRT_NAME=indices_maps.vrt",
+                    "DRY_RUN=true",
+                ],
+            ),
+            dataset,
+            str(output_dir),
+        )
+
+    batch_report = patchwork_batch(config)
+
+    assert batch_report["nb_ok"] == 1
+    fill_estimate = batch_report["tiles"][0]["fill_estimate"]
+    assert fill_estimate["added_points"] == batch_report["added_points"] > 0
+    assert batch_report["fill_estimate"] == {key: fill_estimate[key] for key in batch_report["fill_estimate"]}
+    # only the batch report is written
+    assert os.listdir(output_dir) == [config.batch.REPORT_NAME]
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_patchwork_batch_manifest(tmp_path, pipeline):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.3, nb_donors=2, patch_size=1
+    )
+    output_dir = tmp_path / "output"
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = get_synthetic_dataset_config(
+            compose(
+                config_name="configs_patchwork.yaml",
+                overrides=[
+                    f"batch.RECIPIENTS={dataset['recipient_directory']}",
+                    f"batch.PIPELINE={pipeline}",
+                    "batch.MANIFEST_NAME=manifest.jsonl",
+                    "batch.INDICES_MAP_VRT_NAME=indices_maps.vrt",
+                ],
+            ),
+            dataset,
+            str(output_dir),
+        )
+    output_path = output_dir / dataset["recipient_name"]
+
+    batch_report = patchwork_batch(config)
+    assert batch_report["nb_ok"] == 1
+    added_points = batch_report["added_points"]
+    assert added_points > 0
+    output_mtime = os.path.getmtime(output_path)
+    # no temporary file is left
+    assert sorted(os.listdir(output_dir)) == sorted(
+        [
+            config.batch.REPORT_NAME,
+            "manifest.jsonl",
+            "indices_maps.vrt",
+            dataset["recipient_name"],
+            "recipient_0843_6447.tif",
+        ]
+    )
+
+    # same inputs: the tile is skipped, and still in the VRT
+    batch_report = patchwork_batch(config)
+    assert batch_report["nb_ok"] == 0
+    assert batch_report["nb_skipped"] == 1
+    assert batch_report["added_points"] == added_points
+    assert os.path.getmtime(output_path) == output_mtime
+    assert "recipient_0843_6447.tif" in (output_dir / "indices_maps.vrt").read_text()
+
+    # a donor changed: the tile is processed again
+    donor_mtime = os.path.getmtime(dataset["donor_paths"][1])
+    os.utime(dataset["donor_paths"][1], (donor_mtime + 10, donor_mtime + 10))
+    batch_report = patchwork_batch(config)
+    assert batch_report["nb_ok"] == 1
+    assert batch_report["nb_skipped"] == 0
+    assert batch_report["added_points"] == added_points
+
+    # a configuration key that changes the outputs
+    config.VALUE_ADDED_POINTS = 2
+    assert patchwork_batch(config)["nb_ok"] == 1
+
+    # missing output
+    os.remove(output_path)
+    assert patchwork_batch(config)["nb_ok"] == 1
+    assert patchwork_batch(config)["nb_skipped"] == 1
+
+    # one line per tile once the manifest is loaded again
+    with open(output_dir / "manifest.jsonl", "r", encoding="utf-8") as manifest_file:
+        assert len(manifest_file.readlines()) == 1
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_patchwork_batch_manifest_mosaic_error(tmp_path, monkeypatch, pipeline):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.3, nb_donors=1, patch_size=1
+    )
+    output_dir = tmp_path / "output"
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = get_synthetic_dataset_config(
+            compose(
+                config_name="configs_patchwork.yaml",
+                overrides=[
+                    f"batch.RECIPIENTS={dataset['recipient_directory']}",
+                    f"batch.PIPELINE={pipeline}",
+                    "batch.MANIFEST_NAME=manifest.jsonl",
+                    "batch.INDICES_MAP_MOSAIC_NAME=indices_maps.tif",
+                ],
+            ),
+            dataset,
+            str(output_dir),
+        )
+
+    def add_tile(self, indices_map_path):
+        raise RuntimeError("mosaic error")
+
+    monkeypatch.setattr(IndicesMapMosaic, "add_tile", add_tile)
+    batch_report = patchwork_batch(config)
+
+    assert batch_report["nb_errors"] == 1
+    assert "mosaic error" in batch_report["tiles"][0]["error"]
+    # the failed tile is recorded once in the manifest
+    with open(output_dir / "manifest.jsonl", "r", encoding="utf-8") as manifest_file:
+        entries = [json.loads(line) for line in manifest_file]
+    assert [entry["status"] for entry in entries] == [STATUS_ERROR]
+
+
+def test_patchwork_batch_error_removes_tmp_mosaic(tmp_path, monkeypatch):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.3, nb_donors=1, patch_size=1
+    )
+    output_dir = tmp_path / "output"
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = get_synthetic_dataset_config(
+            compose(
+                config_name="configs_patchwork.yaml",
+                overrides=[
+                    f"batch.RECIPIENTS={dataset['recipient_directory']}",
+                    "batch.INDICES_MAP_MOSAIC_NAME=indices_maps.tif",
+                ],
+            ),
+            dataset,
+            str(output_dir),
+        )
+
+    def process_tile(*args, **kwargs):
+        raise KeyboardInterrupt()
+
+    # an error that stops the batch (not caught per tile)
+    monkeypatch.setattr("patchwork.batch.process_tile", process_tile)
+    with pytest.raises(KeyboardInterrupt):
+        patchwork_batch(config)
+
+    assert not [name for name in os.listdir(output_dir) if name.startswith("indices_maps")]
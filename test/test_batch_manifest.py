@@ -0,0 +1,88 @@
+import json
+import os
+
+from hydra import compose, initialize
+
+from patchwork.batch_manifest import (
+    BatchManifest,
+    get_config_hash,
+    get_file_fingerprint,
+    get_inputs_fingerprint,
+    get_shapefile_hash,
+    get_tile_inputs,
+)
+
+
+def get_tile_report(recipient_path, status="ok", added_points=10):
+    return {"recipient": recipient_path, "status": status, "added_points": added_points, "duration": 1, "error": None}
+
+
+def test_get_file_fingerprint(tmp_path):
+    file_path = tmp_path / "file.laz"
+    assert get_file_fingerprint(str(file_path)) is None
+
+    file_path.write_bytes(b"abc")
+    fingerprint = get_file_fingerprint(str(file_path))
+    assert fingerprint[0] == 3
+    os.utime(file_path, ns=(fingerprint[1] + 1000, fingerprint[1] + 1000))
+    assert get_file_fingerprint(str(file_path)) == [3, fingerprint[1] + 1000]
+
+
+def test_get_shapefile_hash(tmp_path):
+    for extension in [".shp", ".dbf"]:
+        (tmp_path / f"donors{extension}").write_bytes(b"content")
+    shapefile_hash = get_shapefile_hash(str(tmp_path / "donors.shp"))
+
+    # only the content is used, not the modification time
+    os.utime(tmp_path / "donors.shp", (0, 0))
+    assert get_shapefile_hash(str(tmp_path / "donors.shp")) == shapefile_hash
+    # a change in a component file
+    (tmp_path / "donors.dbf").write_bytes(b"other content")
+    assert get_shapefile_hash(str(tmp_path / "donors.shp")) != shapefile_hash
+
+
+def test_get_config_hash():
+    with initialize(version_base="1.2", config_path="../configs"):
+        config_hash = get_config_hash(compose(config_name="configs_patchwork.yaml"))
+        overridden_hashes = {
+            override: get_config_hash(compose(config_name="configs_patchwork.yaml", overrides=[override]))
+            for override in ["batch.WORKERS=4", "CHUNK_SIZE=10", "PATCH_SIZE=2", "indices_map.DONOR_IDS=true"]
+        }
+
+    # keys that do not change the outputs
+    assert overridden_hashes["batch.WORKERS=4"] == config_hash
+    assert overridden_hashes["CHUNK_SIZE=10"] == config_hash
+    # keys that change the outputs (including keys of nested sections)
+    assert overridden_hashes["PATCH_SIZE=2"] != config_hash
+    assert overridden_hashes["indices_map.DONOR_IDS=true"] != config_hash
+
+
+def test_batch_manifest(tmp_path):
+    recipient_path = tmp_path / "recipient.laz"
+    recipient_path.write_bytes(b"points")
+    output_path = tmp_path / "output.laz"
+    output_path.write_bytes(b"points")
+    manifest_path = str(tmp_path / "manifest.jsonl")
+    inputs = get_tile_inputs(str(recipient_path), [], "shapefile_hash", "config_hash")
+    fingerprint = get_inputs_fingerprint(inputs)
+
+    manifest = BatchManifest(manifest_path)
+    assert not manifest.is_up_to_date(str(recipient_path), fingerprint, [str(output_path)])
+    manifest.record(get_tile_report(str(recipient_path), "error", None), inputs)
+    assert not manifest.is_up_to_date(str(recipient_path), fingerprint, [str(output_path)])
+    manifest.record(get_tile_report(str(recipient_path)), inputs)
+    assert manifest.is_up_to_date(str(recipient_path), fingerprint, [str(output_path)])
+    assert not manifest.is_up_to_date(str(recipient_path), "other_fingerprint", [str(output_path)])
+    assert not manifest.is_up_to_date(str(recipient_path), fingerprint, [str(tmp_path / "missing.laz")])
+
+    # a line partially written by a run that stopped is ignored, and the older entries are removed when the
+    # manifest is loaded again
+    with open(manifest_path, "a", encoding="utf-8") as manifest_file:
+        manifest_file.write('{"recipient": "other.la')
+    manifest = BatchManifest(manifest_path)
+    assert manifest.is_up_to_date(str(recipient_path), fingerprint, [str(output_path)])
+    assert manifest.entries[str(recipient_path)]["added_points"] == 10
+    with open(manifest_path, "r", encoding="utf-8") as manifest_file:
+        entries = [json.loads(line) for line in manifest_file]
+    assert len(entries) == 1
+    assert entries[0]["inputs"] == json.loads(json.dumps(inputs))
@@ -0,0 +1,89 @@
+import json
+
+import numpy as np
+from hydra import compose, initialize
+
+from patchwork.benchmark import (
+    BENCHMARKS,
+    compare_benchmarks,
+    patchwork_benchmark,
+    reset_peak_rss,
+    run_benchmark,
+)
+
+
+def test_patchwork_benchmark(tmp_path):
+    output_path = tmp_path / "benchmark.json"
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=[
+                "TILE_SIZE=50",
+                f"benchmark.WORK_DIRECTORY={tmp_path / 'work'}",
+                f"benchmark.OUTPUT_PATH={output_path}",
+                "benchmark.DENSITIES=[2]",
+                "benchmark.DONOR_COUNTS=[1, 2]",
+                "benchmark.REPEAT=2",
+            ],
+        )
+
+    benchmark_report = patchwork_benchmark(config)
+
+    assert len(benchmark_report["results"]) == 2 * len(BENCHMARKS)
+    for result in benchmark_report["results"]:
+        assert result["benchmark"] in BENCHMARKS
+        assert len(result["wall_times"]) == 2
+        assert result["points"] > 0
+        assert result["points_per_second"] > 0
+        assert result["process_peak_rss"] >= result["initial_rss"] > 0
+        if result["run_peak_rss"] is not None:
+            assert result["setup_rss"] <= result["run_peak_rss"] <= result["process_peak_rss"]
+            assert result["run_peak_rss_delta"] == result["run_peak_rss"] - result["setup_rss"]
+    with open(output_path, "r", encoding="utf-8") as output_file:
+        assert json.load(output_file) == json.loads(json.dumps(benchmark_report))
+
+    # compare with a previous run
+    config.benchmark.REFERENCE_PATH = str(output_path)
+    config.benchmark.OUTPUT_PATH = str(tmp_path / "benchmark_2.json")
+    config.benchmark.BENCHMARKS = ["patchwork"]
+    benchmark_report = patchwork_benchmark(config)
+    assert [comparison["benchmark"] for comparison in benchmark_report["comparison"]] == ["patchwork", "patchwork"]
+
+
+def test_run_benchmark_memory_excludes_setup(monkeypatch):
+    if not reset_peak_rss():
+        return  # the peak resident memory cannot be reset on this platform
+
+    def setup_large_allocation(config, dataset):
+        np.ones(50_000_000).sum()  # 400 MB, freed at the end of the setup
+
+        def run():
+            return np.ones(1000).sum()
+
+        return run, 1000
+
+    monkeypatch.setitem(BENCHMARKS, "large_setup", setup_large_allocation)
+    result = run_benchmark("large_setup", None, {}, 2)
+
+    assert result["process_peak_rss"] - result["setup_rss"] > 300 * 1024 * 1024
+    assert result["run_peak_rss_delta"] < 100 * 1024 * 1024
+
+
+def test_compare_benchmarks():
+    reference_results = [
+        {"benchmark": "patchwork", "parameters": {"density": 1}, "wall_time": 2.0},
+        {"benchmark": "patchwork", "parameters": {"density": 2}, "wall_time": 4.0},
+    ]
+    results = [
+        {"benchmark": "patchwork", "parameters": {"density": 1}, "wall_time": 1.0},
+        {"benchmark": "append_points", "parameters": {"density": 1}, "wall_time": 1.0},
+    ]
+    assert compare_benchmarks(reference_results, results) == [
+        {
+            "benchmark": "patchwork",
+            "parameters": {"density": 1},
+            "reference_wall_time": 2.0,
+            "wall_time": 1.0,
+            "ratio": 0.5,
+        }
+    ]
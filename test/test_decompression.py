@@ -0,0 +1,20 @@
+from laspy import DecompressionSelection
+
+from patchwork.decompression import get_decompression_selection
+
+
+def test_get_decompression_selection():
+    assert get_decompression_selection([]) == DecompressionSelection.base()
+    assert get_decompression_selection(["x", "y", "classification"]) == (
+        DecompressionSelection.XY_RETURNS_CHANNEL | DecompressionSelection.CLASSIFICATION
+    )
+    assert get_decompression_selection(["synthetic", "red", "blue", "gps_time"]) == (
+        DecompressionSelection.XY_RETURNS_CHANNEL
+        | DecompressionSelection.FLAGS
+        | DecompressionSelection.RGB
+        | DecompressionSelection.GPS_TIME
+    )
+    # dimensions that are not standard ones are extra bytes
+    assert get_decompression_selection(["f1"]) == (
+        DecompressionSelection.XY_RETURNS_CHANNEL | DecompressionSelection.ALL_EXTRA_BYTES
+    )
@@ -0,0 +1,98 @@
+import os
+
+import laspy
+import numpy as np
+from hydra import compose, initialize
+from shapely.geometry import box
+
+from patchwork.donor_cache import DonorCache, SharedDonorCache
+from patchwork.patchwork import get_donor_points
+
+DONOR_TEST_PATH = "test/data/donor_test.las"
+
+
+def get_points(nb_points: int) -> laspy.ScaleAwarePointRecord:
+    return laspy.ScaleAwarePointRecord.zeros(nb_points, header=laspy.LasHeader(point_format=6, version="1.4"))
+
+
+def test_donor_cache_lru_eviction():
+    record_size = get_points(10).array.nbytes
+    donor_cache = DonorCache(max_size=2 * record_size)
+
+    donor_cache.put("a", get_points(10))
+    donor_cache.put("b", get_points(10))
+    assert donor_cache.get("a") is not None  # "a" becomes the most recently used
+    donor_cache.put("c", get_points(10))  # "b" is evicted
+
+    assert donor_cache.get("b") is None
+    assert donor_cache.get("a") is not None
+    assert donor_cache.get("c") is not None
+    assert donor_cache.get_stats() == {"hits": 3, "misses": 1, "records": 2, "size": 2 * record_size}
+
+
+def test_donor_cache_too_big_points_not_stored():
+    donor_cache = DonorCache(max_size=get_points(10).array.nbytes)
+    donor_cache.put("a", get_points(11))
+    assert donor_cache.get("a") is None
+    assert donor_cache.size == 0
+
+
+def test_get_donor_points_with_cache():
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=["DONOR_CLASS_LIST=[2, 9]", "DONOR_USE_SYNTHETIC_POINTS=true"],
+        )
+    tile_origin = (843000, 6447000)
+    footprint = box(843400, 6446400, 843600, 6446600)
+    columns = ["x", "y", "z", "intensity"]
+    donor_cache = DonorCache(max_size=100 * 1024 * 1024)
+
+    df_expected = get_donor_points(DONOR_TEST_PATH, footprint, columns, tile_origin, config)
+    df_first = get_donor_points(DONOR_TEST_PATH, footprint, columns, tile_origin, config, donor_cache)
+    df_second = get_donor_points(DONOR_TEST_PATH, footprint, columns, tile_origin, config, donor_cache)
+
+    assert len(df_expected.index) > 0
+    assert df_first.equals(df_expected)
+    assert df_second.equals(df_expected)
+    assert (donor_cache.hits, donor_cache.misses) == (1, 1)
+
+    # another footprint is another entry of the cache
+    get_donor_points(DONOR_TEST_PATH, box(843400, 6446400, 843500, 6446500), columns, tile_origin, config, donor_cache)
+    assert (donor_cache.hits, donor_cache.misses) == (1, 2)
+    assert np.all(df_expected["x"] >= 843400)
+
+
+def test_shared_donor_cache(tmp_path):
+    points = laspy.read(DONOR_TEST_PATH).points
+    donor_cache = SharedDonorCache(str(tmp_path), max_size=100 * 1024 * 1024)
+    assert donor_cache.get("a") is None
+
+    donor_cache.put("a", points)
+    # records are visible by other processes using the same directory
+    other_donor_cache = SharedDonorCache(str(tmp_path), max_size=100 * 1024 * 1024)
+    cached_points = other_donor_cache.get("a")
+
+    assert isinstance(cached_points.array, np.memmap)
+    assert cached_points.point_format == points.point_format
+    assert np.array_equal(cached_points.array, points.array)
+    assert np.array_equal(cached_points.x, points.x)
+    assert other_donor_cache.get_stats() == {"hits": 1, "misses": 0, "records": 1, "size": donor_cache.size}
+
+
+def test_shared_donor_cache_lru_eviction(tmp_path):
+    points = get_points(10)
+    donor_cache = SharedDonorCache(str(tmp_path), max_size=100 * 1024 * 1024)
+    donor_cache.put("a", points)
+    donor_cache.max_size = 2 * donor_cache.get_stats()["size"]  # size of a record, with the .npy header
+
+    donor_cache.put("b", points)
+    # make sure "a" is more recent than "b"
+    os.utime(donor_cache._get_record_path("b") + ".npy", (0, 0))
+    assert donor_cache.get("a") is not None
+    donor_cache.put("c", points)  # "b" is evicted
+
+    assert donor_cache.get("b") is None
+    assert donor_cache.get("a") is not None
+    assert donor_cache.get("c") is not None
+    assert donor_cache.get_stats()["records"] == 2
@@ -0,0 +1,103 @@
+import os
+import shutil
+
+import pytest
+
+from patchwork.donor_catalog import DonorCatalog, get_coordinates_from_filename
+from patchwork.patchwork import get_common_las_columns
+
+DONOR_TEST_PATH = "test/data/donor_test.las"
+DONOR_MORE_FIELDS_TEST_PATH = "test/data/donor_more_fields_test.las"
+
+
+def test_get_coordinates_from_filename():
+    assert get_coordinates_from_filename("NUALID_1-0_IAVEY_PTS_0673_6363_LAMB93_IGN69_20170519.laz") == [
+        (673, 6363),
+        (69, 20170519),
+    ]
+    assert get_coordinates_from_filename("0963_6543.laz") == [(963, 6543)]
+    assert get_coordinates_from_filename("0963_6543_2021.laz") == [(963, 6543), (6543, 2021)]
+    assert get_coordinates_from_filename("no_coordinates.laz") == []
+
+
+@pytest.fixture
+def donor_directory(tmp_path):
+    os.makedirs(tmp_path / "donors")
+    for filename in ["PTS_0673_6362_LAMB93.laz", "PTS_0673_6363_LAMB93.las", "PTS_0673_6363_LAMB93.txt"]:
+        (tmp_path / "donors" / filename).touch()
+    return str(tmp_path / "donors")
+
+
+def test_find_donor_file(donor_directory):
+    donor_catalog = DonorCatalog()
+    assert donor_catalog.find_donor_file(donor_directory, "0673", "6362") == os.path.join(
+        donor_directory, "PTS_0673_6362_LAMB93.laz"
+    )
+    assert donor_catalog.find_donor_file(donor_directory, 673, 6363) == os.path.join(
+        donor_directory, "PTS_0673_6363_LAMB93.las"
+    )
+
+
+def test_find_donor_file_errors(donor_directory):
+    donor_catalog = DonorCatalog()
+    with pytest.raises(FileNotFoundError, match="Directory"):
+        donor_catalog.find_donor_file(os.path.join(donor_directory, "not_a_directory"), 673, 6362)
+    with pytest.raises(FileNotFoundError, match="Could not match any file"):
+        donor_catalog.find_donor_file(donor_directory, 673, 6364)
+
+    open(os.path.join(donor_directory, "0673_6362.laz"), "w").close()
+    donor_catalog = DonorCatalog()
+    with pytest.raises(RuntimeError, match="Found multiple files"):
+        donor_catalog.find_donor_file(donor_directory, 673, 6362)
+
+
+def test_directory_listed_only_when_modified(donor_directory, monkeypatch):
+    donor_catalog = DonorCatalog()
+    scandir_calls = []
+    original_scandir = os.scandir
+
+    def counting_scandir(path):
+        scandir_calls.append(path)
+        return original_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+
+    donor_catalog.find_donor_file(donor_directory, 673, 6362)
+    donor_catalog.find_donor_file(donor_directory, 673, 6363)
+    assert len(scandir_calls) == 1
+
+    # a new file changes the directory modification time: the directory is listed again
+    directory_mtime = os.path.getmtime(donor_directory)
+    open(os.path.join(donor_directory, "PTS_0673_6364_LAMB93.laz"), "w").close()
+    os.utime(donor_directory, (directory_mtime + 10, directory_mtime + 10))
+    assert donor_catalog.find_donor_file(donor_directory, 673, 6364).endswith("PTS_0673_6364_LAMB93.laz")
+    assert len(scandir_calls) == 2
+
+
+def test_donor_catalog_save_and_load(tmp_path, donor_directory):
+    catalog_path = str(tmp_path / "catalog" / "donor_catalog.json")
+    donor_path = str(tmp_path / "donor_0843_6447.las")
+    shutil.copy(DONOR_TEST_PATH, donor_path)
+
+    donor_catalog = DonorCatalog(catalog_path)
+    donor_catalog.find_donor_file(donor_directory, 673, 6362)
+    header_info = donor_catalog.get_header_info(donor_path)
+    assert header_info["point_count"] == 1606
+    assert "classification" in header_info["dimensions"]
+    donor_catalog.save()
+
+    loaded_catalog = DonorCatalog(catalog_path)
+    assert loaded_catalog.directories == donor_catalog.directories
+    assert loaded_catalog.get_header_info(donor_path) == header_info
+    assert loaded_catalog.find_donor_file(donor_directory, 673, 6362).endswith("PTS_0673_6362_LAMB93.laz")
+    assert not loaded_catalog._is_modified  # nothing was read again
+
+    # the header is read again if the file changes
+    shutil.copy(DONOR_MORE_FIELDS_TEST_PATH, donor_path)
+    os.utime(donor_path, (header_info["mtime"] + 10, header_info["mtime"] + 10))
+    assert "f3" in loaded_catalog.get_header_info(donor_path)["dimensions"]
+
+
+def test_get_common_las_columns_from_catalog():
+    las_files = [DONOR_TEST_PATH, DONOR_MORE_FIELDS_TEST_PATH]
+    assert set(get_common_las_columns(las_files, DonorCatalog())) == set(get_common_las_columns(las_files))
@@ -0,0 +1,69 @@
+import os
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+from patchwork.donor_index import DonorIndex, read_donor_shapefile
+
+INPUT_SHP_PATH = "test/data/shapefile_local/patchwork_geometries.shp"
+
+
+@pytest.mark.parametrize(
+    "x, y",
+    [
+        (673, 6362),  # one donor
+        (673, 6363),  # two donors
+        (673, 6365),  # no donor
+        (673.5, 6362),  # not on the grid of the shapefile attributes
+    ],
+)
+def test_donor_index_query_same_as_filter(x, y):
+    gdf = gpd.GeoDataFrame.from_file(INPUT_SHP_PATH, encoding="utf-8")
+    expected_gdf = gdf[(gdf["x"].astype(int) == x) & (gdf["y"].astype(int) == y)]
+
+    result_gdf = DonorIndex(gdf).query(x, y)
+    assert list(result_gdf["nuage_mixa"]) == list(expected_gdf["nuage_mixa"])
+    assert list(result_gdf["y"]) == list(expected_gdf["y"])
+
+
+def test_donor_index_query_bounds():
+    gdf = gpd.GeoDataFrame(
+        data={"x": ["0001", "0002", "0001"], "y": ["0001", "0001", "0001"], "name": ["a", "b", "c"]},
+        geometry=[box(1000, 0, 2000, 1000), box(2000, 0, 3000, 1000), box(1500, 500, 1600, 600)],
+    )
+    donor_index = DonorIndex(gdf)
+
+    # geometry b only touches the tile: it is not returned
+    assert list(donor_index.query_bounds((1000, 0, 2000, 1000))["name"]) == ["a", "c"]
+    # tile origin not aligned with the x, y attributes
+    assert list(donor_index.query_bounds((1800, 0, 2800, 1000))["name"]) == ["a", "b"]
+    assert donor_index.query_bounds((5000, 0, 6000, 1000)).empty
+
+
+def test_read_donor_shapefile_with_cache(tmp_path):
+    shapefile_path = str(tmp_path / "donors.shp")
+    cache_directory = str(tmp_path / "cache")
+    cache_path = os.path.join(cache_directory, "donors.fgb")
+    gdf = gpd.GeoDataFrame(
+        data={"x": ["0002", "0001"], "y": ["0001", "0001"]},
+        geometry=[box(2000, 0, 3000, 1000), box(1000, 0, 2000, 1000)],
+        crs=2154,
+    )
+    gdf.to_file(shapefile_path)
+
+    # first read: the cache is created, and keeps the shapefile order
+    assert list(read_donor_shapefile(shapefile_path, cache_directory)["x"]) == ["0002", "0001"]
+    assert os.path.isfile(cache_path)
+    assert list(read_donor_shapefile(cache_path)["x"]) == ["0002", "0001"]
+
+    # cache is used as long as it is more recent than the shapefile
+    cache_mtime = os.path.getmtime(cache_path)
+    assert list(read_donor_shapefile(shapefile_path, cache_directory)["x"]) == ["0002", "0001"]
+    assert os.path.getmtime(cache_path) == cache_mtime
+
+    # cache is updated when the shapefile changes
+    gdf.iloc[:1].to_file(shapefile_path)
+    os.utime(cache_path, (cache_mtime - 10, cache_mtime - 10))
+    assert list(read_donor_shapefile(shapefile_path, cache_directory)["x"]) == ["0002"]
+    assert len(read_donor_shapefile(cache_path).index) == 1
@@ -0,0 +1,228 @@
+import fcntl
+import os
+import pickle
+import shutil
+import threading
+
+import pytest
+from hydra import compose, initialize
+
+from patchwork.donor_staging import DonorStaging, get_donor_staging
+
+
+def make_remote_files(directory, names, size=1000):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name in names:
+        path = os.path.join(directory, name)
+        with open(path, "wb") as remote_file:
+            remote_file.write(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+def test_stage_copies_once(tmp_path, monkeypatch):
+    (remote_path,) = make_remote_files(tmp_path / "remote", ["donor_0843_6447.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 10000)
+
+    copies = []
+    original_copyfile = shutil.copyfile
+
+    def counting_copyfile(src, dst):
+        copies.append(src)
+        return original_copyfile(src, dst)
+
+    monkeypatch.setattr(shutil, "copyfile", counting_copyfile)
+
+    staged_path = donor_staging.get_local_path(remote_path)
+    assert os.path.dirname(staged_path) == str(tmp_path / "staging")
+    assert staged_path.endswith("_donor_0843_6447.las")
+    with open(remote_path, "rb") as remote_file, open(staged_path, "rb") as staged_file:
+        assert remote_file.read() == staged_file.read()
+    assert os.stat(staged_path).st_mtime_ns == os.stat(remote_path).st_mtime_ns
+
+    assert donor_staging.get_local_path(remote_path) == staged_path
+    assert len(copies) == 1
+
+    # the remote file changed: it is copied again
+    make_remote_files(tmp_path / "remote", ["donor_0843_6447.las"], size=2000)
+    remote_mtime = os.path.getmtime(remote_path)
+    os.utime(remote_path, (remote_mtime + 10, remote_mtime + 10))
+    assert donor_staging.get_local_path(remote_path) == staged_path
+    assert len(copies) == 2
+    assert os.path.getsize(staged_path) == 2000
+
+
+def test_same_name_in_different_directories(tmp_path):
+    (remote_path_1,) = make_remote_files(tmp_path / "remote_1", ["donor.las"])
+    (remote_path_2,) = make_remote_files(tmp_path / "remote_2", ["donor.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 10000)
+
+    assert donor_staging.get_local_path(remote_path_1) != donor_staging.get_local_path(remote_path_2)
+
+
+def test_eviction(tmp_path):
+    remote_paths = make_remote_files(tmp_path / "remote", ["a.las", "b.las", "c.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 2500)
+
+    staged_path_a = donor_staging.get_local_path(remote_paths[0])
+    staged_path_b = donor_staging.get_local_path(remote_paths[1])
+    # use "a" again, so that "b" is the least recently used copy
+    os.utime(staged_path_b, ns=(1, os.stat(staged_path_b).st_mtime_ns))
+    donor_staging.get_local_path(remote_paths[0])
+    staged_path_c = donor_staging.get_local_path(remote_paths[2])
+
+    assert os.path.isfile(staged_path_a)
+    assert not os.path.isfile(staged_path_b)
+    assert os.path.isfile(staged_path_c)
+
+
+def test_file_bigger_than_staging_is_kept_until_next_copy(tmp_path):
+    remote_paths = make_remote_files(tmp_path / "remote", ["a.las", "b.las"], size=3000)
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 2500)
+
+    staged_path_a = donor_staging.get_local_path(remote_paths[0])
+    assert os.path.isfile(staged_path_a)
+    staged_path_b = donor_staging.get_local_path(remote_paths[1])
+    assert not os.path.isfile(staged_path_a)
+    assert os.path.isfile(staged_path_b)
+
+
+def test_local_copy_is_not_evicted(tmp_path):
+    remote_paths = make_remote_files(tmp_path / "remote", ["a.las", "b.las", "c.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 1500)
+
+    with donor_staging.local_copy(remote_paths[0]) as staged_path_a:
+        # the copy of the next donors would evict "a" while it is read
+        donor_staging.prefetch(remote_paths[1:2])
+        donor_staging.close()
+        assert os.path.isfile(staged_path_a)
+        with open(staged_path_a, "rb") as staged_file, open(remote_paths[0], "rb") as remote_file:
+            assert staged_file.read() == remote_file.read()
+
+    # released: "a" can be evicted
+    donor_staging.get_local_path(remote_paths[2])
+    assert not os.path.isfile(staged_path_a)
+
+
+def test_local_copy_is_copied_again_if_evicted(tmp_path):
+    (remote_path,) = make_remote_files(tmp_path / "remote", ["a.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 10000)
+    staged_path = donor_staging.get_local_path(remote_path)
+    os.remove(staged_path)  # evicted between get_local_path and the read
+
+    with donor_staging.local_copy(remote_path) as local_path:
+        assert local_path == staged_path
+        assert os.path.isfile(local_path)
+
+
+def test_copy_in_use_by_another_process_is_not_evicted(tmp_path):
+    remote_paths = make_remote_files(tmp_path / "remote", ["a.las", "b.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 1500)
+    staged_path_a = donor_staging.get_local_path(remote_paths[0])
+
+    # shared lock of another process reading "a" (flock locks are held by each open file, as between processes)
+    with open(f"{staged_path_a}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        donor_staging.get_local_path(remote_paths[1])
+        assert os.path.isfile(staged_path_a)
+
+
+def test_copy_in_progress_in_another_process_is_waited_for(tmp_path, monkeypatch):
+    (remote_path,) = make_remote_files(tmp_path / "remote", ["a.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 10000)
+    staged_path = donor_staging.get_staged_path(remote_path)
+
+    copies = []
+    original_copyfile = shutil.copyfile
+
+    def counting_copyfile(src, dst):
+        copies.append(src)
+        return original_copyfile(src, dst)
+
+    monkeypatch.setattr(shutil, "copyfile", counting_copyfile)
+
+    # another process holds the exclusive lock while copying the file
+    lock_file = open(f"{staged_path}.lock", "a")
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+    def finish_other_copy():
+        original_copyfile(remote_path, staged_path)
+        os.utime(staged_path, ns=(os.stat(remote_path).st_mtime_ns, os.stat(remote_path).st_mtime_ns))
+        lock_file.close()
+
+    threading.Timer(0.2, finish_other_copy).start()
+    assert donor_staging.get_local_path(remote_path) == staged_path
+    assert not copies
+
+
+def test_prefetch_on_slow_storage(tmp_path, monkeypatch):
+    remote_paths = make_remote_files(tmp_path / "remote", ["a.las", "b.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 10000)
+
+    # slow storage: copies are blocked until the test releases them
+    release_copies = threading.Event()
+    copies = []
+    original_copyfile = shutil.copyfile
+
+    def slow_copyfile(src, dst):
+        copies.append(src)
+        release_copies.wait(timeout=10)
+        return original_copyfile(src, dst)
+
+    monkeypatch.setattr(shutil, "copyfile", slow_copyfile)
+
+    donor_staging.prefetch(remote_paths)
+    donor_staging.prefetch(remote_paths)  # already in progress: not copied again
+    assert set(donor_staging._prefetches) == set(remote_paths)
+
+    # get_local_path waits for the copy in progress instead of starting a new one
+    threading.Timer(0.2, release_copies.set).start()
+    staged_path = donor_staging.get_local_path(remote_paths[0])
+    assert os.path.isfile(staged_path)
+    donor_staging.close()
+
+    assert sorted(copies) == sorted(remote_paths)
+    assert not donor_staging._prefetches
+    assert not [name for name in os.listdir(tmp_path / "staging") if name.endswith(".tmp")]
+    assert sorted(name for name in os.listdir(tmp_path / "staging") if name.endswith(".lock")) == sorted(
+        f"{os.path.basename(donor_staging.get_staged_path(remote_path))}.lock" for remote_path in remote_paths
+    )
+
+
+def test_failed_prefetch_raises_in_get_local_path(tmp_path):
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 10000)
+    missing_path = str(tmp_path / "remote" / "missing.las")
+    donor_staging.prefetch([missing_path])
+    donor_staging.close()
+
+    with pytest.raises(FileNotFoundError):
+        donor_staging.get_local_path(missing_path)
+
+
+def test_pickle(tmp_path):
+    remote_paths = make_remote_files(tmp_path / "remote", ["a.las"])
+    donor_staging = DonorStaging(str(tmp_path / "staging"), 10000)
+    donor_staging.prefetch(remote_paths)
+
+    unpickled_staging = pickle.loads(pickle.dumps(donor_staging))
+    donor_staging.close()
+    assert unpickled_staging.directory == donor_staging.directory
+    assert unpickled_staging.max_size == donor_staging.max_size
+    assert not unpickled_staging._prefetches
+    assert os.path.isfile(unpickled_staging.get_local_path(remote_paths[0]))
+
+
+def test_get_donor_staging(tmp_path):
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(config_name="configs_patchwork.yaml")
+        assert get_donor_staging(config) is None
+
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=[f"filepath.DONOR_STAGING_DIRECTORY={tmp_path / 'staging'}", "DONOR_STAGING_SIZE=1"],
+        )
+        donor_staging = get_donor_staging(config)
+    assert donor_staging.directory == str(tmp_path / "staging")
+    assert donor_staging.max_size == 1024 * 1024
+    assert os.path.isdir(tmp_path / "staging")
@@ -0,0 +1,93 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Polygon, box
+
+from patchwork.footprint import (
+    bounds_intersect,
+    get_footprint_grid,
+    get_points_in_footprint_mask,
+)
+from patchwork.occupancy_grid import is_patch_occupied
+
+FOOTPRINT = Polygon([(0, 0), (10, 0), (10, 10), (5, 5), (0, 10)])
+POINTS_X = np.array([1.0, 5.0, 5.0, 10.0, 11.0, 9.0, 0.0])
+POINTS_Y = np.array([1.0, 7.0, 5.0, 10.0, 5.0, 8.0, -0.1])
+
+
+@pytest.mark.parametrize(
+    "bounds_1, bounds_2, expected_result",
+    [
+        ((0, 0, 10, 10), (5, 5, 15, 15), True),
+        ((0, 0, 10, 10), (10, 10, 15, 15), True),  # touching corners
+        ((0, 0, 10, 10), (11, 0, 15, 15), False),
+        ((0, 0, 10, 10), (0, -5, 10, -1), False),
+    ],
+)
+def test_bounds_intersect(bounds_1, bounds_2, expected_result):
+    assert bounds_intersect(bounds_1, bounds_2) == expected_result
+    assert bounds_intersect(bounds_2, bounds_1) == expected_result
+
+
+def test_get_points_in_footprint_mask():
+    mask = get_points_in_footprint_mask(POINTS_X, POINTS_Y, FOOTPRINT)
+    # points on the boundary of the footprint are kept
+    assert list(mask) == [True, False, True, True, False, True, False]
+
+
+def test_get_points_in_footprint_mask_same_as_sjoin():
+    rng = np.random.default_rng(42)
+    x = rng.uniform(-5, 15, 1000)
+    y = rng.uniform(-5, 15, 1000)
+
+    points_gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy(x, y))
+    footprint_gdf = gpd.GeoDataFrame(geometry=[FOOTPRINT])
+    expected_indices = points_gdf.sjoin(footprint_gdf, how="inner", predicate="intersects").index.values
+
+    mask = get_points_in_footprint_mask(x, y, FOOTPRINT)
+    assert set(np.flatnonzero(mask)) == set(expected_indices)
+
+
+def test_get_points_in_footprint_mask_no_point_in_bbox():
+    mask = get_points_in_footprint_mask(np.array([20.0, 30.0]), np.array([20.0, 30.0]), FOOTPRINT)
+    assert not np.any(mask)
+
+
+def test_get_footprint_grid():
+    tile_origin = (0, 10)
+    footprint_grid = get_footprint_grid(box(2, 2, 4, 4), tile_origin, 1, 10)
+    assert footprint_grid.shape == (10, 10)
+    # box covers rows 6-7, columns 2-3, dilated by one patch
+    expected_grid = np.zeros((10, 10), dtype=bool)
+    expected_grid[5:9, 1:5] = True
+    assert np.array_equal(footprint_grid, expected_grid)
+
+
+def test_get_footprint_grid_not_conservative():
+    tile_origin = (0, 10)
+    # the centers of the patches of rows 6-7 and columns 2-3 are in the box
+    footprint_grid = get_footprint_grid(box(1.8, 2.2, 4.2, 3.8), tile_origin, 1, 10, conservative=False)
+    expected_grid = np.zeros((10, 10), dtype=bool)
+    expected_grid[6:8, 2:4] = True
+    assert np.array_equal(footprint_grid, expected_grid)
+
+
+def test_get_footprint_grid_contains_all_points_in_footprint():
+    tile_origin = (0, 10)
+    patch_size = 0.5
+    footprint_grid = get_footprint_grid(FOOTPRINT, tile_origin, patch_size, 10)
+
+    rng = np.random.default_rng(42)
+    x = np.concatenate([rng.uniform(0, 10, 10000), [0, 10, 10, 5]])
+    y = np.concatenate([rng.uniform(0, 10, 10000), [0, 0, 10, 5]])
+    mask = get_points_in_footprint_mask(x, y, FOOTPRINT)
+    patch_x = np.int32(x[mask] / patch_size)
+    patch_y = np.int32(y[mask] / patch_size)
+    patch_x[patch_x == 20] = 19
+    patch_y[patch_y == 20] = 19
+
+    assert np.all(is_patch_occupied(footprint_grid, patch_x, patch_y, tile_origin, patch_size, 10))
+
+
+def test_get_footprint_grid_empty_footprint():
+    assert not np.any(get_footprint_grid(Polygon(), (0, 10), 1, 10))
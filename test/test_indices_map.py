@@ -2,15 +2,16 @@ import os
 
 import numpy as np
 import pandas as pd
+import pytest
 import rasterio as rs
 from hydra import compose, initialize
 from rasterio.transform import from_origin
 
-from patchwork.constants import PATCH_X_STR, PATCH_Y_STR
 from patchwork.indices_map import (
     create_indices_grid,
     create_indices_map,
     read_indices_map,
+    write_indices_map,
 )
 
 PATCH_SIZE = 1
@@ -132,7 +133,67 @@ def test_read_indices_map(tmp_path_factory):
         indices_map.write(grid, 1)
         indices_map.close()
 
-        df_indices = read_indices_map(config)
-        for _, row in df_indices.iterrows():
-            assert (row[PATCH_X_STR], row[PATCH_Y_STR]) in POINTS_IN_GRID
-        assert len(df_indices) == len(POINTS_IN_GRID)
+        indices_grid = read_indices_map(config, (0, 3))
+        assert indices_grid.dtype == bool
+        assert np.array_equal(indices_grid, grid == 1)
+
+        # the map does not match the tile
+        with pytest.raises(ValueError, match="origin"):
+            read_indices_map(config, (0, 4))
+        config.TILE_SIZE = 4
+        with pytest.raises(ValueError, match="size"):
+            read_indices_map(config)
+
+
+def compose_indices_map_config(tmp_path, tile_size, overrides=[]):
+    with initialize(version_base="1.2", config_path="../configs"):
+        return compose(
+            config_name="configs_patchwork.yaml",
+            overrides=[
+                f"PATCH_SIZE={PATCH_SIZE}",
+                f"TILE_SIZE={tile_size}",
+                f"filepath.OUTPUT_INDICES_MAP_DIR={tmp_path}",
+                "filepath.OUTPUT_INDICES_MAP_NAME=indices.tif",
+                *overrides,
+            ],
+        )
+
+
+@pytest.mark.parametrize("compress, nbits", [("DEFLATE", 8), ("LZW", 1), ("null", 8)])
+def test_write_indices_map_binary(tmp_path, compress, nbits):
+    config = compose_indices_map_config(
+        tmp_path, 512, [f"indices_map.COMPRESS={compress}", f"indices_map.NBITS={nbits}", "indices_map.BLOCK_SIZE=256"]
+    )
+    donor_grid = np.zeros((512, 512), dtype=np.uint8)
+    donor_grid[10:20, 30:40] = 1
+    donor_grid[100:110, 300:310] = 2
+    write_indices_map(config, donor_grid, 1000, 2000, ["donor_1.laz", "donor_2.laz"])
+
+    with rs.open(os.path.join(tmp_path, "indices.tif")) as indices_map:
+        assert indices_map.dtypes == ("uint8",)
+        assert indices_map.transform == from_origin(1000, 2000, PATCH_SIZE, PATCH_SIZE)
+        assert indices_map.block_shapes == [(256, 256)]
+        assert indices_map.profile.get("compress") == (compress.lower() if compress != "null" else None)
+        assert indices_map.tags(1, ns="IMAGE_STRUCTURE").get("NBITS") == (str(nbits) if nbits == 1 else None)
+        assert "DONOR_1" not in indices_map.tags()
+        assert np.array_equal(indices_map.read(1), (donor_grid != 0).astype(np.uint8))
+
+
+def test_write_indices_map_donor_ids(tmp_path):
+    config = compose_indices_map_config(tmp_path, 3, ["indices_map.DONOR_IDS=true"])
+    donor_grid = np.array([[0, 0, 1], [0, 2, 0], [1, 1, 2]], dtype=np.uint8)
+    write_indices_map(config, donor_grid, CORNER_X, CORNER_Y, ["donor_1.laz", "donor_2.laz"])
+
+    with rs.open(os.path.join(tmp_path, "indices.tif")) as indices_map:
+        assert indices_map.dtypes == ("uint8",)
+        assert indices_map.tags()["DONOR_1"] == "donor_1.laz"
+        assert indices_map.tags()["DONOR_2"] == "donor_2.laz"
+        assert np.array_equal(indices_map.read(1), donor_grid)
+
+    # more than 255 donors
+    donor_grid = donor_grid.astype(np.uint16)
+    donor_grid[0, 0] = 300
+    write_indices_map(config, donor_grid, CORNER_X, CORNER_Y)
+    with rs.open(os.path.join(tmp_path, "indices.tif")) as indices_map:
+        assert indices_map.dtypes == ("uint16",)
+        assert np.array_equal(indices_map.read(1), donor_grid)
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+import rasterio as rs
+from hydra import compose, initialize
+
+from patchwork.indices_map import write_indices_map
+from patchwork.indices_map_mosaic import (
+    IndicesMapMosaic,
+    get_mosaic_window,
+    get_tiles_bounds,
+    write_indices_map_vrt,
+)
+
+TILE_SIZE = 300
+PATCH_SIZE = 1
+# origins (top left corners) of 3 tiles of a 2x2 block, the bottom right one is missing
+TILE_ORIGINS = [(1000, 2300), (1300, 2300), (1000, 2000)]
+
+
+@pytest.fixture
+def indices_map_config(tmp_path):
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=[
+                f"TILE_SIZE={TILE_SIZE}",
+                f"PATCH_SIZE={PATCH_SIZE}",
+                f"filepath.OUTPUT_INDICES_MAP_DIR={tmp_path}",
+                "indices_map.BLOCK_SIZE=128",
+            ],
+        )
+    return config
+
+
+def write_tile_indices_maps(config, tmp_path):
+    """Write an indices map per tile (the tile of index i is filled with a diagonal of value 1, and its first
+    patch is i + 1 so that tiles can be told apart), and return their paths and grids"""
+    paths, grids = [], []
+    for i, (origin_x, origin_y) in enumerate(TILE_ORIGINS):
+        grid = np.eye(TILE_SIZE, dtype=np.uint8)
+        grid[0, 0] = i + 1
+        config.filepath.OUTPUT_INDICES_MAP_NAME = f"tile_{i}.tif"
+        write_indices_map(config, grid, origin_x, origin_y, donor_paths=[] if config.indices_map.DONOR_IDS else None)
+        paths.append(str(tmp_path / f"tile_{i}.tif"))
+        grids.append(grid)
+
+    return paths, grids
+
+
+def get_expected_mosaic(grids):
+    expected_mosaic = np.zeros((2 * TILE_SIZE, 2 * TILE_SIZE), dtype=np.uint8)
+    expected_mosaic[:TILE_SIZE, :TILE_SIZE] = grids[0]
+    expected_mosaic[:TILE_SIZE, TILE_SIZE:] = grids[1]
+    expected_mosaic[TILE_SIZE:, :TILE_SIZE] = grids[2]
+    return expected_mosaic
+
+
+def test_get_tiles_bounds():
+    assert get_tiles_bounds(TILE_ORIGINS, TILE_SIZE) == (1000, 1700, 1600, 2300)
+
+
+def test_get_mosaic_window():
+    window = get_mosaic_window((1000, 1700, 1600, 2300), (1300, 1700, 1600, 2000), 2)
+    assert (window.col_off, window.row_off, window.width, window.height) == (150, 150, 150, 150)
+
+
+def test_write_indices_map_vrt(tmp_path, indices_map_config):
+    indices_map_config.indices_map.DONOR_IDS = True
+    paths, grids = write_tile_indices_maps(indices_map_config, tmp_path)
+    vrt_path = tmp_path / "vrt" / "indices_maps.vrt"
+    vrt_path.parent.mkdir()
+
+    write_indices_map_vrt(str(vrt_path), paths)
+
+    with rs.open(vrt_path) as vrt:
+        assert vrt.bounds == (1000, 1700, 1600, 2300)
+        assert vrt.res == (PATCH_SIZE, PATCH_SIZE)
+        assert vrt.crs == rs.crs.CRS.from_user_input(indices_map_config.CRS)
+        assert vrt.dtypes[0] == "uint8"
+        assert np.array_equal(vrt.read(1), get_expected_mosaic(grids))
+
+
+def test_indices_map_mosaic(tmp_path, indices_map_config):
+    paths, grids = write_tile_indices_maps(indices_map_config, tmp_path)
+    mosaic_path = tmp_path / "mosaic.tif"
+
+    indices_map_mosaic = IndicesMapMosaic(
+        str(mosaic_path), get_tiles_bounds(TILE_ORIGINS, TILE_SIZE), indices_map_config
+    )
+    for path in reversed(paths):
+        indices_map_mosaic.add_tile(path)
+    indices_map_mosaic.close()
+
+    assert [path.name for path in tmp_path.iterdir() if path.name.startswith("mosaic")] == ["mosaic.tif"]
+    with rs.open(mosaic_path) as mosaic:
+        assert mosaic.bounds == (1000, 1700, 1600, 2300)
+        assert mosaic.tags(ns="IMAGE_STRUCTURE")["LAYOUT"] == "COG"
+        assert mosaic.block_shapes[0] == (128, 128)
+        assert mosaic.overviews(1)
+        # binary indices maps: 1 for all the filled patches
+        assert np.array_equal(mosaic.read(1), get_expected_mosaic(grids) != 0)
+
+
+def test_indices_map_mosaic_outside_tile(tmp_path, indices_map_config):
+    paths, _ = write_tile_indices_maps(indices_map_config, tmp_path)
+    indices_map_mosaic = IndicesMapMosaic(
+        str(tmp_path / "mosaic.tif"), get_tiles_bounds(TILE_ORIGINS[:2], TILE_SIZE), indices_map_config
+    )
+    with pytest.raises(ValueError, match="outside of the mosaic"):
+        indices_map_mosaic.add_tile(paths[2])
+    indices_map_mosaic.close()
+
+
+def test_indices_map_mosaic_abort(tmp_path, indices_map_config):
+    paths, _ = write_tile_indices_maps(indices_map_config, tmp_path)
+    indices_map_mosaic = IndicesMapMosaic(
+        str(tmp_path / "mosaic.tif"), get_tiles_bounds(TILE_ORIGINS, TILE_SIZE), indices_map_config
+    )
+    indices_map_mosaic.add_tile(paths[0])
+    indices_map_mosaic.abort()
+
+    # neither the mosaic nor its temporary file
+    assert not [path.name for path in tmp_path.iterdir() if path.name.startswith("mosaic")]
+    # abort after close
+    indices_map_mosaic.abort()
@@ -0,0 +1,97 @@
+import shutil
+
+import laspy
+import numpy as np
+import pytest
+from hydra import compose, initialize
+from pdaltools.las_info import get_tile_origin_using_header_info
+from shapely.geometry import box
+
+from patchwork.las_memmap import get_memmap_points, iter_memmap_chunks
+from patchwork.patchwork import get_recipient_occupancy_grid, read_donor_points
+
+DONOR_TEST_PATH = "test/data/donor_test.las"
+RECIPIENT_TEST_PATH = "test/data/recipient_test.laz"
+
+
+def get_memmap_points_from_path(las_file_path):
+    with laspy.open(las_file_path) as las_file:
+        return get_memmap_points(las_file_path, las_file.header)
+
+
+def test_get_memmap_points():
+    memmap_points = get_memmap_points_from_path(DONOR_TEST_PATH)
+    points = laspy.read(DONOR_TEST_PATH).points
+
+    assert isinstance(memmap_points.array, np.memmap)
+    assert len(memmap_points) == len(points)
+    for field in ["x", "y", "z", "classification", "synthetic", "intensity"]:
+        assert np.array_equal(memmap_points[field], points[field])
+
+    # selecting points copies them
+    selected_points = memmap_points[np.asarray(memmap_points.classification) == 2]
+    assert not isinstance(selected_points.array, np.memmap)
+
+
+def test_get_memmap_points_not_possible(tmp_path):
+    # compressed file
+    assert get_memmap_points_from_path(RECIPIENT_TEST_PATH) is None
+
+    # truncated file
+    truncated_path = str(tmp_path / "truncated.las")
+    shutil.copy(DONOR_TEST_PATH, truncated_path)
+    with open(truncated_path, "r+b") as truncated_file:
+        truncated_file.truncate(2000)
+    assert get_memmap_points_from_path(truncated_path) is None
+
+
+def test_iter_memmap_chunks():
+    memmap_points = get_memmap_points_from_path(DONOR_TEST_PATH)
+    chunks = list(iter_memmap_chunks(memmap_points, 500))
+
+    assert [len(chunk) for chunk in chunks] == [500, 500, 500, 106]
+    assert all(isinstance(chunk.array, np.memmap) for chunk in chunks)
+    assert np.array_equal(np.concatenate([chunk.x for chunk in chunks]), memmap_points.x)
+
+
+@pytest.fixture
+def uncompressed_recipient_path(tmp_path):
+    recipient_path = str(tmp_path / "recipient.las")
+    laspy.read(RECIPIENT_TEST_PATH).write(recipient_path)
+    return recipient_path
+
+
+def compose_config(memory_map_las):
+    with initialize(version_base="1.2", config_path="../configs"):
+        return compose(
+            config_name="configs_patchwork.yaml",
+            overrides=[
+                f"MEMORY_MAP_LAS={memory_map_las}",
+                "CHUNK_SIZE=1000",
+                "RECIPIENT_CLASS_LIST=[2]",
+                "DONOR_CLASS_LIST=[2, 3]",
+                "DONOR_USE_SYNTHETIC_POINTS=false",
+            ],
+        )
+
+
+def test_get_recipient_occupancy_grid_memory_mapped(uncompressed_recipient_path):
+    tile_origin = get_tile_origin_using_header_info(uncompressed_recipient_path, 1000)
+    occupancy_grids = [
+        get_recipient_occupancy_grid(uncompressed_recipient_path, tile_origin, compose_config(memory_map_las))
+        for memory_map_las in [False, True]
+    ]
+
+    assert np.any(occupancy_grids[0])
+    assert np.array_equal(occupancy_grids[0], occupancy_grids[1])
+
+
+def test_read_donor_points_memory_mapped(uncompressed_recipient_path):
+    footprint = box(843495, 6446495, 843505, 6446505)
+    donor_points = [
+        read_donor_points(uncompressed_recipient_path, footprint, compose_config(memory_map_las))
+        for memory_map_las in [False, True]
+    ]
+
+    assert len(donor_points[0]) > 0
+    assert np.array_equal(donor_points[0].array, donor_points[1].array)
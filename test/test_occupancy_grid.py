@@ -0,0 +1,66 @@
+import numpy as np
+
+from patchwork.occupancy_grid import (
+    create_occupancy_grid,
+    fill_donor_grid,
+    get_cell_indices,
+    get_grid_size,
+    is_patch_occupied,
+)
+
+PATCH_SIZE = 1
+TILE_SIZE = 3
+TILE_ORIGIN = (0, 3)
+
+# patches (patch_x, patch_y) and the matching (row, column) in the grid
+PATCHES = {"patch_x": np.array([0, 1, 2, 1]), "patch_y": np.array([0, 0, 2, 1])}
+CELLS_IN_GRID = [(2, 0), (2, 1), (0, 2), (1, 1)]
+
+
+def test_get_grid_size():
+    assert get_grid_size(1000, 1) == 1000
+    assert get_grid_size(1000, 0.25) == 4000
+    assert get_grid_size(1000, 5) == 200
+
+
+def test_get_cell_indices():
+    cell_indices = get_cell_indices(
+        np.array([0, 2, -1, 3, 0]), np.array([2, 0, 0, 0, 3]), TILE_ORIGIN, PATCH_SIZE, TILE_SIZE
+    )
+    # first row is at the top of the tile, last 3 patches are outside the tile
+    assert list(cell_indices) == [0, 8, -1, -1, -1]
+
+
+def test_create_occupancy_grid():
+    grid = create_occupancy_grid(PATCHES["patch_x"], PATCHES["patch_y"], TILE_ORIGIN, PATCH_SIZE, TILE_SIZE)
+    assert grid.shape == (3, 3)
+    assert grid.dtype == bool
+    for cell in CELLS_IN_GRID:
+        assert grid[cell]
+    assert np.count_nonzero(grid) == len(CELLS_IN_GRID)
+
+
+def test_create_occupancy_grid_no_points():
+    grid = create_occupancy_grid(np.array([]), np.array([]), TILE_ORIGIN, PATCH_SIZE, TILE_SIZE)
+    assert not np.any(grid)
+
+
+def test_is_patch_occupied():
+    grid = create_occupancy_grid(PATCHES["patch_x"], PATCHES["patch_y"], TILE_ORIGIN, PATCH_SIZE, TILE_SIZE)
+    is_occupied = is_patch_occupied(
+        grid, np.array([0, 0, 2, 5]), np.array([0, 1, 2, 0]), TILE_ORIGIN, PATCH_SIZE, TILE_SIZE
+    )
+    # patch outside of the tile is considered as not occupied
+    assert list(is_occupied) == [True, False, True, False]
+
+
+def test_fill_donor_grid():
+    grid = np.zeros((3, 3), dtype=np.uint8)
+    fill_donor_grid(grid, PATCHES["patch_x"], PATCHES["patch_y"], 1, TILE_ORIGIN, PATCH_SIZE, TILE_SIZE)
+    # cells already filled by donor 1 keep its id, patch outside of the tile is ignored
+    fill_donor_grid(grid, np.array([0, 0, 5]), np.array([0, 2, 0]), 2, TILE_ORIGIN, PATCH_SIZE, TILE_SIZE)
+
+    for cell in CELLS_IN_GRID:
+        assert grid[cell] == 1
+    assert grid[0, 0] == 2
+    assert np.count_nonzero(grid) == len(CELLS_IN_GRID) + 1
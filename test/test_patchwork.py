@@ -5,18 +5,34 @@ import laspy
 import numpy as np
 import pandas as pd
 import pytest
+import rasterio as rs
 from hydra import compose, initialize
 from pdaltools.las_info import get_tile_origin_using_header_info
+from shapely.geometry import box
 
 import patchwork.constants as c
+from patchwork.donor_cache import DonorCache
+from patchwork.donor_catalog import DonorCatalog
+from patchwork.occupancy_grid import create_occupancy_grid
 from patchwork.patchwork import (
     append_points,
+    can_donor_fill_empty_patches,
+    estimate_donor_fill,
+    get_common_las_columns,
     get_complementary_points,
     get_field_from_header,
-    get_common_las_columns,
+    get_points_dataframe,
+    get_recipient_occupancy_grid,
     get_selected_classes_points,
     get_type,
     patchwork,
+    read_donor_points,
+)
+from patchwork.run_report import RunReport
+from patchwork.synthetic_tiles import (
+    SYNTHETIC_TILE_ORIGIN,
+    create_synthetic_dataset,
+    get_synthetic_dataset_config,
 )
 
 TEST_DATA_DIR = "test/data/"
@@ -85,6 +101,28 @@ def test_get_selected_classes_points(las_path, class_list, fields_to_keep, use_s
             assert not np.any(df_output_points.synthetic)
 
 
+def test_get_selected_classes_points_keeps_native_types():
+    las_path = os.path.join(TEST_DATA_DIR, RECIPIENT_TEST_NAME)
+    tile_origin = get_tile_origin_using_header_info(las_path, TILE_SIZE)
+    with laspy.open(las_path) as recipient_file:
+        input_points = recipient_file.read().points
+    fields_to_keep = ["intensity", "synthetic", c.CLASSIFICATION_STR]
+    df_output_points = get_selected_classes_points(
+        tile_origin,
+        input_points,
+        [2, 3],
+        fields_to_keep=fields_to_keep,
+        use_synthetic_points=False,
+        patch_size=PATCH_SIZE,
+        tile_size=TILE_SIZE,
+    )
+    assert fields_to_keep == ["intensity", "synthetic", c.CLASSIFICATION_STR]  # input list is not modified
+    assert df_output_points["intensity"].dtype == np.uint16
+    assert df_output_points[c.CLASSIFICATION_STR].dtype == np.uint8
+    assert df_output_points[c.PATCH_X_STR].dtype == np.int32
+    assert df_output_points[c.PATCH_Y_STR].dtype == np.int32
+
+
 def test_get_selected_classes_points_raise_error():
     las_path = os.path.join(TEST_DATA_DIR, "recipient_with_synthetic_points.laz")
     class_list = [2, 3]
@@ -105,6 +143,83 @@ def test_get_selected_classes_points_raise_error():
             )
 
 
+def test_get_points_dataframe():
+    las_path = os.path.join(TEST_DATA_DIR, RECIPIENT_TEST_NAME)
+    tile_origin = get_tile_origin_using_header_info(las_path, TILE_SIZE)
+    with laspy.open(las_path) as recipient_file:
+        input_points = recipient_file.read().points
+    fields_to_keep = ["intensity", "synthetic", c.CLASSIFICATION_STR]
+    mask_selected_points = np.isin(input_points.classification, [2, 3]) & np.logical_not(input_points.synthetic)
+    selected_points = input_points[mask_selected_points]
+
+    # same dataframe as get_selected_classes_points, without selecting the points again
+    df_output_points = get_points_dataframe(
+        tile_origin, selected_points, fields_to_keep, patch_size=PATCH_SIZE, tile_size=TILE_SIZE
+    )
+    pd.testing.assert_frame_equal(
+        df_output_points,
+        get_selected_classes_points(
+            tile_origin,
+            input_points,
+            [2, 3],
+            fields_to_keep=fields_to_keep,
+            use_synthetic_points=False,
+            patch_size=PATCH_SIZE,
+            tile_size=TILE_SIZE,
+        ),
+    )
+
+
+def test_get_recipient_occupancy_grid():
+    las_path = os.path.join(TEST_DATA_DIR, RECIPIENT_TEST_NAME)
+    tile_origin = get_tile_origin_using_header_info(las_path, TILE_SIZE)
+    grids = []
+    for chunk_size in [1000, 1000000]:  # the recipient file has 9580 points
+        with initialize(version_base="1.2", config_path="../configs"):
+            config = compose(
+                config_name="configs_patchwork.yaml",
+                overrides=[f"RECIPIENT_CLASS_LIST={RECIPIENT_CLASS_LIST}", f"CHUNK_SIZE={chunk_size}"],
+            )
+        grids.append(get_recipient_occupancy_grid(las_path, tile_origin, config))
+
+    assert grids[0].shape == (TILE_SIZE / PATCH_SIZE, TILE_SIZE / PATCH_SIZE)
+    assert np.any(grids[0])
+    assert np.array_equal(grids[0], grids[1])
+
+    with laspy.open(las_path) as recipient_file:
+        df_recipient_points = get_selected_classes_points(
+            tile_origin,
+            recipient_file.read().points,
+            RECIPIENT_CLASS_LIST,
+            use_synthetic_points=True,
+            fields_to_keep=[],
+            patch_size=PATCH_SIZE,
+            tile_size=TILE_SIZE,
+        )
+    nb_patches = len(df_recipient_points.groupby(by=[c.PATCH_X_STR, c.PATCH_Y_STR]))
+    assert np.count_nonzero(grids[0]) == nb_patches
+
+
+@pytest.mark.parametrize(
+    "footprint, empty_patch, expected_result",
+    [
+        (box(673100, 6362100, 673200, 6362200), None, False),  # all patches are filled
+        (box(673100, 6362100, 673200, 6362200), (850, 150), True),  # empty patch in the footprint
+        (box(673100, 6362100, 673200, 6362200), (500, 500), False),  # empty patch outside of the footprint
+        (box(672900, 6362100, 673200, 6362200), None, True),  # footprint goes outside of the tile
+    ],
+)
+def test_can_donor_fill_empty_patches(footprint, empty_patch, expected_result):
+    tile_origin = (673000, 6363000)
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(config_name="configs_patchwork.yaml")
+    recipient_occupancy_grid = np.ones((1000, 1000), dtype=bool)
+    if empty_patch:
+        recipient_occupancy_grid[empty_patch] = False
+
+    assert can_donor_fill_empty_patches(footprint, recipient_occupancy_grid, tile_origin, config) == expected_result
+
+
 @pytest.mark.parametrize(
     "donor_info_path, recipient_path, x, y, expected_nb_points",
     # expected_nb_points value set after inspection of the initial result using qgis:
@@ -150,7 +265,12 @@ def test_get_complementary_points(donor_info_path, recipient_path, x, y, expecte
                 "DONOR_USE_SYNTHETIC_POINTS=true",
             ],
         )
-        complementary_points = get_complementary_points(df_donor_info, recipient_path, (x, y), config)
+        complementary_points = get_complementary_points(
+            df_donor_info,
+            recipient_path,
+            (x * SHP_X_Y_TO_METER_FACTOR, y * SHP_X_Y_TO_METER_FACTOR),
+            config,
+        )
 
     assert np.all(complementary_points["x"] >= x * SHP_X_Y_TO_METER_FACTOR)
     assert np.all(complementary_points["x"] <= (x + 1) * SHP_X_Y_TO_METER_FACTOR)
@@ -160,6 +280,127 @@ def test_get_complementary_points(donor_info_path, recipient_path, x, y, expecte
     assert len(complementary_points.index) == expected_nb_points
 
 
+@pytest.mark.parametrize("donor_priority_field, expected_ratio_to_one_donor", [("null", 2), ("priority", 1)])
+def test_get_complementary_points_overlapping_donors(donor_priority_field, expected_ratio_to_one_donor):
+    recipient_path = os.path.join(TEST_DATA_DIR, RECIPIENT_TEST_NAME)
+    donor_path = os.path.join(TEST_DATA_DIR, "donor_test.las")
+    tile_origin = get_tile_origin_using_header_info(recipient_path, TILE_SIZE)
+    footprint = box(843490, 6446490, 843510, 6446510)
+    # the same donor is used twice, with the same footprint
+    df_one_donor = gpd.GeoDataFrame(data={"full_path": [donor_path], "priority": [1]}, geometry=[footprint])
+    df_two_donors = gpd.GeoDataFrame(
+        data={"full_path": [donor_path] * 2, "priority": [1, 2]}, geometry=[footprint] * 2
+    )
+
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=[
+                "DONOR_CLASS_LIST=[2, 9]",
+                "RECIPIENT_CLASS_LIST=[2]",
+                "DONOR_USE_SYNTHETIC_POINTS=true",
+                f"DONOR_PRIORITY_FIELD={donor_priority_field}",
+            ],
+        )
+        points_one_donor = get_complementary_points(df_one_donor, recipient_path, tile_origin, config)
+        points_two_donors = get_complementary_points(df_two_donors, recipient_path, tile_origin, config)
+
+    assert len(points_one_donor.index) > 0
+    assert len(points_two_donors.index) == expected_ratio_to_one_donor * len(points_one_donor.index)
+
+
+def test_read_donor_points_decompressed_fields():
+    # compressed file with a point format 6: the fields that are not decompressed are not read (they keep the value
+    # of the first point)
+    donor_path = os.path.join(TEST_DATA_DIR, RECIPIENT_TEST_NAME)
+    footprint = box(843490, 6446490, 843510, 6446510)
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=["DONOR_CLASS_LIST=[2, 3]", "DONOR_USE_SYNTHETIC_POINTS=false"],
+        )
+
+    all_fields_points = read_donor_points(donor_path, footprint, config)
+    z_only_points = read_donor_points(donor_path, footprint, config, decompressed_fields=["z"])
+
+    assert len(all_fields_points) > 0
+    assert len(z_only_points) == len(all_fields_points)
+    for field in ["x", "y", "z", "classification", "synthetic"]:
+        assert np.array_equal(z_only_points[field], all_fields_points[field])
+    for field in ["intensity", "gps_time"]:
+        assert len(np.unique(all_fields_points[field])) > 1
+        assert len(np.unique(z_only_points[field])) == 1
+
+
+@pytest.mark.parametrize("donor_priority_field", ["null", "priority"])
+@pytest.mark.parametrize("use_donor_cache", [False, True])
+def test_get_complementary_points_parallel_donor_loading(donor_priority_field, use_donor_cache):
+    recipient_path = os.path.join(TEST_DATA_DIR, RECIPIENT_TEST_NAME)
+    donor_path = os.path.join(TEST_DATA_DIR, "donor_test.las")
+    tile_origin = get_tile_origin_using_header_info(recipient_path, TILE_SIZE)
+    # overlapping footprints, so that the order of the donors matters
+    footprints = [
+        box(843490, 6446490, 843510, 6446510),
+        box(843500, 6446480, 843520, 6446500),
+        box(843480, 6446500, 843500, 6446520),
+        box(843495, 6446495, 843505, 6446505),
+    ]
+    df_donors = gpd.GeoDataFrame(
+        data={"full_path": [donor_path] * len(footprints), "priority": range(len(footprints))}, geometry=footprints
+    )
+
+    complementary_points = {}
+    for donor_loading_threads in [1, 4]:
+        with initialize(version_base="1.2", config_path="../configs"):
+            config = compose(
+                config_name="configs_patchwork.yaml",
+                overrides=[
+                    "DONOR_CLASS_LIST=[2, 9]",
+                    "RECIPIENT_CLASS_LIST=[2]",
+                    "DONOR_USE_SYNTHETIC_POINTS=true",
+                    f"DONOR_PRIORITY_FIELD={donor_priority_field}",
+                    f"DONOR_LOADING_THREADS={donor_loading_threads}",
+                ],
+            )
+        donor_cache = DonorCache(100 * 1024 * 1024) if use_donor_cache else None
+        complementary_points[donor_loading_threads] = get_complementary_points(
+            df_donors, recipient_path, tile_origin, config, donor_cache=donor_cache
+        )
+
+    assert len(complementary_points[1].index) > 0
+    pd.testing.assert_frame_equal(complementary_points[1], complementary_points[4])
+
+
+def test_get_complementary_points_donor_grid():
+    recipient_path = os.path.join(TEST_DATA_DIR, RECIPIENT_TEST_NAME)
+    donor_path = os.path.join(TEST_DATA_DIR, "donor_test.las")
+    tile_origin = get_tile_origin_using_header_info(recipient_path, TILE_SIZE)
+    footprints = [box(843490, 6446490, 843500, 6446500), box(843490, 6446490, 843510, 6446510)]
+    df_donors = gpd.GeoDataFrame(data={"full_path": [donor_path] * 2}, geometry=footprints)
+
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=["DONOR_CLASS_LIST=[2, 9]", "RECIPIENT_CLASS_LIST=[2]", "DONOR_USE_SYNTHETIC_POINTS=true"],
+        )
+    recipient_occupancy_grid = get_recipient_occupancy_grid(recipient_path, tile_origin, config)
+    donor_grid = np.zeros(recipient_occupancy_grid.shape, dtype=np.uint8)
+    complementary_points = get_complementary_points(
+        df_donors, recipient_path, tile_origin, config, recipient_occupancy_grid, donor_grid=donor_grid
+    )
+
+    # the donor grid has the patches of the complementary points, with the id of the first donor that filled them
+    points_grid = create_occupancy_grid(
+        complementary_points[c.PATCH_X_STR], complementary_points[c.PATCH_Y_STR], tile_origin, PATCH_SIZE, TILE_SIZE
+    )
+    assert np.array_equal(donor_grid != 0, points_grid)
+    assert set(np.unique(donor_grid)) == {0, 1, 2}
+    # the first donor only has points in the bottom left quarter
+    rows, columns = np.nonzero(donor_grid == 1)
+    assert np.all(columns <= 843500 - tile_origin[0])
+    assert np.all(rows >= tile_origin[1] - 6446500 - 1)
+
+
 def test_get_complementary_points_2_more_fields(tmp_path_factory):
     """test selected_classes_points with more fields in files, different from each other's"""
     original_recipient_path = "test/data/lidar_HD_decimated/Semis_2022_0673_6362_LA93_IGN69_decimated.laz"
@@ -205,7 +446,12 @@ def test_get_complementary_points_2_more_fields(tmp_path_factory):
             ],
         )
 
-        complementary_points = get_complementary_points(df_donor_info, tmp_recipient_path, (x, y), config)
+        complementary_points = get_complementary_points(
+            df_donor_info,
+            tmp_recipient_path,
+            (x * SHP_X_Y_TO_METER_FACTOR, y * SHP_X_Y_TO_METER_FACTOR),
+            config,
+        )
 
     assert len(complementary_points.index) == 128675
     columns = complementary_points.columns
@@ -340,6 +586,39 @@ def test_append_points_new_column(tmp_path_factory):
         assert max(new_column[:-2]) == 0
 
 
+def test_append_points_by_chunks(tmp_path_factory):
+    tmp_file_dir = tmp_path_factory.mktemp("data")
+    tmp_file_name = "result.laz"
+
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(
+            config_name="configs_patchwork.yaml",
+            overrides=[
+                f"filepath.RECIPIENT_DIRECTORY={TEST_DATA_DIR}",
+                f"filepath.RECIPIENT_NAME={RECIPIENT_TEST_NAME}",
+                f"filepath.OUTPUT_DIR={tmp_file_dir}",
+                f"filepath.OUTPUT_NAME={tmp_file_name}",
+                f"NEW_COLUMN={NEW_COLUMN}",
+                "CHUNK_SIZE=1000",  # the recipient file has 9580 points
+            ],
+        )
+
+        extra_points = pd.DataFrame(data=[POINT_1, POINT_2])
+        append_points(config, extra_points)
+
+        las_recipient = laspy.read(os.path.join(TEST_DATA_DIR, RECIPIENT_TEST_NAME))
+        las_output = laspy.read(os.path.join(tmp_file_dir, tmp_file_name))
+        assert len(las_output.points) == len(las_recipient.points) + 2
+        assert las_output.header.are_points_compressed
+        assert las_output.header.parse_crs() == las_recipient.header.parse_crs()
+
+        # all recipient points are copied as is, in the same order
+        output_recipient_points = las_output.points[: len(las_recipient.points)]
+        for field in las_recipient.point_format.dimension_names:
+            assert np.array_equal(output_recipient_points[field], las_recipient.points[field])
+        assert not np.any(output_recipient_points[NEW_COLUMN])
+
+
 @pytest.mark.parametrize(
     "recipient_path, expected_nb_added_points",
     # expected_nb_points value set after inspection of the initial result using qgis:
@@ -625,4 +904,140 @@ def test_patchwork_with_different_las_format(tmp_path_factory):
         assert np.sum(output_points.Origin == 1) == expected_nb_added_points
 
         assert np.all(output_points.classification[output_points.Origin == 1] == 11)
-        assert not np.any(output_points.classification[output_points.Origin == 0] == 11)
\ No newline at end of file
+        assert not np.any(output_points.classification[output_points.Origin == 0] == 11)
+
+
+def test_patchwork_replay(tmp_path, monkeypatch):
+    donor_dir = tmp_path / "donor_source"
+    os.makedirs(donor_dir / "data")
+    laspy.read(os.path.join(TEST_DATA_DIR, "donor_test.las")).write(donor_dir / "data" / "donor_0843_6447.las")
+    gpd.GeoDataFrame(
+        data={"x": ["0843"], "y": ["6447"], "nom_coord": ["oui"], "nuage_mixa": [str(donor_dir)]},
+        geometry=[box(843000, 6446000, 844000, 6447000)],
+        crs=2154,
+    ).to_file(tmp_path / "donors.shp")
+
+    def compose_config(output_dir, overrides=[]):
+        with initialize(version_base="1.2", config_path="../configs"):
+            return compose(
+                config_name="configs_patchwork.yaml",
+                overrides=[
+                    f"filepath.RECIPIENT_DIRECTORY={TEST_DATA_DIR}",
+                    f"filepath.RECIPIENT_NAME={RECIPIENT_TEST_NAME}",
+                    f"filepath.SHP_DIRECTORY={tmp_path}",
+                    "filepath.SHP_NAME=donors.shp",
+                    f"filepath.OUTPUT_DIR={output_dir}",
+                    "filepath.OUTPUT_NAME=output.laz",
+                    f"filepath.OUTPUT_INDICES_MAP_DIR={output_dir}",
+                    "filepath.OUTPUT_INDICES_MAP_NAME=indices.tif",
+                    "DONOR_CLASS_LIST=[2, 9]",
+                    "RECIPIENT_CLASS_LIST=[2, 3, 9]",
+                    "+DONOR_CLASS_TRANSLATION={2: 2, 9: 9}",
+                    *overrides,
+                ],
+            )
+
+    nb_added_points = patchwork(compose_config(tmp_path / "first_run"))
+    assert nb_added_points > 0
+
+    # replay the first run from its indices map, without decoding the recipient points
+    def fail_on_recipient_decoding(*args, **kwargs):
+        raise AssertionError("the recipient should not be decoded in replay mode")
+
+    monkeypatch.setattr("patchwork.patchwork.get_recipient_occupancy_grid", fail_on_recipient_decoding)
+    replay_config = compose_config(
+        tmp_path / "replay",
+        [
+            f"filepath.INPUT_INDICES_MAP_DIR={tmp_path / 'first_run'}",
+            "filepath.INPUT_INDICES_MAP_NAME=indices.tif",
+        ],
+    )
+    assert patchwork(replay_config) == nb_added_points
+
+    first_run_points = laspy.read(tmp_path / "first_run" / "output.laz").points
+    replay_points = laspy.read(tmp_path / "replay" / "output.laz").points
+    assert np.array_equal(first_run_points.array, replay_points.array)
+    with rs.open(tmp_path / "first_run" / "indices.tif") as first_run_map, rs.open(
+        tmp_path / "replay" / "indices.tif"
+    ) as replay_map:
+        assert np.array_equal(first_run_map.read(), replay_map.read())
+
+    # an empty indices map: nothing to fill
+    empty_map_path = tmp_path / "empty" / "indices.tif"
+    os.makedirs(empty_map_path.parent)
+    with rs.open(tmp_path / "first_run" / "indices.tif") as first_run_map:
+        profile = first_run_map.profile
+    with rs.open(empty_map_path, "w", **profile) as empty_map:
+        empty_map.write(np.zeros((1, profile["height"], profile["width"]), dtype=profile["dtype"]))
+    empty_replay_config = compose_config(
+        tmp_path / "empty_replay",
+        [f"filepath.INPUT_INDICES_MAP_DIR={empty_map_path.parent}", "filepath.INPUT_INDICES_MAP_NAME=indices.tif"],
+    )
+    assert patchwork(empty_replay_config) == 0
+
+
+def test_patchwork_dry_run(tmp_path, capsys):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.3, nb_donors=2, patch_size=1
+    )
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(config_name="configs_patchwork.yaml")
+
+    dry_run_config = get_synthetic_dataset_config(config, dataset, str(tmp_path / "dry_run"))
+    dry_run_config.DRY_RUN = True
+    run_report = RunReport()
+    nb_estimated_points = patchwork(dry_run_config, run_report=run_report)
+    assert not os.path.exists(tmp_path / "dry_run")  # nothing is written
+    assert not capsys.readouterr().out  # the estimate is only in the run report
+    fill_estimate = run_report.info["fill_estimate"]
+
+    nb_added_points = patchwork(get_synthetic_dataset_config(config, dataset, str(tmp_path / "run")))
+    output_path = tmp_path / "run" / dataset["recipient_name"]
+    with rs.open(output_path.with_suffix(".tif")) as indices_map:
+        nb_filled_patches = np.count_nonzero(indices_map.read(1))
+
+    # the donors are not decoded: their points are estimated from their headers
+    stage_names = [stage["name"] for stage in run_report.to_dict()["stages"]]
+    assert "donor_estimate" in stage_names
+    assert "donor_decode" not in stage_names
+    assert nb_estimated_points == fill_estimate["added_points"]
+    # all the classes of the donors are counted: upper bound of the added points
+    assert nb_added_points <= nb_estimated_points <= 1.5 * nb_added_points
+    assert fill_estimate["patches"] == 50 * 50
+    # holes are 30% of the patches: about as many empty patches (with points of classes that are not recipient ones)
+    assert fill_estimate["empty_patches"] >= 0.3 * 50 * 50
+    # the donor footprints cover the tile
+    assert fill_estimate["fillable_patches"] == fill_estimate["empty_patches"] >= nb_filled_patches
+    # each donor footprint is half of the tile
+    assert fill_estimate["candidate_donor_points"] == pytest.approx(dataset["nb_donor_points"] / 2, rel=0.05)
+    assert fill_estimate["donors"] == 2
+    assert fill_estimate["recipient_points"] == dataset["nb_recipient_points"]
+    assert fill_estimate["estimated_output_size"] == pytest.approx(os.path.getsize(output_path), rel=0.2)
+
+
+@pytest.mark.parametrize("priority_field", [None, "priority"])
+def test_estimate_donor_fill(tmp_path, priority_field):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.3, nb_donors=2, patch_size=1
+    )
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = compose(config_name="configs_patchwork.yaml", overrides=["TILE_SIZE=50", "PATCH_SIZE=1"])
+    config.DONOR_PRIORITY_FIELD = priority_field
+    recipient_occupancy_grid = np.zeros((50, 50), dtype=bool)
+    recipient_occupancy_grid[:, :10] = True
+    # both donors cover the whole tile
+    xmin, ymax = SYNTHETIC_TILE_ORIGIN
+    tile_box = box(xmin, ymax - 50, xmin + 50, ymax)
+    df_donor_info = gpd.GeoDataFrame({"full_path": dataset["donor_paths"]}, geometry=[tile_box, tile_box], crs=2154)
+
+    donor_grid, nb_candidate_points, nb_added_points = estimate_donor_fill(
+        df_donor_info, recipient_occupancy_grid, SYNTHETIC_TILE_ORIGIN, config, DonorCatalog()
+    )
+
+    # the empty patches are filled by the first donor
+    assert np.all(donor_grid[:, 10:] == 1)
+    assert not np.any(donor_grid[:, :10])
+    # in priority mode, the second donor does not fill any patch: its points are not candidates
+    nb_used_donors = 1 if priority_field else 2
+    assert nb_candidate_points == pytest.approx(nb_used_donors * dataset["nb_donor_points"] / 2, rel=0.01)
+    assert nb_added_points == pytest.approx(nb_used_donors * 2 * 50 * 40, rel=0.05)
@@ -0,0 +1,134 @@
+import json
+import math
+import os
+
+import numpy as np
+import pytest
+from hydra import compose, initialize
+
+from patchwork.patchwork import patchwork
+from patchwork.run_report import RunReport, report_iter_stage, report_stage
+from patchwork.synthetic_tiles import (
+    create_synthetic_dataset,
+    get_synthetic_dataset_config,
+)
+
+
+def test_run_report_stages():
+    stage_measures = []
+    run_report = RunReport(callback=stage_measures.append)
+
+    for points_in in [10, 20]:
+        with run_report.stage("decode") as measures:
+            measures["points_in"] = points_in
+    with run_report.stage("decode", donor="a.laz") as measures:
+        measures["bytes_read"] = 100
+    with pytest.raises(ValueError):
+        with run_report.stage("write"):
+            raise ValueError("stage failure")
+
+    report = run_report.to_dict()
+    assert [(stage["name"], stage.get("donor")) for stage in report["stages"]] == [
+        ("decode", None),
+        ("decode", "a.laz"),
+        ("write", None),
+    ]
+    decode_stage = report["stages"][0]
+    assert decode_stage["calls"] == 2
+    assert decode_stage["points_in"] == 30
+    assert decode_stage["wall_time"] == pytest.approx(sum(measures["wall_time"] for measures in stage_measures[:2]))
+    assert report["stages"][1]["bytes_read"] == 100
+    # the callback is called for each execution of a stage, even if it fails
+    assert [measures["name"] for measures in stage_measures] == ["decode", "decode", "decode", "write"]
+    for field in ["wall_time", "cpu_time", "peak_rss_delta"]:
+        assert all(measures[field] >= 0 for measures in stage_measures)
+    assert report["peak_rss"] > 0
+
+
+def test_run_report_iter_stage():
+    run_report = RunReport()
+    chunks = [np.zeros(3), np.zeros(4)]
+    assert list(report_iter_stage(run_report, chunks, "decode")) == chunks
+    decode_stage = run_report.to_dict()["stages"][0]
+    assert decode_stage["points_out"] == 7
+    assert decode_stage["calls"] == 2  # once per chunk: the end of the iteration is not measured
+
+    # an empty iteration is not measured
+    assert not list(report_iter_stage(run_report, [], "empty_decode"))
+    assert [stage["name"] for stage in run_report.to_dict()["stages"]] == ["decode"]
+
+    # nothing is measured without report
+    assert report_iter_stage(None, chunks, "decode") is chunks
+    with report_stage(None, "decode") as measures:
+        measures["points_in"] = 1
+
+
+def test_patchwork_run_report(tmp_path):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.2, nb_donors=2, patch_size=1
+    )
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = get_synthetic_dataset_config(
+            compose(
+                config_name="configs_patchwork.yaml",
+                overrides=["filepath.OUTPUT_REPORT_NAME=report.json", "CHUNK_SIZE=1000"],
+            ),
+            dataset,
+            str(tmp_path / "output"),
+        )
+    stage_names = []
+
+    added_points = patchwork(
+        config, run_report=RunReport(callback=lambda measures: stage_names.append(measures["name"]))
+    )
+
+    with open(os.path.join(config.filepath.OUTPUT_DIR, "report.json"), "r", encoding="utf-8") as report_file:
+        report = json.load(report_file)
+    assert report["added_points"] == added_points
+    assert report["recipient"].endswith(dataset["recipient_name"])
+    stages = {}
+    for stage in report["stages"]:
+        stages.setdefault(stage["name"], []).append(stage)
+    assert set(stages) == {
+        "header_read",
+        "recipient_open",
+        "recipient_decode",
+        "occupancy",
+        "shapefile_read",
+        "shapefile_query",
+        "donor_discovery",
+        "donor_prefilter",
+        "donor_decode",
+        "donor_filter",
+        "donor_clip",
+        "donor_dataframe",
+        "join",
+        "output_write",
+        "indices_map_write",
+    }
+    assert set(stage_names) == set(stages)
+    assert stages["recipient_open"][0]["calls"] == 1
+    assert stages["recipient_open"][0]["bytes_read"] > 0
+    # one call per chunk
+    assert stages["recipient_decode"][0]["calls"] == math.ceil(dataset["nb_recipient_points"] / config.CHUNK_SIZE)
+    assert stages["recipient_decode"][0]["points_out"] == dataset["nb_recipient_points"]
+    # one stage per donor
+    assert sorted(stage["donor"] for stage in stages["donor_decode"]) == sorted(dataset["donor_paths"])
+    assert sum(stage["points_out"] for stage in stages["donor_decode"]) == dataset["nb_donor_points"]
+    # each donor stage runs once per donor, and its points are the ones of the previous stage
+    for donor_path in dataset["donor_paths"]:
+        donor_stages = {
+            name: [stage for stage in stages[name] if stage["donor"] == donor_path]
+            for name in ["donor_decode", "donor_filter", "donor_clip", "donor_dataframe"]
+        }
+        assert all(len(donor_stage) == 1 and donor_stage[0]["calls"] == 1 for donor_stage in donor_stages.values())
+        assert donor_stages["donor_filter"][0]["points_in"] == donor_stages["donor_decode"][0]["points_out"]
+        assert donor_stages["donor_clip"][0]["points_in"] == donor_stages["donor_filter"][0]["points_out"]
+        assert donor_stages["donor_dataframe"][0]["points_in"] == donor_stages["donor_clip"][0]["points_out"]
+        assert donor_stages["donor_filter"][0]["points_out"] < donor_stages["donor_filter"][0]["points_in"]
+    assert sum(stage["points_out"] for stage in stages["join"]) == added_points
+    assert stages["output_write"][0]["points_in"] == added_points
+    assert stages["output_write"][0]["bytes_written"] == os.path.getsize(
+        os.path.join(config.filepath.OUTPUT_DIR, config.filepath.OUTPUT_NAME)
+    )
+    assert stages["indices_map_write"][0]["bytes_written"] > 0
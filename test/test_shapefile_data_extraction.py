@@ -1,4 +1,8 @@
+import os
+
+import geopandas as gpd
 import pytest
+from shapely.geometry import box
 
 from patchwork.shapefile_data_extraction import get_donor_info_from_shapefile
 
@@ -125,3 +129,37 @@ def test_get_donor_info_from_shapefile_with_mount_points_no_path(input_shp_path)
     assert set(gdf.columns) == {"x", "y", "full_path", "geometry"}
     assert len(gdf.index) == len(expected_full_path)
     assert set(gdf["full_path"]) == expected_full_path
+
+
+def test_get_donor_info_from_shapefile_with_priority(tmp_path):
+    donor_sources = ["source_a", "source_b", "source_c"]
+    for donor_source in donor_sources:
+        os.makedirs(tmp_path / donor_source / DONOR_SUBDIRECTORY)
+        (tmp_path / donor_source / DONOR_SUBDIRECTORY / f"donor_0673_6362_{donor_source}.laz").touch()
+    gdf = gpd.GeoDataFrame(
+        data={
+            "x": ["0673"] * 3,
+            "y": ["6362"] * 3,
+            "nom_coord": ["oui"] * 3,
+            "nuage_mixa": [str(tmp_path / donor_source) for donor_source in donor_sources],
+            "priorite": [2, 3, 1],
+        },
+        geometry=[box(673000, 6361000, 674000, 6362000)] * 3,
+        crs=2154,
+    )
+    input_shp = str(tmp_path / "donors.shp")
+    gdf.to_file(input_shp)
+
+    gdf_donors = get_donor_info_from_shapefile(input_shp, 673, 6362, DONOR_SUBDIRECTORY, [])
+    assert [os.path.basename(path) for path in gdf_donors["full_path"]] == [
+        "donor_0673_6362_source_a.laz",
+        "donor_0673_6362_source_b.laz",
+        "donor_0673_6362_source_c.laz",
+    ]
+
+    gdf_donors = get_donor_info_from_shapefile(input_shp, 673, 6362, DONOR_SUBDIRECTORY, [], "priorite")
+    assert [os.path.basename(path) for path in gdf_donors["full_path"]] == [
+        "donor_0673_6362_source_c.laz",
+        "donor_0673_6362_source_a.laz",
+        "donor_0673_6362_source_b.laz",
+    ]
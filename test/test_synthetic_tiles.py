@@ -0,0 +1,65 @@
+import os
+
+import geopandas as gpd
+import laspy
+import numpy as np
+from hydra import compose, initialize
+
+from patchwork.patchwork import patchwork
+from patchwork.synthetic_tiles import (
+    SYNTHETIC_TILE_ORIGIN,
+    create_synthetic_dataset,
+    get_hole_grid,
+    get_synthetic_dataset_config,
+)
+
+
+def test_get_hole_grid():
+    hole_grid = get_hole_grid(100, 2, 0.25, np.random.default_rng(0))
+    assert hole_grid.shape == (50, 50)
+    assert np.count_nonzero(hole_grid) == 625
+
+
+def test_create_synthetic_dataset(tmp_path):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=4, hole_ratio=0.5, nb_donors=2, patch_size=5
+    )
+
+    recipient = laspy.read(os.path.join(dataset["recipient_directory"], dataset["recipient_name"]))
+    assert len(recipient.points) == dataset["nb_recipient_points"]
+    # half of the patches are holes: there are about half of the 10000 points left
+    assert 3000 < dataset["nb_recipient_points"] < 7000
+    assert recipient.header.mins[0] > SYNTHETIC_TILE_ORIGIN[0]
+    assert recipient.header.maxs[1] < SYNTHETIC_TILE_ORIGIN[1]
+    assert set(np.unique(recipient.classification)) <= {1, 2, 6}
+
+    assert len(dataset["donor_paths"]) == 2
+    assert sum(laspy.read(donor_path).header.point_count for donor_path in dataset["donor_paths"]) == 20000
+    donors = gpd.read_file(os.path.join(dataset["shapefile_directory"], dataset["shapefile_name"]))
+    assert list(donors["x"]) == ["0843", "0843"]
+    assert donors.geometry.area.sum() == 50 * 50
+
+    # same seed, same tiles
+    other_dataset = create_synthetic_dataset(
+        str(tmp_path / "other_input"), tile_size=50, density=4, hole_ratio=0.5, nb_donors=2, patch_size=5
+    )
+    assert other_dataset["nb_recipient_points"] == dataset["nb_recipient_points"]
+
+
+def test_patchwork_on_synthetic_dataset(tmp_path):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.2, nb_donors=3, patch_size=1, compressed=False
+    )
+    with initialize(version_base="1.2", config_path="../configs"):
+        config = get_synthetic_dataset_config(
+            compose(config_name="configs_patchwork.yaml"), dataset, str(tmp_path / "output")
+        )
+
+    added_points = patchwork(config)
+
+    assert added_points > 0
+    output = laspy.read(os.path.join(config.filepath.OUTPUT_DIR, config.filepath.OUTPUT_NAME))
+    assert len(output.points) == dataset["nb_recipient_points"] + added_points
+    assert os.path.isfile(
+        os.path.join(config.filepath.OUTPUT_INDICES_MAP_DIR, config.filepath.OUTPUT_INDICES_MAP_NAME)
+    )
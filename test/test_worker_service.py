@@ -0,0 +1,126 @@
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+from hydra import compose, initialize
+
+from patchwork.synthetic_tiles import (
+    create_synthetic_dataset,
+    get_synthetic_dataset_config,
+)
+from patchwork.worker_service import (
+    claim_next_job,
+    get_job_status,
+    get_running_job_name,
+    get_spool_paths,
+    parse_running_job_name,
+    patchwork_worker,
+    requeue_orphan_jobs,
+    submit_job,
+)
+
+
+def get_worker_config(tmp_path, dataset, overrides):
+    with initialize(version_base="1.2", config_path="../configs"):
+        return get_synthetic_dataset_config(
+            compose(config_name="configs_patchwork.yaml", overrides=overrides), dataset, str(tmp_path / "output")
+        )
+
+
+def test_patchwork_worker(tmp_path):
+    dataset = create_synthetic_dataset(
+        str(tmp_path / "input"), tile_size=50, density=2, hole_ratio=0.3, nb_donors=1, patch_size=1
+    )
+    spool_directory = str(tmp_path / "spool")
+    config = get_worker_config(
+        tmp_path,
+        dataset,
+        [f"worker.SPOOL_DIRECTORY={spool_directory}", "worker.EXIT_WHEN_IDLE=true", "batch.DONOR_CACHE_SIZE=10"],
+    )
+    recipient_path = os.path.join(dataset["recipient_directory"], dataset["recipient_name"])
+    job_ids = [
+        submit_job(spool_directory, recipient_path),
+        submit_job(spool_directory, str(tmp_path / "missing.laz")),
+        submit_job(spool_directory, recipient_path, output_dir=str(tmp_path / "other_output")),
+    ]
+    assert [get_job_status(spool_directory, job_id)[0] for job_id in job_ids] == ["queued"] * 3
+
+    assert patchwork_worker(config) == 3
+
+    status, job = get_job_status(spool_directory, job_ids[0])
+    assert status == "done"
+    assert job["report"]["added_points"] > 0
+    assert os.path.isfile(tmp_path / "output" / dataset["recipient_name"])
+    status, job = get_job_status(spool_directory, job_ids[1])
+    assert status == "failed"
+    assert job["report"]["error"]
+    # the donor points are read once, and kept in the worker cache for the next job of the same tile
+    status, job = get_job_status(spool_directory, job_ids[2])
+    assert status == "done"
+    assert job["report"]["donor_cache_hits"] == 1
+    assert os.path.isfile(tmp_path / "other_output" / dataset["recipient_name"])
+    assert get_job_status(spool_directory, "unknown") is None
+
+    # a stopped worker does not process the queued jobs
+    job_id = submit_job(spool_directory, recipient_path)
+    stop_event = threading.Event()
+    stop_event.set()
+    assert patchwork_worker(config, stop_event) == 0
+    assert get_job_status(spool_directory, job_id)[0] == "queued"
+
+
+def get_dead_pid():
+    dead_process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True)
+    return int(dead_process.stdout)
+
+
+@pytest.mark.parametrize("hostname", ["node1", "node1.example.org"])
+def test_requeue_orphan_jobs(tmp_path, monkeypatch, hostname):
+    monkeypatch.setattr(socket, "gethostname", lambda: hostname)
+    spool_directory = str(tmp_path / "spool")
+    spool_paths = get_spool_paths(spool_directory)
+    job_ids = [submit_job(spool_directory, f"tile.{index}@x.laz") for index in range(3)]
+
+    # job claimed by a worker that died
+    dead_pid = get_dead_pid()
+    os.rename(
+        os.path.join(spool_paths["queued"], f"{job_ids[0]}.json"),
+        os.path.join(spool_paths["running"], get_running_job_name(job_ids[0], hostname, dead_pid)),
+    )
+    # job claimed by a worker of another host
+    os.rename(
+        os.path.join(spool_paths["queued"], f"{job_ids[1]}.json"),
+        os.path.join(spool_paths["running"], get_running_job_name(job_ids[1], f"other.{hostname}", dead_pid)),
+    )
+    # job claimed by the current process
+    running_job_path, job = claim_next_job(spool_paths)
+    assert job["id"] == job_ids[2]
+    assert parse_running_job_name(os.path.basename(running_job_path)) == (job_ids[2], hostname, os.getpid())
+
+    assert requeue_orphan_jobs(spool_paths) == [job_ids[0]]
+    assert get_job_status(spool_directory, job_ids[0])[0] == "queued"
+    assert get_job_status(spool_directory, job_ids[1])[0] == "running"
+    assert get_job_status(spool_directory, job_ids[2])[0] == "running"
+
+
+def test_requeue_orphan_jobs_ignores_stray_files(tmp_path, caplog):
+    spool_directory = str(tmp_path / "spool")
+    spool_paths = get_spool_paths(spool_directory)
+    stray_names = ["notes.txt", "job.json", "job@host.json", "job@host@pid.json"]
+    for name in stray_names:
+        (tmp_path / "spool" / "running" / name).touch()
+    job_id = submit_job(spool_directory, "tile.laz")
+    os.rename(
+        os.path.join(spool_paths["queued"], f"{job_id}.json"),
+        os.path.join(spool_paths["running"], get_running_job_name(job_id, socket.gethostname(), get_dead_pid())),
+    )
+
+    with caplog.at_level(logging.WARNING):
+        assert requeue_orphan_jobs(spool_paths) == [job_id]
+    for name in stray_names:
+        assert name in caplog.text
+        assert os.path.isfile(tmp_path / "spool" / "running" / name)